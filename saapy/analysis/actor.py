@@ -1,7 +1,9 @@
 # coding=utf-8
+import zlib
 from typing import List
 
 import networkx as nx
+import numpy as np
 import pyisemail
 from fuzzywuzzy import fuzz
 from recordclass import recordclass
@@ -181,11 +183,93 @@ ActorSimilaritySettings = recordclass('ActorSimilaritySettings',
                                       ACTOR_SIMILARITY_SETTINGS_FIELDS)
 
 
+class ActorCandidateIndex:
+    """
+    inverted index of actors by blocking keys, actors sharing a key are
+    candidates for the similarity evaluation, the keys are the email, the
+    tokens of the proper name and of the email name, and MinHash LSH band
+    buckets of character n-grams of the name and of the email name which
+    catch the fuzzy matches without shared tokens
+    """
+    hash_prime = (1 << 31) - 1
+
+    def __init__(self, ngram_size=3, bands=16, band_rows=2, seed=17):
+        self.ngram_size = ngram_size
+        self.bands = bands
+        self.band_rows = band_rows
+        random_state = np.random.RandomState(seed)
+        hash_count = bands * band_rows
+        self.hash_a = random_state.randint(
+            1, self.hash_prime, size=hash_count).astype(np.uint64)
+        self.hash_b = random_state.randint(
+            0, self.hash_prime, size=hash_count).astype(np.uint64)
+        self.blocks = {}
+        self.actors = {}
+
+    def add(self, actor: Actor) -> List[Actor]:
+        """
+        indexes the actor
+        :return: previously indexed actors sharing a blocking key with it
+        """
+        candidate_ids = set()
+        for key in self.blocking_keys(actor):
+            block = self.blocks.setdefault(key, set())
+            candidate_ids.update(block)
+            block.add(actor.actor_id)
+        self.actors[actor.actor_id] = actor
+        return self._to_actors(candidate_ids, actor)
+
+    def _to_actors(self, actor_ids, actor):
+        actor_ids.discard(actor.actor_id)
+        return [self.actors[actor_id] for actor_id in sorted(actor_ids)]
+
+    def blocking_keys(self, actor: Actor) -> set:
+        keys = {('email', actor.parsed_email.email)}
+        # names and email names share the keys as the similarity checks
+        # compare the name of one actor to the email name of the other
+        for parsed_name in (actor.parsed_name,
+                            actor.parsed_email.parsed_name):
+            if not parsed_name.name:
+                continue
+            if proper(parsed_name):
+                keys.update(('token', token)
+                            for token in parsed_name.name.split()
+                            if len(token) > 1)
+            keys.update(self.lsh_keys(parsed_name.name))
+        return keys
+
+    def lsh_keys(self, text):
+        signature = self.minhash(text)
+        return [('band', band,
+                 signature[band_start:band_start + self.band_rows].tobytes())
+                for band, band_start in enumerate(
+                    range(0, len(signature), self.band_rows))]
+
+    def minhash(self, text):
+        padded_text = ' {} '.format(text)
+        ngrams = {padded_text[i:i + self.ngram_size]
+                  for i in range(max(len(padded_text) - self.ngram_size + 1,
+                                     1))}
+        ngram_hashes = np.array(
+            [zlib.crc32(ngram.encode('utf-8')) for ngram in ngrams],
+            dtype=np.uint64) % np.uint64(self.hash_prime)
+        hashes = (np.outer(self.hash_a, ngram_hashes) +
+                  self.hash_b[:, None]) % np.uint64(self.hash_prime)
+        return hashes.min(axis=1)
+
+
 class ActorSimilarityGraph:
     actor_graph: nx.Graph
     settings: ActorSimilaritySettings
+    candidate_index: ActorCandidateIndex = None
 
-    def __init__(self, settings=None):
+    def __init__(self, settings=None, blocking=False):
+        """
+        :param settings: similarity thresholds
+        :param blocking: evaluate similarity of a new actor only to the
+        candidates from ActorCandidateIndex instead of all the actors,
+        trades a small loss of recall for the linear graph building
+        """
         self.actor_graph = nx.Graph()
         self.similarity_checks = [self.identical_actors,
                                   self.similar_emails,
@@ -196,15 +280,20 @@ class ActorSimilarityGraph:
                                                min_email_name_ratio=55,
                                                min_name_email_ratio=55)
         self.settings = settings
+        if blocking:
+            self.candidate_index = ActorCandidateIndex()
 
     def add_actor(self, actor: Actor, link_similar=True):
         if self.actor_graph.has_node(actor.actor_id):
             return
         self.actor_graph.add_node(actor.actor_id, actor=actor)
-        for actor_id, actor_attrs in self.actor_graph.nodes_iter(data=True):
-            if actor.actor_id == actor_id:
-                continue
-            other_actor = actor_attrs['actor']
+        if self.candidate_index is not None:
+            other_actors = self.candidate_index.add(actor)
+        else:
+            other_actors = [actor_attrs['actor'] for actor_id, actor_attrs
+                            in self.actor_graph.nodes_iter(data=True)
+                            if actor_id != actor.actor_id]
+        for other_actor in other_actors:
             if link_similar:
                 similarity = self.evaluate_similarity(actor, other_actor)
                 if similarity.possible:
@@ -2,9 +2,10 @@
 from typing import List
 
 import networkx as nx
+import numpy as np
 import pandas as pd
 import pyisemail
-from fuzzywuzzy import fuzz
+from rapidfuzz import fuzz, process, utils
 from sklearn.preprocessing import MinMaxScaler
 from toolz import pipe
 
@@ -116,12 +117,21 @@ class GitAuthorAnalysis:
                  query_timeout=None,
                  name_to_email_similarity_lower_boundary=70,
                  email_name_similarity_lower_boundary=70,
-                 name_similarity_lower_boundary=70):
+                 name_similarity_lower_boundary=70,
+                 pair_chunk_size=1000000,
+                 similarity_workers=-1):
+        """
+        :param pair_chunk_size: number of author pairs scored at once
+        :param similarity_workers: threads computing the similarity scores,
+        -1 uses all cpus
+        """
         self.name_to_email_similarity_lower_boundary = \
             name_to_email_similarity_lower_boundary
         self.email_name_similarity_lower_boundary = \
             email_name_similarity_lower_boundary
         self.name_similarity_lower_boundary = name_similarity_lower_boundary
+        self.pair_chunk_size = pair_chunk_size
+        self.similarity_workers = similarity_workers
         self.query_factory = GitAuthorQueryFactory(
             default_labels=project_labels)
         self.invoker = invoker
@@ -156,34 +166,71 @@ class GitAuthorAnalysis:
         newdf = authors.join(newcols)
         return newdf
 
-    def _pair_authors(self, authors):
-        authors_length = authors.shape[0]
-        pairs = []
-        for i in range(authors_length - 1):
-            pairs.extend(((i, j) for j in range(i + 1, authors_length)))
-        df = pd.DataFrame(pairs, columns=('author_idx', 'other_author_idx'))
-        df = df.join(authors, on='author_idx')
-        df = df.join(authors, on='other_author_idx', rsuffix='_other')
-        return df
-
-    def _compute_author_similarity(self, paired_authors):
-        def row_similarity(row):
-            same_email = row.author_email == row.author_email_other
-            name_similarity = fuzz.token_set_ratio(row.author_name,
-                                                   row.author_name_other)
-            email_name_similarity = fuzz.ratio(row.email_name,
-                                               row.email_name_other)
-            name_to_email_similarity = fuzz.token_set_ratio(row.author_name,
-                                                            row.name_from_email_other)
-            return pd.Series(
-                [same_email, name_similarity, email_name_similarity,
-                 name_to_email_similarity])
+    def _compute_similar_authors(self, authors):
+        """
+        scores the author pairs in chunks of rows of the pair matrices and
+        keeps the pairs selected by _select_similar_authors, a chunk holds
+        about pair_chunk_size pairs
+        :return: frame of the similar pairs in the order of the author pairs
+        """
+        authors = authors.reset_index(drop=True)
+        author_count = authors.shape[0]
+        names = authors.author_name.astype(str).tolist()
+        email_names = authors.email_name.astype(str).tolist()
+        names_from_email = [getattr(name, 'name', name) or ''
+                            for name in authors.name_from_email]
+        emails = pd.factorize(authors.author_email)[0]
+        is_valid_email = authors.is_valid_email.astype(bool).values
+        chunk_rows = max(1, self.pair_chunk_size // max(author_count, 1))
+        similar_pairs = []
+        for row_start in range(0, author_count - 1, chunk_rows):
+            row_end = min(row_start + chunk_rows, author_count - 1)
+            rows = slice(row_start, row_end)
+            columns = slice(row_start + 1, author_count)
+            # pairs (i, j) with j > i of the chunk rows
+            upper = np.triu(np.ones((row_end - row_start,
+                                     author_count - row_start - 1),
+                                    dtype=bool))
+            author_idx, other_author_idx = np.nonzero(upper)
+            author_idx += row_start
+            other_author_idx += row_start + 1
+            pairs = pd.DataFrame(dict(
+                author_idx=author_idx,
+                other_author_idx=other_author_idx,
+                same_email=(emails[author_idx] == emails[other_author_idx]),
+                name_similarity=self._score_matrix(
+                    names[rows], names[columns],
+                    fuzz.token_set_ratio, utils.default_process)[upper],
+                email_name_similarity=self._score_matrix(
+                    email_names[rows], email_names[columns],
+                    fuzz.ratio, None)[upper],
+                name_to_email_similarity=self._score_matrix(
+                    names[rows], names_from_email[columns],
+                    fuzz.token_set_ratio, utils.default_process)[upper],
+                is_valid_email=is_valid_email[author_idx]))
+            similar_pairs.append(self._select_similar_authors(pairs))
+        columns = ['author_idx', 'other_author_idx', 'same_email',
+                   'name_similarity', 'email_name_similarity',
+                   'name_to_email_similarity']
+        if similar_pairs:
+            similar_authors = pd.concat(similar_pairs, ignore_index=True)[
+                columns]
+        else:
+            similar_authors = pd.DataFrame(columns=columns)
+        similar_authors = similar_authors.join(authors, on='author_idx')
+        similar_authors = similar_authors.join(authors, on='other_author_idx',
+                                               rsuffix='_other')
+        return similar_authors
 
-        newcols = paired_authors.apply(row_similarity, axis=1)
-        newcols.columns = ['same_email', 'name_similarity',
-                           'email_name_similarity', 'name_to_email_similarity']
-        newdf = paired_authors.join(newcols)
-        return newdf
+    def _score_matrix(self, queries, choices, scorer, processor):
+        """
+        :return: matrix of the scores rounded as fuzzywuzzy scores, cdist
+        spreads the rows over the similarity_workers threads
+        """
+        scores = process.cdist(queries, choices, scorer=scorer,
+                               processor=processor, dtype=np.float32,
+                               workers=self.similarity_workers)
+        return np.rint(scores).astype(np.int16)
 
     def _select_similar_authors(self, authors):
         return authors[
@@ -198,10 +245,7 @@ class GitAuthorAnalysis:
         ]
 
     def cluster_similar_git_authors(self, authors):
-        similar_authors = pipe(authors,
-                               self._pair_authors,
-                               self._compute_author_similarity,
-                               self._select_similar_authors)
+        similar_authors = self._compute_similar_authors(authors)
         join_similar_query = self.query_factory.join_similar_authors(
             similar_authors)
         self.invoker.run(join_similar_query).result(self.query_timeout)
@@ -1,6 +1,14 @@
 # coding=utf-8
 import networkx as nx
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+
+# files in a block of the co-change matrix computed at once
+DEFAULT_BLOCK_SIZE = 2000
+
+CO_CHANGE_COLUMNS = ('file1', 'file2', 'co_changes', 'changes1', 'changes2',
+                     'support', 'confidence1', 'confidence2', 'correlation')
 
 
 def file_commit_correlation(file_commit_frame: pd.DataFrame,
@@ -9,11 +17,137 @@ def file_commit_correlation(file_commit_frame: pd.DataFrame,
 
 
 def build_correlation_graph(correlation: pd.DataFrame,
-                            min_corr: float=0.75) -> nx.Graph:
+                            min_corr: float = 0.75) -> nx.Graph:
+    corr_graph = nx.Graph()
+    rows, columns = np.nonzero(correlation.values >= min_corr)
+    corr_graph.add_edges_from(
+        (correlation.columns[column], correlation.index[row],
+         dict(correlation=correlation.values[row, column]))
+        for row, column in zip(rows, columns))
+    return corr_graph
+
+
+def file_commit_incidence(file_frame: pd.DataFrame,
+                          commit_column='hexsha',
+                          file_column='file_path2'):
+    """
+    :return: (sparse commit x file matrix with 1 where the commit changed
+    the file, commit index, file index)
+    """
+    changes = file_frame[[commit_column, file_column]].dropna()
+    commit_codes, commits = pd.factorize(changes[commit_column])
+    file_codes, files = pd.factorize(changes[file_column])
+    incidence = sp.csc_matrix(
+        (np.ones(len(changes), dtype=np.int32), (commit_codes, file_codes)),
+        shape=(len(commits), len(files)))
+    # a file changed twice in a commit counts once
+    incidence.data[:] = 1
+    return incidence, pd.Index(commits), pd.Index(files)
+
+
+def frame_incidence(file_commit_frame: pd.DataFrame):
+    """
+    :return: (sparse incidence, commit index, file index) of the dense
+    frame of commit rows and file columns taken by file_commit_correlation
+    """
+    incidence = sp.csc_matrix((file_commit_frame.fillna(0).values != 0)
+                              .astype(np.int32))
+    return (incidence, file_commit_frame.index,
+            pd.Index(file_commit_frame.columns))
+
+
+def iter_co_change_blocks(incidence, files, min_co_changes=1, min_corr=None,
+                          block_size=DEFAULT_BLOCK_SIZE):
+    """
+    computes the co-change frames of the file pairs changed together in
+    blocks of files, a pair is found in the block of its second file only
+    :param incidence: sparse commit x file matrix of file_commit_incidence
+    :param min_corr: minimal correlation of the emitted pairs
+    :return: iterator of frames with CO_CHANGE_COLUMNS, support is the
+    share of the commits changing both files, confidence1 is the share of
+    the commits changing file1 which change file2 too, correlation is the
+    pearson correlation of the change indicators, equal to their spearman
+    correlation
+    """
+    incidence = sp.csc_matrix(incidence)
+    commit_count = incidence.shape[0]
+    changes = np.asarray(incidence.sum(axis=0)).ravel().astype(np.float64)
+    variance = changes * (commit_count - changes)
+    transposed = incidence.T.tocsr()
+    for start in range(0, incidence.shape[1], block_size):
+        end = min(start + block_size, incidence.shape[1])
+        co_changes = (transposed @ incidence[:, start:end]).tocoo()
+        file1 = co_changes.row
+        file2 = co_changes.col + start
+        counts = co_changes.data.astype(np.float64)
+        selected = (file1 < file2) & (counts >= min_co_changes)
+        file1, file2, counts = file1[selected], file2[selected], counts[
+            selected]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = ((commit_count * counts -
+                            changes[file1] * changes[file2]) /
+                           np.sqrt(variance[file1] * variance[file2]))
+        if min_corr is not None:
+            selected = correlation >= min_corr
+            file1, file2, counts, correlation = (
+                file1[selected], file2[selected], counts[selected],
+                correlation[selected])
+        yield pd.DataFrame(dict(
+            file1=files[file1], file2=files[file2],
+            co_changes=counts.astype(np.int64),
+            changes1=changes[file1].astype(np.int64),
+            changes2=changes[file2].astype(np.int64),
+            support=counts / commit_count,
+            confidence1=counts / changes[file1],
+            confidence2=counts / changes[file2],
+            correlation=correlation), columns=CO_CHANGE_COLUMNS)
+
+
+def co_change_frame(file_frame: pd.DataFrame, min_co_changes=1,
+                    min_corr=None, block_size=DEFAULT_BLOCK_SIZE,
+                    **kwargs) -> pd.DataFrame:
+    """
+    :return: frame of iter_co_change_blocks for the file frame of the
+    commit history, kwargs are passed to file_commit_incidence
+    """
+    incidence, _, files = file_commit_incidence(file_frame, **kwargs)
+    blocks = list(iter_co_change_blocks(
+        incidence, files, min_co_changes=min_co_changes, min_corr=min_corr,
+        block_size=block_size))
+    if not blocks:
+        return pd.DataFrame(columns=CO_CHANGE_COLUMNS)
+    return pd.concat(blocks, ignore_index=True)
+
+
+def build_co_change_graph(incidence, files, min_corr: float = 0.75,
+                          min_co_changes=1, block_size=DEFAULT_BLOCK_SIZE,
+                          self_loops=True) -> nx.Graph:
+    """
+    builds the graph of build_correlation_graph from the sparse incidence
+    without the dense correlation matrix, pairs never changed together have
+    negative correlation, so they are skipped
+    :param self_loops: add the loop with correlation 1 of every file which
+    correlates with itself like in build_correlation_graph
+    """
+    if min_corr <= 0:
+        raise ValueError('min_corr must be positive to skip the file pairs '
+                         'never changed together')
     corr_graph = nx.Graph()
-    for column_name in correlation.columns:
-        column = correlation[column_name]
-        correlated = column[column >= min_corr]
-        for row_name, corr in zip(correlated.index, correlated):
-            corr_graph.add_edge(column_name, row_name, correlation=corr)
+    if self_loops:
+        commit_count = incidence.shape[0]
+        changes = np.asarray(incidence.sum(axis=0)).ravel()
+        corr_graph.add_edges_from(
+            (files[i], files[i], dict(correlation=1.))
+            for i in np.nonzero((changes > 0) &
+                                (changes < commit_count))[0])
+    for block in iter_co_change_blocks(incidence, files,
+                                       min_co_changes=min_co_changes,
+                                       min_corr=min_corr,
+                                       block_size=block_size):
+        corr_graph.add_edges_from(
+            (file1, file2, dict(correlation=correlation,
+                                co_changes=co_changes, support=support))
+            for file1, file2, correlation, co_changes, support in zip(
+                block.file1, block.file2, block.correlation,
+                block.co_changes, block.support))
     return corr_graph
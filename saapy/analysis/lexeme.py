@@ -1,24 +1,128 @@
 # coding=utf-8
 import functools
+import hashlib
+import json
+import pickle
 import re
+import sqlite3
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
+from pathlib import Path
 from typing import List, Dict, Any, Optional, Iterable
 import enchant
 import logging
+import numpy as np
 from fuzzywuzzy import fuzz
+from rapidfuzz import process
+from rapidfuzz.fuzz import ratio as rapidfuzz_ratio
 from recordclass import recordclass
 from sortedcontainers import SortedDict, SortedSet
+from toolz import partition_all
 import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MEMO_SIZE = 100000
+
+SEGMENTATION_MODES = ('backtrack', 'dp')
+
+SQLITE_MAX_VARIABLES = 900
+
+# parsed lexemes written to the lexeme cache at once by parse_lexeme
+CACHE_WRITE_SIZE = 1000
+
 
 def fuzzy_distance(word, words):
     return sorted(((w, fuzz.ratio(word, w)) for w in words),
                   key=lambda e: -e[1])
 
 
+class TermIndex:
+    """
+    index of terms answering the best fuzz.ratio match queries without
+    scoring every term, candidates are pruned by the length and by the
+    count of the padded character q-grams shared with the query which an
+    edit of ratio above the threshold has to keep, the remaining ones are
+    scored at once with rapidfuzz, the ratio of fuzzywuzzy backed by
+    python-Levenshtein is the same indel ratio
+    """
+
+    def __init__(self, q=3):
+        self.q = q
+        self.terms = []
+        self.term_ids = {}
+        self.grams = {}
+        self._gram_arrays = None
+        self._term_lengths = None
+
+    def add_terms(self, terms: Iterable[str]):
+        term_count = len(self.terms)
+        for term in terms:
+            if term in self.term_ids:
+                continue
+            term_id = len(self.terms)
+            self.terms.append(term)
+            self.term_ids[term] = term_id
+            for gram, count in self.to_grams(term).items():
+                self.grams.setdefault(gram, []).append((term_id, count))
+        if self._gram_arrays is None or len(self.terms) > term_count:
+            self._build_arrays()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def to_grams(self, word):
+        padding = ' ' * (self.q - 1)
+        padded_word = '{}{}{}'.format(padding, word, padding)
+        grams = {}
+        for i in range(len(padded_word) - self.q + 1):
+            gram = padded_word[i:i + self.q]
+            grams[gram] = grams.get(gram, 0) + 1
+        return grams
+
+    def _build_arrays(self):
+        # postings as arrays of term ids and q-gram counts
+        self._gram_arrays = {
+            gram: tuple(np.array(column, dtype=np.int64)
+                        for column in zip(*postings))
+            for gram, postings in self.grams.items()}
+        self._term_lengths = np.array([len(term) for term in self.terms],
+                                      dtype=np.int64)
+
+    def best_match(self, word, min_score):
+        """
+        :return: (term, score) of the term with the highest fuzz.ratio to
+        the word of at least min_score, the earliest added term of equal
+        ones as in fuzzy_distance, None when there is no such term
+        """
+        if not self.terms:
+            return None
+        shared_counts = np.zeros(len(self.terms), dtype=np.int64)
+        for gram, count in self.to_grams(word).items():
+            if gram in self._gram_arrays:
+                term_ids, term_counts = self._gram_arrays[gram]
+                shared_counts[term_ids] += np.minimum(term_counts, count)
+        # fuzz.ratio rounds 100 * (1 - indel distance / total length), an
+        # indel edit changes at most q of the padded q-grams
+        max_distances = np.floor((1 - (min_score - 0.5) / 100) *
+                                 (len(word) + self._term_lengths))
+        min_shared = (np.maximum(len(word), self._term_lengths) + self.q - 1 -
+                      max_distances * self.q)
+        candidate_ids = np.nonzero(
+            (np.abs(self._term_lengths - len(word)) <= max_distances) &
+            (shared_counts >= min_shared))[0]
+        if not len(candidate_ids):
+            return None
+        scores = np.rint(process.cdist(
+            [word], [self.terms[term_id] for term_id in candidate_ids],
+            scorer=rapidfuzz_ratio, dtype=np.float64)[0])
+        best = int(np.argmax(scores))
+        if scores[best] < min_score:
+            return None
+        return self.terms[candidate_ids[best]], int(scores[best])
+
+
 def flatten_parsed_lexeme(parsed_lexeme: List,
                           skip_miss: bool=False) -> List:
     words = []
@@ -124,6 +228,10 @@ def split_file_path(s: str) -> Dict[str, Optional[Any]]:
     return dict(dirs=path_parts[:-1], name=name, ext=ext)
 
 
+def split_lexeme_row(row: Iterable) -> List[str]:
+    return sum((value.split() for value in row), [])
+
+
 email_nickname_pattern = re.compile(r"[a-zA-Z]+(\w|\.|\-|')+")
 
 
@@ -140,17 +248,256 @@ SegmentMap = recordclass('SegmentMap',
                           'lexeme', 'distances'])
 
 
+def copy_parsed_lexeme(parsed_lexeme: List) -> List:
+    """
+    :return: copy of the parsed lexeme with its own lists and segment maps
+    """
+    return [(lexeme_part, [SegmentMap(*segment_map)
+                           for segment_map in segments])
+            for lexeme_part, segments in parsed_lexeme]
+
+
+class LRUMemo:
+    """
+    dict of at most max_size results dropping the least recently used ones
+    """
+
+    def __init__(self, max_size=DEFAULT_MEMO_SIZE):
+        self.max_size = max_size
+        self._results = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._results:
+            return default
+        self._results.move_to_end(key)
+        return self._results[key]
+
+    def put(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        self._results.clear()
+
+    def __contains__(self, key):
+        return key in self._results
+
+    def __len__(self):
+        return len(self._results)
+
+
+class LexemeCache:
+    """
+    sqlite database of parsed lexemes keyed by lexeme and by the
+    fingerprint of the terms and of the word dictionary they were parsed
+    with, so changing the terms invalidates the cached lexemes
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = Path(cache_path)
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.cache_path))
+            with self._connection:
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS lexemes '
+                    '(terms_hash TEXT, lexeme TEXT, parsed_lexeme BLOB, '
+                    'PRIMARY KEY (terms_hash, lexeme))')
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def get_parsed_lexemes(self, terms_hash, lexemes):
+        """
+        :return: dict of the cached parsed lexemes found in the cache
+        """
+        lexemes = list(lexemes)
+        parsed_lexemes = {}
+        for i in range(0, len(lexemes), SQLITE_MAX_VARIABLES):
+            lexeme_batch = lexemes[i:i + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                'SELECT lexeme, parsed_lexeme FROM lexemes '
+                'WHERE terms_hash = ? AND lexeme IN ({})'.format(
+                    ','.join('?' * len(lexeme_batch))),
+                [terms_hash] + lexeme_batch)
+            parsed_lexemes.update((lexeme, pickle.loads(parsed_lexeme))
+                                  for lexeme, parsed_lexeme in rows)
+        return parsed_lexemes
+
+    def put_parsed_lexemes(self, terms_hash, parsed_lexemes):
+        """
+        :param parsed_lexemes: dict of parsed lexemes keyed by lexeme
+        """
+        rows = ((terms_hash, lexeme,
+                 sqlite3.Binary(pickle.dumps(
+                     parsed_lexeme, protocol=pickle.HIGHEST_PROTOCOL)))
+                for lexeme, parsed_lexeme in parsed_lexemes.items())
+        with self.connection as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO lexemes VALUES (?, ?, ?)', rows)
+
+
+def terms_fingerprint(terms, dictionary_tag=None, segmentation=None):
+    """
+    :return: digest of the terms, of the word dictionary language and of
+    the segmentation mode
+    """
+    digest = hashlib.sha1(json.dumps(
+        [dictionary_tag, segmentation,
+         sorted(terms.items())]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+_worker_parser = None
+
+
+def _init_worker_parser(terms, memo_size, segmentation):
+    global _worker_parser
+    _worker_parser = LexemeParser(memo_size=memo_size,
+                                  segmentation=segmentation)
+    _worker_parser.add_terms(terms)
+
+
+def _parse_lexeme_chunk(lexemes):
+    return [_worker_parser.parse_lexeme(lexeme) for lexeme in lexemes]
+
+
 class LexemeParser:
     terms = None
     word_dictionary = enchant.Dict("en_US")
 
-    def __init__(self):
+    def __init__(self, memo_size=DEFAULT_MEMO_SIZE, cache_path=None,
+                 segmentation='backtrack'):
+        """
+        :param memo_size: number of parsed lexemes and of mapped segments
+        kept in memory
+        :param cache_path: sqlite file caching parsed lexemes across
+        parsers, no persistent cache by default
+        :param segmentation: 'backtrack' takes the longest mapped prefixes
+        and backtracks from dead ends, 'dp' finds the same segments with
+        dynamic programming over the coverable suffixes
+        """
+        if segmentation not in SEGMENTATION_MODES:
+            raise ValueError(
+                'unsupported segmentation {}'.format(segmentation))
+        self.segmentation = segmentation
         self.terms = {}
+        self.term_index = TermIndex()
+        self.lexeme_memo = LRUMemo(memo_size)
+        self.segment_memo = LRUMemo(memo_size)
+        self.cache = LexemeCache(cache_path) if cache_path else None
+        self._unsaved_lexemes = {}
+        self._terms_hash = None
 
     def add_terms(self, terms):
+        self.flush_cache()
         self.terms.update(terms)
+        self.term_index.add_terms(self.terms.keys())
+        self.lexeme_memo.clear()
+        self.segment_memo.clear()
+        self._terms_hash = None
+
+    @property
+    def terms_hash(self):
+        if self._terms_hash is None:
+            self._terms_hash = terms_fingerprint(
+                self.terms, getattr(self.word_dictionary, 'tag', None),
+                self.segmentation)
+        return self._terms_hash
 
     def parse_lexeme(self, lexeme: str) -> List:
+        """
+        parses the lexeme into segments mapped to words, the result is
+        memoised, every call gets its own copy of it, new results are
+        written to the cache in batches, see flush_cache
+        """
+        parsed_lexeme = self.lexeme_memo.get(lexeme)
+        if parsed_lexeme is None and self.cache is not None:
+            parsed_lexeme = self._unsaved_lexemes.get(lexeme)
+            if parsed_lexeme is None:
+                parsed_lexeme = self.cache.get_parsed_lexemes(
+                    self.terms_hash, [lexeme]).get(lexeme)
+        if parsed_lexeme is None:
+            parsed_lexeme = self._parse_lexeme(lexeme)
+            if self.cache is not None:
+                self._unsaved_lexemes[lexeme] = parsed_lexeme
+                if len(self._unsaved_lexemes) >= CACHE_WRITE_SIZE:
+                    self.flush_cache()
+        self.lexeme_memo.put(lexeme, parsed_lexeme)
+        return copy_parsed_lexeme(parsed_lexeme)
+
+    def flush_cache(self):
+        """
+        writes the lexemes parsed by parse_lexeme to the cache
+        """
+        if self.cache is not None and self._unsaved_lexemes:
+            self.cache.put_parsed_lexemes(self.terms_hash,
+                                          self._unsaved_lexemes)
+        self._unsaved_lexemes = {}
+
+    def close(self):
+        self.flush_cache()
+        if self.cache is not None:
+            self.cache.close()
+
+    def parse_lexemes(self, lexemes: Iterable, workers=1,
+                      chunk_size=1000) -> Dict:
+        """
+        parses the unique lexemes not found in the memo and in the cache in
+        a pool of worker processes
+        :param workers: number of worker processes, 1 parses in this
+        process, None uses all cpus
+        :param chunk_size: number of lexemes a worker parses at once
+        :return: dict of parsed lexemes keyed by lexeme, the parsed
+        lexemes are shared with the memo, see copy_parsed_lexeme
+        """
+        self.flush_cache()
+        parsed_lexemes = {}
+        unparsed_lexemes = []
+        for lexeme in dict.fromkeys(lexemes):
+            parsed_lexeme = self.lexeme_memo.get(lexeme)
+            if parsed_lexeme is None:
+                unparsed_lexemes.append(lexeme)
+            else:
+                parsed_lexemes[lexeme] = parsed_lexeme
+        if self.cache is not None and unparsed_lexemes:
+            cached_lexemes = self.cache.get_parsed_lexemes(
+                self.terms_hash, unparsed_lexemes)
+            parsed_lexemes.update(cached_lexemes)
+            unparsed_lexemes = [lexeme for lexeme in unparsed_lexemes
+                                if lexeme not in cached_lexemes]
+        if workers == 1 or len(unparsed_lexemes) <= chunk_size:
+            new_lexemes = {lexeme: self._parse_lexeme(lexeme)
+                           for lexeme in unparsed_lexemes}
+        else:
+            lexeme_chunks = list(partition_all(chunk_size, unparsed_lexemes))
+            with ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker_parser,
+                    initargs=(self.terms, self.segment_memo.max_size,
+                              self.segmentation)
+            ) as executor:
+                new_lexemes = {}
+                for lexeme_chunk, parsed_chunk in zip(
+                        lexeme_chunks,
+                        executor.map(_parse_lexeme_chunk, lexeme_chunks)):
+                    new_lexemes.update(zip(lexeme_chunk, parsed_chunk))
+        if self.cache is not None and new_lexemes:
+            self.cache.put_parsed_lexemes(self.terms_hash, new_lexemes)
+        for lexeme, parsed_lexeme in new_lexemes.items():
+            self.lexeme_memo.put(lexeme, parsed_lexeme)
+        parsed_lexemes.update(new_lexemes)
+        return parsed_lexemes
+
+    def _parse_lexeme(self, lexeme: str) -> List:
         try:
             clean_lexeme = strip_noise(lexeme)
             low_lexeme = clean_lexeme.lower()
@@ -168,16 +515,34 @@ class LexemeParser:
             return [(lexeme, [SegmentMap('miss', lexeme, None, lexeme, [0])])]
 
     def parse_lexeme_row(self, row: Iterable) -> List:
-        return list(map(self.parse_lexeme,
-                        sum((value.split() for value in row), [])))
+        lexemes = split_lexeme_row(row)
+        parsed_lexemes = self.parse_lexemes(lexemes)
+        return [copy_parsed_lexeme(parsed_lexemes[lexeme])
+                for lexeme in lexemes]
 
-    def parse_lexeme_series(self, lexemes: pd.Series) -> pd.Series:
+    def parse_lexeme_series(self, lexemes: pd.Series,
+                            workers=1) -> pd.Series:
+        """
+        :param lexemes: series of lists of lexemes
+        :param workers: number of processes parsing the unique lexemes
+        """
+        parsed_lexemes = self.parse_lexemes(
+            (lexeme for lexeme_list in lexemes for lexeme in lexeme_list),
+            workers=workers)
         return lexemes.map(
-            lambda lexeme: list(map(self.parse_lexeme, lexeme)))
+            lambda lexeme_list: [copy_parsed_lexeme(parsed_lexemes[lexeme])
+                                 for lexeme in lexeme_list])
 
-    def parse_lexeme_frame(self, lexeme_frame: pd.DataFrame) -> pd.Series:
-        return lexeme_frame.apply(
-            self.parse_lexeme_row, axis=1, raw=True, reduce=True)
+    def parse_lexeme_frame(self, lexeme_frame: pd.DataFrame,
+                           workers=1) -> pd.Series:
+        """
+        parses the space separated lexemes of the frame rows
+        :param workers: number of processes parsing the unique lexemes
+        """
+        lexeme_rows = pd.Series(
+            [split_lexeme_row(row) for row in lexeme_frame.values],
+            index=lexeme_frame.index)
+        return self.parse_lexeme_series(lexeme_rows, workers=workers)
 
     def split_into_words(self, lexeme: str,
                          camel_split: bool = True,
@@ -233,8 +598,8 @@ class LexemeParser:
 
     def segment_into_words(self, context_lexeme: str,
                            lexeme: str, exclude=None,
-                           term_distance:int=100,
-                           dict_distance:int=100):
+                           term_distance: int = 100,
+                           dict_distance: int = 100):
         """
         Segment a string of chars using the pyenchant vocabulary.
         Keeps longest possible words that account for all characters,
@@ -250,6 +615,10 @@ class LexemeParser:
                         If an excluded word occurs later in the string, this
                         function will fail.
         """
+        if self.segmentation == 'dp':
+            return self.segment_into_words_dp(context_lexeme, lexeme,
+                                              term_distance=term_distance,
+                                              dict_distance=dict_distance)
         segments = []
 
         if not exclude:
@@ -282,10 +651,61 @@ class LexemeParser:
                 return [SegmentMap('miss', lexeme, None, context_lexeme, [0])]
         return segments
 
+    def segment_into_words_dp(self, context_lexeme: str, lexeme: str,
+                              term_distance: int = 100,
+                              dict_distance: int = 100):
+        """
+        segments the lexeme like segment_into_words without backtracking,
+        the suffixes which can be covered by mapped segments of at least
+        two chars are found from the end of the lexeme, every substring
+        is mapped once, O(n^2) memoised map_segment calls for n chars
+        :return: list of segment maps or a miss of the whole lexeme when
+        there is no cover
+        """
+        # longest_prefixes[start] is (end, segment map) of the longest
+        # mapped segment lexeme[start:end] followed by a coverable suffix
+        longest_prefixes = [None] * (len(lexeme) + 1)
+        longest_prefixes[len(lexeme)] = (None, None)
+        for start in range(len(lexeme) - 2, -1, -1):
+            for end in range(len(lexeme), start + 1, -1):
+                if longest_prefixes[end] is None:
+                    continue
+                segment_map = self.map_segment(lexeme[start:end],
+                                               context_lexeme,
+                                               term_distance=term_distance,
+                                               dict_distance=dict_distance)
+                if segment_map[2] is not None:
+                    longest_prefixes[start] = (end, segment_map)
+                    break
+        if longest_prefixes[0] is None:
+            return [SegmentMap('miss', lexeme, None, context_lexeme, [0])]
+        segments = []
+        start = 0
+        while start < len(lexeme):
+            start, segment_map = longest_prefixes[start]
+            segments.append(segment_map)
+        return segments
+
     def map_segment(self, segment: str,
                     lexeme: str,
-                    term_distance:int=100,
-                    dict_distance:int=100):
+                    term_distance: int = 100,
+                    dict_distance: int = 100):
+        memo_key = (segment, term_distance, dict_distance)
+        memo_map = self.segment_memo.get(memo_key)
+        if memo_map is None:
+            memo_map = tuple(self._map_segment(segment, lexeme,
+                                               term_distance=term_distance,
+                                               dict_distance=dict_distance))
+            self.segment_memo.put(memo_key, memo_map)
+        # the mapping does not depend on the lexeme, the segment maps are
+        # mutable so every call gets its own one
+        seg_type, segment, segment_map, _, distances = memo_map
+        return SegmentMap(seg_type, segment, segment_map, lexeme, distances)
+
+    def _map_segment(self, segment: str,
+                     lexeme: str,
+                     term_distance: int = 100,
+                     dict_distance: int = 100):
         low_segment = segment.lower()
         low_digitfree_segment = drop_digits(low_segment)
         segment_map = self.map_segment_to_term(segment, low_segment, lexeme)
@@ -293,12 +713,13 @@ class LexemeParser:
             segment_map = self.map_segment_to_term(
                 segment, low_digitfree_segment, lexeme)
         if not segment_map and len(self.terms) and term_distance < 100:
-            distances = fuzzy_distance(low_segment, self.terms.keys())
-            term_key = distances[0][0]
-            if distances[0][1] >= term_distance:
+            best_term = self.term_index.best_match(low_segment,
+                                                   term_distance)
+            if best_term is not None:
+                term_key, distance = best_term
                 segment_map = SegmentMap(
                     'term', segment, self.terms[term_key] or term_key,
-                     lexeme, distances[0][1])
+                    lexeme, distance)
         if not segment_map and low_digitfree_segment:
             if self.word_dictionary.check(low_digitfree_segment):
                 segment_map = SegmentMap(
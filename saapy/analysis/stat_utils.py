@@ -1,7 +1,14 @@
 # coding=utf-8
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 import numpy as np
 from scipy.stats import zscore
 
+# bytes of replicate samples and of the temporaries of their statistic
+# taken at once by the batched functions
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
 
 def ecdf(data):
     """Compute ECDF for a one-dimensional array of measurements."""
@@ -30,6 +37,9 @@ def bootstrap_replicate_1d(data, func):
 
 def draw_bs_reps(data, func, size=1):
     """Draw bootstrap replicates."""
+    if func in BATCH_STATISTICS:
+        return batch_bs_reps(data, BATCH_STATISTICS[func], size=size,
+                             seed=global_seed())
     return np.array([bootstrap_replicate_1d(data, func) for _ in range(size)])
 
 
@@ -40,22 +50,7 @@ def confidence(data, q=95):
 
 def draw_bs_pairs_linreg(x, y, size=1):
     """Perform pairs bootstrap for linear regression."""
-
-    # Set up array of indices to sample from: inds
-    inds = np.arange(len(x))
-
-    # Initialize replicates: bs_slope_reps, bs_intercept_reps
-    bs_slope_reps = np.empty(size)
-    bs_intercept_reps = np.empty(size)
-
-    # Generate replicates
-    for i in range(size):
-        bs_inds = np.random.choice(inds, size=len(inds))
-        bs_x, bs_y = x[bs_inds], y[bs_inds]
-        # noinspection PyTupleAssignmentBalance
-        bs_slope_reps[i], bs_intercept_reps[i] = np.polyfit(bs_x, bs_y, 1)
-
-    return bs_slope_reps, bs_intercept_reps
+    return batch_bs_pairs_linreg(x, y, size=size, seed=global_seed())
 
 
 def permutation_sample(data1, data2):
@@ -76,6 +71,9 @@ def permutation_sample(data1, data2):
 
 def draw_perm_reps(data_1, data_2, func, size=1):
     """Generate multiple permutation replicates."""
+    if func in BATCH_STATISTICS:
+        return batch_perm_reps(data_1, data_2, BATCH_STATISTICS[func],
+                               size=size, seed=global_seed())
 
     # Initialize array of replicates: perm_replicates
     perm_replicates = np.empty(size)
@@ -101,6 +99,9 @@ def pearson_r(data_1, data_2):
 
 def draw_bs_pairs(x, y, func, size=1):
     """Perform pairs bootstrap for single statistic."""
+    if func in BATCH_STATISTICS:
+        return batch_bs_pairs(x, y, BATCH_STATISTICS[func], size=size,
+                              seed=global_seed())
 
     # Set up array of indices to sample from
     inds = np.arange(len(x))
@@ -120,3 +121,151 @@ def draw_bs_pairs(x, y, func, size=1):
 def find_outliers(data):
     absolute_normalized = np.abs(zscore(data))
     return absolute_normalized > 3
+
+
+# batched replicates, every replicate is a row of a sample matrix drawn at
+# once and the statistics are computed along the rows
+
+def batch_mean(samples):
+    return samples.mean(axis=1)
+
+
+def batch_diff_of_means(samples_1, samples_2):
+    return samples_1.mean(axis=1) - samples_2.mean(axis=1)
+
+
+def batch_pearson_r(x, y):
+    dx = x - x.mean(axis=1, keepdims=True)
+    dy = y - y.mean(axis=1, keepdims=True)
+    return ((dx * dy).sum(axis=1) /
+            np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1)))
+
+
+def batch_linreg(x, y):
+    """least squares slope and intercept of every row pair"""
+    x_mean = x.mean(axis=1, keepdims=True)
+    y_mean = y.mean(axis=1, keepdims=True)
+    dx = x - x_mean
+    slope = (dx * (y - y_mean)).sum(axis=1) / (dx * dx).sum(axis=1)
+    intercept = y_mean[:, 0] - slope * x_mean[:, 0]
+    return slope, intercept
+
+
+# statistics of the loop functions with their batched equivalents
+BATCH_STATISTICS = {np.mean: batch_mean,
+                    diff_of_means: batch_diff_of_means,
+                    pearson_r: batch_pearson_r}
+
+# float64 arrays of the sample shape alive at once in the batched
+# statistics, e.g. dx, dy and their product in batch_pearson_r, other
+# statistics are assumed to take DEFAULT_TEMPORARIES
+BATCH_TEMPORARIES = {batch_mean: 0,
+                     batch_diff_of_means: 0,
+                     batch_pearson_r: 3,
+                     batch_linreg: 3}
+
+DEFAULT_TEMPORARIES = 3
+
+
+def statistic_row_bytes(statistic, length):
+    """bytes of the temporaries of the batched statistic per replicate of
+    length values"""
+    return BATCH_TEMPORARIES.get(statistic, DEFAULT_TEMPORARIES) * length * 8
+
+
+def global_seed():
+    """seed of the batched functions drawn from np.random, so np.random.seed
+    keeps the loop functions reproducible"""
+    return np.random.randint(2 ** 31)
+
+
+def run_batches(draw_batch, size, row_bytes, seed=None,
+                memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """
+    splits size replicates into batches fitting into the memory budget and
+    draws every batch with its own generator spawned from the seed, so the
+    replicates do not depend on the number of workers
+    :param draw_batch: picklable function of (generator, rows) returning
+    an array or a tuple of arrays of rows replicates
+    :param row_bytes: bytes taken by one replicate, its sample and the
+    temporaries of its statistic, see statistic_row_bytes
+    :param workers: number of processes drawing the batches
+    """
+    batch_rows = max(1, int(memory_budget // max(1, row_bytes)))
+    batch_sizes = [min(batch_rows, size - start)
+                   for start in range(0, size, batch_rows)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    tasks = list(zip(seeds, batch_sizes))
+    if workers == 1 or len(tasks) == 1:
+        results = [_draw_seeded_batch(draw_batch, task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                partial(_draw_seeded_batch, draw_batch), tasks))
+    if not results:
+        return np.empty(0)
+    if isinstance(results[0], tuple):
+        return tuple(np.concatenate(arrays) for arrays in zip(*results))
+    return np.concatenate(results)
+
+
+def _draw_seeded_batch(draw_batch, task):
+    seed, rows = task
+    return draw_batch(np.random.default_rng(seed), rows)
+
+
+def _bs_batch(data, statistic, rng, rows):
+    return statistic(data[rng.integers(0, len(data), (rows, len(data)))])
+
+
+def _bs_pairs_batch(x, y, statistic, rng, rows):
+    inds = rng.integers(0, len(x), (rows, len(x)))
+    return statistic(x[inds], y[inds])
+
+
+def _perm_batch(data, split, statistic, rng, rows):
+    permuted = rng.permuted(np.broadcast_to(data, (rows, len(data))), axis=1)
+    return statistic(permuted[:, :split], permuted[:, split:])
+
+
+def batch_bs_reps(data, statistic=batch_mean, size=1, seed=None,
+                  memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """Draw bootstrap replicates of the batched statistic in batches."""
+    data = np.asarray(data)
+    row_bytes = (len(data) * (8 + data.itemsize) +
+                 statistic_row_bytes(statistic, len(data)))
+    return run_batches(partial(_bs_batch, data, statistic), size,
+                       row_bytes, seed=seed,
+                       memory_budget=memory_budget, workers=workers)
+
+
+def batch_bs_pairs(x, y, statistic=batch_pearson_r, size=1, seed=None,
+                   memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """Perform pairs bootstrap of the batched statistic in batches."""
+    x, y = np.asarray(x), np.asarray(y)
+    row_bytes = (len(x) * (8 + x.itemsize + y.itemsize) +
+                 statistic_row_bytes(statistic, len(x)))
+    return run_batches(partial(_bs_pairs_batch, x, y, statistic), size,
+                       row_bytes, seed=seed,
+                       memory_budget=memory_budget, workers=workers)
+
+
+def batch_bs_pairs_linreg(x, y, size=1, seed=None,
+                          memory_budget=DEFAULT_MEMORY_BUDGET, workers=1):
+    """Perform pairs bootstrap for linear regression in batches.
+    :return: slope replicates, intercept replicates"""
+    return batch_bs_pairs(x, y, batch_linreg, size=size, seed=seed,
+                          memory_budget=memory_budget, workers=workers)
+
+
+def batch_perm_reps(data_1, data_2, statistic=batch_diff_of_means, size=1,
+                    seed=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+                    workers=1):
+    """Generate permutation replicates of the batched statistic in
+    batches."""
+    data = np.concatenate((data_1, data_2))
+    row_bytes = (len(data) * data.itemsize +
+                 statistic_row_bytes(statistic, len(data)))
+    return run_batches(partial(_perm_batch, data, len(data_1), statistic),
+                       size, row_bytes, seed=seed,
+                       memory_budget=memory_budget, workers=workers)
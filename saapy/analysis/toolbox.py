@@ -2,7 +2,6 @@
 import logging
 import warnings
 
-from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 
@@ -15,7 +14,10 @@ import seaborn as sns
 import pandas as pd
 import pandas_profiling as pp
 
-from saapy.vcs import GitClient
+from saapy.util.frame_store import (PARQUET_SUFFIX, FrameRegistry,
+                                    frame_file_columns, load_frame_file,
+                                    save_frame_file)
+from saapy.vcs import GitClient, merge_commit_history, refs_to_ref_frame
 from .actor import connect_actors, combine_actors
 
 
@@ -30,7 +32,6 @@ class Toolbox:
                  load_cfg=True, load_secret_cfg=True,
                  default_data_directory=None,
                  create_default_data_directory=True):
-        self.data = OrderedDict()
         self.cfg_yaml = cfg_yaml
         self.secret_cfg_yaml = secret_cfg_yaml
         if load_cfg and cfg_yaml and Path(cfg_yaml).exists():
@@ -43,6 +44,8 @@ class Toolbox:
         else:
             self.secret_cfg = {}
         self._ensure_cfg_structure()
+        self.data = FrameRegistry(self.cfg['data']['frames'],
+                                  memory_budget=self.cfg['memory_budget'])
         if create_vcs_client:
             self._create_vcs_client()
         if default_data_directory:
@@ -67,11 +70,17 @@ class Toolbox:
         }))
         self.cfg.setdefault('data', dict(frames={}))
         self.cfg.setdefault('default_data_directory', '.')
+        # 'feather' or 'parquet' for frames saved to the default directory
+        self.cfg.setdefault('frame_format', 'feather')
+        # bytes of frames kept in memory, None keeps all the loaded frames
+        self.cfg.setdefault('memory_budget', None)
 
     def _create_vcs_client(self):
         if (self.cfg['codebase']['vcs'] == 'git'
             and self.cfg['codebase']['directory']):
-            self.vcs_client = GitClient(self.cfg['codebase']['directory'])
+            self.vcs_client = GitClient(
+                self.cfg['codebase']['directory'],
+                commit_cache_path=self.cfg['codebase'].get('commit_cache'))
 
     @staticmethod
     def load_cfg(cfg_yaml):
@@ -86,14 +95,17 @@ class Toolbox:
 
     def add_frame(self, key, df, persist_feather=True):
         frame_feather = self.to_frame_feather_path(key, persist_feather)
-        self.data[key] = df
         if frame_feather:
             self.cfg['data']['frames'][key] = frame_feather
+        self.data[key] = df
 
     def to_frame_feather_path(self, key, persist_feather):
         if persist_feather:
             if isinstance(persist_feather, (str, Path)):
                 frame_feather = str(persist_feather)
+            elif self.cfg['frame_format'] == 'parquet':
+                file_name = '{}{}'.format(key, PARQUET_SUFFIX)
+                frame_feather = str(self.default_data_directory / file_name)
             else:
                 file_name = '{}.feather'.format(key)
                 frame_feather = str(self.default_data_directory / file_name)
@@ -102,22 +114,64 @@ class Toolbox:
         return frame_feather
 
     def save_frame(self, key, df=None, persist_feather=None):
-        if df is not None:
-            self.data[key] = df
         frame_feather = self.to_frame_feather_path(key, persist_feather)
         if frame_feather:
             self.cfg['data']['frames'][key] = frame_feather
-        self.data[key].to_feather(self.cfg['data']['frames'][key])
+        if df is not None:
+            self.data[key] = df
+        save_frame_file(self.data[key], self.cfg['data']['frames'][key])
+        self.data.set_saved(key)
 
-    def load_frame(self, key, persist_feather=None):
+    def load_frame(self, key, persist_feather=None, columns=None,
+                   date_range=None):
+        """
+        loads the persisted frame into data
+        :param columns: load only these columns
+        :param date_range: (start, end) to load only rows with
+        committed_datetime in [start, end), parquet datasets skip the year
+        partitions and row groups out of the range
+        :return: loaded frame, a subset of the frame is returned without
+        replacing the frame in data
+        """
         if persist_feather:
             self.cfg['data']['frames'][key] = persist_feather
-        df = pd.read_feather(self.cfg['data']['frames'][key])
-        self.data[key] = df
+        df = load_frame_file(self.cfg['data']['frames'][key],
+                             columns=columns, date_range=date_range)
+        if columns is None and date_range is None:
+            self.data.set_saved(key, df)
         return df
 
+    def frame_columns(self, key):
+        """
+        :return: column names of the persisted frame read from its schema
+        """
+        return frame_file_columns(self.cfg['data']['frames'][key])
+
+    def set_memory_budget(self, memory_budget):
+        """
+        limits memory taken by the frames in data, least recently used
+        frames are evicted to their files and loaded again on access
+        """
+        self.cfg['memory_budget'] = memory_budget
+        self.data.memory_budget = memory_budget
+        self.data.enforce_budget()
+
+    def memory_usage(self):
+        """
+        :return: series of bytes taken by the frames loaded in data
+        """
+        return self.data.memory_usage()
+
     def load_all_frames(self):
-        return [self.load_frame(key) for key in self.cfg['data']['frames']]
+        """
+        registers the persisted frames in data without reading them, each
+        frame is loaded on its first access
+        :return: keys of the registered frames
+        """
+        frame_paths = self.cfg['data']['frames']
+        for key, frame_path in list(frame_paths.items()):
+            self.data.register(key, frame_path)
+        return list(frame_paths)
 
     @property
     def codebase_directory(self):
@@ -136,13 +190,59 @@ class Toolbox:
                                revs='all_refs',
                                include_trees=True,
                                paths='',
+                               incremental=False,
                                **kwargs):
-        commit_history = self.vcs_client.extract_commit_history(
-            revs=revs, include_trees=include_trees, paths=paths, **kwargs)
+        """
+        extracts commit history frames from the codebase repository
+        :param incremental: extract only commits which are not reachable
+        from the ref tips recorded by the previous extraction and merge them
+        into the previously extracted frames, falls back to the full
+        extraction when there is no previous one
+        """
+        ref_tips = self.vcs_client.get_ref_tips(revs)
+        tip_revs = list(ref_tips.values())
+        history_keys = ['actor_frame', 'commit_frame', 'file_frame',
+                        'parent_frame']
+        if include_trees and kwargs.get('dedup_trees'):
+            history_keys.extend(['tree_entry_frame', 'commit_tree_frame'])
+        elif include_trees:
+            history_keys.append('tree_frame')
+        if incremental and self._has_commit_history(history_keys):
+            previous_tips = self.vcs_client.filter_known_commits(
+                set(self.cfg['data']['ref_tips'].values()))
+            if self.vcs_client.count_commits(
+                    tip_revs, exclude_revs=previous_tips, paths=paths):
+                new_history = self.vcs_client.extract_commit_history(
+                    revs=tip_revs, include_trees=include_trees, paths=paths,
+                    exclude_revs=previous_tips, **kwargs)
+                previous_history = {key: self.get_frame(key)
+                                    for key in history_keys}
+                commit_history = merge_commit_history(previous_history,
+                                                      new_history)
+            else:
+                commit_history = dict(
+                    ref_frame=refs_to_ref_frame(
+                        self.vcs_client.repository.refs))
+        else:
+            commit_history = self.vcs_client.extract_commit_history(
+                revs=tip_revs, include_trees=include_trees, paths=paths,
+                **kwargs)
         for key, df in commit_history.items():
             self.save_frame(key, df=df, persist_feather=persist)
+        self.cfg['data']['ref_tips'] = dict(ref_tips)
         return set(commit_history.keys())
 
+    def _has_commit_history(self, history_keys):
+        return (self.cfg['data'].get('ref_tips') and
+                all(key in self.data or key in self.cfg['data']['frames']
+                    for key in history_keys))
+
+    def get_frame(self, key):
+        if key in self.data:
+            return self.data[key]
+        else:
+            return self.load_frame(key)
+
     def combine_authors(self,
                         connectivity_sets,
                         actor_frame_key='actor_frame',
@@ -1,5 +1,7 @@
 # coding=utf-8
 
+from .code_graph import (CodeGraph, CodeGraphBuilder, open_graph_snapshot,
+                         save_graph_snapshot)
 from .scitools_client import ScitoolsClient, ScitoolsProject
 from .sonar_client import SonarClient
 from .scitools_etl import ScitoolsETL
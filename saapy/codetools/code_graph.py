@@ -0,0 +1,767 @@
+# coding=utf-8
+
+"""
+compact array backed code graph, nodes are numbered in the order they are
+added, edges are kept in CSR adjacency arrays per edge type, node and edge
+attributes are stored by column: numbers in numeric arrays, repeated
+strings like kinds interned into codes of a vocabulary, other strings in a
+single utf-8 buffer with offsets and dict attributes like metrics in a
+dense float matrix, the graph answers the networkx 1.x MultiDiGraph read
+calls used by the existing code
+
+graphs are saved as snapshots, directories of npy files with the node ids,
+their hash index, the adjacency arrays in both directions and the attribute
+columns, and a meta json file describing them, a snapshot is opened by
+mapping the files read only, so opening takes constant time, pages are read
+on demand and processes opening the same snapshot share them
+"""
+
+import hashlib
+import json
+import logging
+import numbers
+import shutil
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EDGE_TYPE = 'edge'
+
+META_FILE = 'meta.json'
+
+SNAPSHOT_FORMAT = 'saapy-graph-snapshot'
+
+SNAPSHOT_VERSION = 1
+
+# string columns with at most this share of distinct values are interned
+INTERN_RATIO = 0.5
+
+# string columns interned whatever the share of their distinct values
+INTERNED_COLUMNS = ('kindname', 'kind_longname', 'language', 'node_type',
+                    'file')
+
+
+class StringColumn:
+    """
+    strings of a column concatenated to utf-8 bytes with their offsets,
+    missing strings are marked by the mask
+    """
+
+    def __init__(self, offsets, data, missing=None):
+        self.offsets = offsets
+        self.data = data
+        self.missing = missing
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [b'' if value is None else value.encode('utf-8')
+                   for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        missing = None
+        if any(value is None for value in values):
+            missing = np.array([value is None for value in values])
+        return cls(offsets, data, missing)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i):
+        if self.missing is not None and self.missing[i]:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.data[start:end]).decode('utf-8')
+
+    def arrays(self):
+        arrays = dict(offsets=self.offsets, data=self.data)
+        if self.missing is not None:
+            arrays['missing'] = self.missing
+        return arrays
+
+
+class Column:
+    """
+    attribute column of one of the kinds:
+    bool, int - bool or int64 array, the mask marks missing values
+    float - float64 array, NaN marks missing values
+    intern - int32 codes of the vocabulary, -1 marks missing values
+    string - StringColumn
+    matrix - float matrix of dict values with a column per key, NaN marks
+    missing keys and the mask missing dicts
+    """
+
+    def __init__(self, kind, arrays, vocabulary=None):
+        """
+        :param vocabulary: list or StringColumn of the interned strings or
+        of the matrix column names
+        """
+        self.kind = kind
+        self.arrays = arrays
+        self.vocabulary = vocabulary
+        self._keys = None
+        if kind == 'string':
+            self.strings = StringColumn(arrays['offsets'], arrays['data'],
+                                        arrays.get('missing'))
+
+    @classmethod
+    def from_values(cls, values, intern=False):
+        """
+        :param intern: intern strings even if most of them are distinct
+        """
+        present = [value for value in values if value is not None]
+        if present and all(isinstance(value, dict) for value in present):
+            keys = {}
+            for value in present:
+                keys.update(dict.fromkeys(value))
+            matrix = np.full((len(values), len(keys)), np.nan)
+            key_index = {key: j for j, key in enumerate(keys)}
+            for i, value in enumerate(values):
+                for key, item in (value or {}).items():
+                    if isinstance(item, numbers.Real):
+                        matrix[i, key_index[key]] = item
+            arrays = dict(values=matrix)
+            if len(present) < len(values):
+                arrays['missing'] = np.array([value is None
+                                              for value in values])
+            return cls('matrix', arrays, vocabulary=list(keys))
+        # the kinds keep the types a networkx graph would return
+        if present and all(isinstance(value, (bool, np.bool_))
+                           for value in present):
+            return cls.from_present_values('bool', values, np.bool_)
+        if present and all(isinstance(value, numbers.Integral)
+                           for value in present):
+            return cls.from_present_values('int', values, np.int64)
+        if all(isinstance(value, numbers.Real) for value in present):
+            return cls('float', dict(values=np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64)))
+        values = [value if value is None or isinstance(value, str)
+                  else str(value) for value in values]
+        vocabulary = {}
+        for value in present:
+            vocabulary.setdefault(value, len(vocabulary))
+            if not intern and len(vocabulary) > INTERN_RATIO * len(present):
+                break
+        else:
+            codes = np.array([-1 if value is None else vocabulary[value]
+                              for value in values], dtype=np.int32)
+            return cls('intern', dict(codes=codes),
+                       vocabulary=list(vocabulary))
+        return cls('string', StringColumn.from_values(values).arrays())
+
+    @classmethod
+    def from_present_values(cls, kind, values, dtype):
+        arrays = dict(values=np.array(
+            [0 if value is None else value for value in values],
+            dtype=dtype))
+        if any(value is None for value in values):
+            arrays['missing'] = np.array([value is None for value in values])
+        return cls(kind, arrays)
+
+    def get(self, i):
+        """
+        :return: value of the row i, None when it is missing
+        """
+        if self.kind == 'string':
+            return self.strings[i]
+        if self.kind == 'intern':
+            code = self.arrays['codes'][i]
+            return None if code < 0 else self.vocabulary[code]
+        if self.kind == 'matrix':
+            if 'missing' in self.arrays and self.arrays['missing'][i]:
+                return None
+            if self._keys is None:
+                self._keys = list(self.vocabulary)
+            row = self.arrays['values'][i]
+            return {key: float(value) for key, value in zip(self._keys, row)
+                    if not np.isnan(value)}
+        value = self.arrays['values'][i]
+        if self.kind == 'float':
+            return None if np.isnan(value) else float(value)
+        if 'missing' in self.arrays and self.arrays['missing'][i]:
+            return None
+        if self.kind == 'bool':
+            return bool(value)
+        return int(value)
+
+    def take(self, order):
+        """
+        :return: column of the rows in the order
+        """
+        if self.kind == 'string':
+            return Column('string', StringColumn.from_values(
+                [self.strings[i] for i in order]).arrays())
+        return Column(self.kind, {name: array[order]
+                                  for name, array in self.arrays.items()},
+                      vocabulary=self.vocabulary)
+
+    def spec(self):
+        return dict(kind=self.kind, arrays=sorted(self.arrays),
+                    vocabulary=self.vocabulary is not None)
+
+    def snapshot_arrays(self):
+        """
+        :return: dict of the arrays and of the vocabulary arrays
+        """
+        arrays = dict(self.arrays)
+        if self.vocabulary is not None:
+            vocabulary = self.vocabulary
+            if not isinstance(vocabulary, StringColumn):
+                vocabulary = StringColumn.from_values(
+                    [str(key) for key in vocabulary])
+            for name, array in vocabulary.arrays().items():
+                arrays['vocabulary.{}'.format(name)] = array
+        return arrays
+
+
+def encode_columns(rows, count):
+    """
+    :param rows: list of (row index, attribute dict)
+    :return: dict of columns of the attributes keyed by attribute name
+    """
+    names = {}
+    for _, attrs in rows:
+        names.update(dict.fromkeys(attrs))
+    columns = {}
+    for name in names:
+        values = [None] * count
+        for i, attrs in rows:
+            values[i] = attrs.get(name)
+        columns[name] = Column.from_values(
+            values, intern=name in INTERNED_COLUMNS)
+    return columns
+
+
+def row_attrs(columns, i):
+    attrs = {}
+    for name, column in columns.items():
+        value = column.get(i)
+        if value is not None:
+            attrs[name] = value
+    return attrs
+
+
+class EdgeSet:
+    """
+    edges of one type in CSR order of their source nodes with their
+    attribute columns in the same order
+    """
+
+    def __init__(self, indptr, indices, columns, reverse=None):
+        """
+        :param reverse: (indptr, edge positions) of the edges by target
+        node, computed on demand when not given
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.columns = columns
+        self._reverse = reverse
+
+    @classmethod
+    def from_edges(cls, node_count, sources, targets, attrs):
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=node_count),
+                  out=indptr[1:])
+        indices = np.asarray(targets, dtype=np.int64)[order]
+        columns = encode_columns(list(enumerate(attrs)), len(attrs))
+        columns = {name: column.take(order)
+                   for name, column in columns.items()}
+        return cls(indptr, indices, columns)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def out_range(self, u):
+        return range(self.indptr[u], self.indptr[u + 1])
+
+    def reverse(self):
+        """
+        :return: (indptr, edge positions) of the edges by target node
+        """
+        if self._reverse is None:
+            order = np.argsort(self.indices, kind='stable')
+            indptr = np.zeros(len(self.indptr), dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=len(indptr) - 1),
+                      out=indptr[1:])
+            self._reverse = indptr, order
+        return self._reverse
+
+    def source(self, position):
+        return int(np.searchsorted(self.indptr, position, side='right')) - 1
+
+
+class NodeAttrView(Mapping):
+    """
+    read only mapping of node ids to their attribute dicts like
+    MultiDiGraph.node
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, node_id):
+        return self.graph.node_attrs(self.graph.node_index(node_id))
+
+    def __contains__(self, node_id):
+        return node_id in self.graph
+
+    def __iter__(self):
+        return iter(self.graph)
+
+    def __len__(self):
+        return len(self.graph)
+
+
+class CodeGraph:
+    """
+    immutable compact graph, see the module description, created by
+    CodeGraphBuilder.build, from_networkx or load
+    """
+
+    path = None
+
+    def __init__(self, node_ids: StringColumn, node_columns: dict,
+                 edge_sets: dict, id_index=None):
+        """
+        :param edge_sets: dict of EdgeSet keyed by edge type
+        :param id_index: (sorted node id hashes, node indices) of the node
+        id lookup, computed on demand when not given
+        """
+        self.node_ids = node_ids
+        self.node_columns = node_columns
+        self.edge_sets = edge_sets
+        self._id_index = id_index
+        self.node = NodeAttrView(self)
+
+    def __reduce_ex__(self, protocol):
+        # a snapshot is pickled as its path, so processes unpickling it
+        # map the same read only files instead of copying the arrays
+        if self.path is not None:
+            return open_graph_snapshot, (str(self.path),)
+        return super().__reduce_ex__(protocol)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        builder = CodeGraphBuilder()
+        for node_id, attrs in graph.nodes(data=True):
+            builder.add_node(node_id, attrs)
+        for u, v, attrs in graph.edges(data=True):
+            builder.add_edge(u, v, attrs)
+        return builder.build()
+
+    def to_networkx(self):
+        import networkx as nx
+        graph = nx.MultiDiGraph()
+        for node_id, attrs in self.nodes_iter(data=True):
+            graph.add_node(node_id, attr_dict=attrs)
+        for u, v, attrs in self.edges_iter(data=True):
+            graph.add_edge(u, v, attr_dict=attrs)
+        return graph
+
+    @property
+    def edge_types(self):
+        return list(self.edge_sets)
+
+    def csr(self, edge_type):
+        """
+        :return: (indptr, indices) adjacency arrays of the edge type
+        """
+        edge_set = self.edge_sets[edge_type]
+        return edge_set.indptr, edge_set.indices
+
+    def node_index(self, node_id):
+        """
+        :return: index of the node found by binary search of its id hash
+        """
+        if self._id_index is None:
+            self._id_index = hash_node_ids(self.node_ids)
+        hashes, order = self._id_index
+        if not isinstance(node_id, str):
+            raise KeyError(node_id)
+        id_hash = node_id_hash(node_id)
+        k = int(np.searchsorted(hashes, id_hash))
+        while k < len(hashes) and hashes[k] == id_hash:
+            if self.node_ids[order[k]] == node_id:
+                return int(order[k])
+            k += 1
+        raise KeyError(node_id)
+
+    def node_attrs(self, i):
+        return row_attrs(self.node_columns, i)
+
+    def node_column(self, name):
+        """
+        :return: list of the node attribute values, None for missing ones
+        """
+        column = self.node_columns[name]
+        return [column.get(i) for i in range(len(self))]
+
+    def matrix(self, name='metrics'):
+        """
+        :return: (float matrix, column names) of a dict attribute, NaN marks
+        missing values
+        """
+        column = self.node_columns[name]
+        return column.arrays['values'], list(column.vocabulary)
+
+    def edge_attrs(self, edge_type, position):
+        attrs = row_attrs(self.edge_sets[edge_type].columns, position)
+        attrs['edge_type'] = edge_type
+        return attrs
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __iter__(self):
+        return (self.node_ids[i] for i in range(len(self)))
+
+    def __contains__(self, node_id):
+        try:
+            self.node_index(node_id)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    has_node = __contains__
+
+    def number_of_nodes(self):
+        return len(self)
+
+    def number_of_edges(self):
+        return sum(len(edge_set) for edge_set in self.edge_sets.values())
+
+    def nodes_iter(self, data=False):
+        for i in range(len(self)):
+            if data:
+                yield self.node_ids[i], self.node_attrs(i)
+            else:
+                yield self.node_ids[i]
+
+    def nodes(self, data=False):
+        return list(self.nodes_iter(data=data))
+
+    def _node_indices(self, nbunch):
+        if nbunch is None:
+            return range(len(self))
+        if nbunch in self:
+            return [self.node_index(nbunch)]
+        return [self.node_index(n) for n in nbunch if n in self]
+
+    def out_edges_iter(self, nbunch=None, data=False, keys=False):
+        for u in self._node_indices(nbunch):
+            key_counts = {}
+            for edge_type, edge_set in self.edge_sets.items():
+                for position in edge_set.out_range(u):
+                    yield self._edge_tuple(
+                        u, edge_set.indices[position], edge_type, position,
+                        key_counts, data, keys)
+
+    edges_iter = out_edges_iter
+
+    def out_edges(self, nbunch=None, data=False, keys=False):
+        return list(self.out_edges_iter(nbunch, data=data, keys=keys))
+
+    edges = out_edges
+
+    def in_edges_iter(self, nbunch=None, data=False, keys=False):
+        for v in self._node_indices(nbunch):
+            key_counts = {}
+            for edge_type, edge_set in self.edge_sets.items():
+                indptr, order = edge_set.reverse()
+                for position in order[indptr[v]:indptr[v + 1]]:
+                    yield self._edge_tuple(
+                        edge_set.source(position), v, edge_type, position,
+                        key_counts, data, keys)
+
+    def in_edges(self, nbunch=None, data=False, keys=False):
+        return list(self.in_edges_iter(nbunch, data=data, keys=keys))
+
+    def _edge_tuple(self, u, v, edge_type, position, key_counts, data, keys):
+        edge = (self.node_ids[u], self.node_ids[v])
+        if keys:
+            key = key_counts.get((u, v), 0)
+            key_counts[(u, v)] = key + 1
+            edge += (key,)
+        if data:
+            edge += (self.edge_attrs(edge_type, position),)
+        return edge
+
+    def successors_iter(self, node_id):
+        seen = set()
+        for _, v in self.out_edges_iter(node_id):
+            if v not in seen:
+                seen.add(v)
+                yield v
+
+    def successors(self, node_id):
+        return list(self.successors_iter(node_id))
+
+    neighbors = successors
+    neighbors_iter = successors_iter
+
+    def predecessors_iter(self, node_id):
+        seen = set()
+        for u, _ in self.in_edges_iter(node_id):
+            if u not in seen:
+                seen.add(u)
+                yield u
+
+    def predecessors(self, node_id):
+        return list(self.predecessors_iter(node_id))
+
+    def out_degree(self, node_id):
+        u = self.node_index(node_id)
+        return sum(len(edge_set.out_range(u))
+                   for edge_set in self.edge_sets.values())
+
+    def in_degree(self, node_id):
+        v = self.node_index(node_id)
+        degree = 0
+        for edge_set in self.edge_sets.values():
+            indptr, _ = edge_set.reverse()
+            degree += int(indptr[v + 1] - indptr[v])
+        return degree
+
+    def has_edge(self, u, v):
+        return u in self and v in self.successors(u)
+
+    def __getitem__(self, node_id):
+        """
+        :return: dict of target nodes to dicts of edge keys to edge
+        attributes like MultiDiGraph[node_id]
+        """
+        adjacency = {}
+        for _, v, key, attrs in self.out_edges_iter(node_id, data=True,
+                                                    keys=True):
+            adjacency.setdefault(v, {})[key] = attrs
+        return adjacency
+
+    def save(self, directory):
+        """
+        writes the graph snapshot, the arrays go to npy files and the
+        column descriptions to the meta json file of the directory, the
+        snapshot is written to a new directory which then replaces the
+        previous snapshot, so an interrupted save leaves the previous one
+        whole and graphs mapping its files, this one included, keep reading
+        them
+        """
+        directory = Path(directory)
+        if (directory.exists() and any(directory.iterdir()) and
+                not (directory / META_FILE).exists()):
+            raise ValueError('{} is not a graph snapshot directory'.format(
+                directory))
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        new_directory = Path(tempfile.mkdtemp(
+            prefix='.{}.'.format(directory.name), dir=str(directory.parent)))
+        try:
+            self._write_snapshot(new_directory)
+            replace_directory(new_directory, directory)
+        except BaseException:
+            shutil.rmtree(str(new_directory), ignore_errors=True)
+            raise
+        logger.info('saved graph snapshot of %s nodes and %s edges to %s',
+                    len(self), self.number_of_edges(), directory)
+
+    def _write_snapshot(self, directory):
+        if self._id_index is None:
+            self._id_index = hash_node_ids(self.node_ids)
+        hashes, order = self._id_index
+        arrays = {'nodes.ids.{}'.format(name): array
+                  for name, array in self.node_ids.arrays().items()}
+        arrays['nodes.ids.hashes'] = hashes
+        arrays['nodes.ids.order'] = order
+        meta = dict(format=SNAPSHOT_FORMAT, version=SNAPSHOT_VERSION,
+                    node_count=len(self),
+                    node_ids=sorted(self.node_ids.arrays()),
+                    node_columns={}, edge_sets={})
+        for name, column in self.node_columns.items():
+            meta['node_columns'][name] = column.spec()
+            for array_name, array in column.snapshot_arrays().items():
+                arrays['nodes.{}.{}'.format(name, array_name)] = array
+        for edge_type, edge_set in self.edge_sets.items():
+            edge_meta = meta['edge_sets'][edge_type] = dict(
+                edge_count=len(edge_set), columns={})
+            prefix = 'edges.{}'.format(edge_type)
+            reverse_indptr, reverse_order = edge_set.reverse()
+            arrays['{}.indptr'.format(prefix)] = edge_set.indptr
+            arrays['{}.indices'.format(prefix)] = edge_set.indices
+            arrays['{}.reverse_indptr'.format(prefix)] = reverse_indptr
+            arrays['{}.reverse_order'.format(prefix)] = reverse_order
+            for name, column in edge_set.columns.items():
+                edge_meta['columns'][name] = column.spec()
+                for array_name, array in column.snapshot_arrays().items():
+                    arrays['{}.{}.{}'.format(
+                        prefix, name, array_name)] = array
+        for name, array in arrays.items():
+            np.save(str(directory / '{}.npy'.format(name)),
+                    np.ascontiguousarray(array))
+        with open(str(directory / META_FILE), 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        opens the graph snapshot reading only the meta file and the npy
+        headers, the pages of the arrays are read on demand and shared by
+        the processes mapping the same snapshot
+        :param mmap: map the arrays into memory instead of reading them
+        """
+        directory = Path(directory)
+        mmap_mode = 'r' if mmap else None
+
+        def load_array(name):
+            return np.load(str(directory / '{}.npy'.format(name)),
+                           mmap_mode=mmap_mode)
+
+        def load_column(prefix, spec):
+            vocabulary = None
+            if spec['vocabulary']:
+                vocabulary = StringColumn(
+                    load_array('{}.vocabulary.offsets'.format(prefix)),
+                    load_array('{}.vocabulary.data'.format(prefix)))
+            return Column(spec['kind'],
+                          {array_name: load_array('{}.{}'.format(
+                              prefix, array_name))
+                           for array_name in spec['arrays']},
+                          vocabulary=vocabulary)
+
+        with open(str(directory / META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        if (meta.get('format') != SNAPSHOT_FORMAT or
+                meta.get('version') != SNAPSHOT_VERSION):
+            raise ValueError('{} is not a graph snapshot of version {}'.format(
+                directory, SNAPSHOT_VERSION))
+        id_arrays = {name: load_array('nodes.ids.{}'.format(name))
+                     for name in meta['node_ids']}
+        node_ids = StringColumn(id_arrays['offsets'], id_arrays['data'],
+                                id_arrays.get('missing'))
+        node_columns = {
+            name: load_column('nodes.{}'.format(name), spec)
+            for name, spec in meta['node_columns'].items()}
+        edge_sets = {}
+        for edge_type, edge_meta in meta['edge_sets'].items():
+            prefix = 'edges.{}'.format(edge_type)
+            edge_sets[edge_type] = EdgeSet(
+                load_array('{}.indptr'.format(prefix)),
+                load_array('{}.indices'.format(prefix)),
+                {name: load_column('{}.{}'.format(prefix, name), spec)
+                 for name, spec in edge_meta['columns'].items()},
+                reverse=(load_array('{}.reverse_indptr'.format(prefix)),
+                         load_array('{}.reverse_order'.format(prefix))))
+        graph = cls(node_ids, node_columns, edge_sets,
+                    id_index=(load_array('nodes.ids.hashes'),
+                              load_array('nodes.ids.order')))
+        if mmap:
+            graph.path = directory
+        return graph
+
+
+def replace_directory(new_directory, directory):
+    """
+    renames new_directory to directory removing the previous directory,
+    files of the previous directory mapped into memory stay readable
+    until they are unmapped
+    """
+    if not directory.exists():
+        new_directory.rename(directory)
+        return
+    old_root = Path(tempfile.mkdtemp(prefix='.{}.'.format(directory.name),
+                                     dir=str(directory.parent)))
+    directory.rename(old_root / directory.name)
+    new_directory.rename(directory)
+    shutil.rmtree(str(old_root), ignore_errors=True)
+
+
+def node_id_hash(node_id):
+    digest = hashlib.blake2b(node_id.encode('utf-8'), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, 'little'))
+
+
+def hash_node_ids(node_ids):
+    """
+    :return: (sorted node id hashes, node indices in the hash order)
+    """
+    hashes = np.array([node_id_hash(node_id) for node_id in node_ids],
+                      dtype=np.uint64)
+    order = np.argsort(hashes, kind='stable')
+    return hashes[order], order
+
+
+def save_graph_snapshot(graph, directory):
+    """
+    saves the CodeGraph or networkx graph as a graph snapshot
+    :return: the graph opened from the snapshot
+    """
+    if not isinstance(graph, CodeGraph):
+        graph = CodeGraph.from_networkx(graph)
+    graph.save(directory)
+    return open_graph_snapshot(directory)
+
+
+def open_graph_snapshot(directory) -> CodeGraph:
+    return CodeGraph.load(directory, mmap=True)
+
+
+class CodeGraphBuilder:
+    """
+    collects nodes and edges with the networkx 1.x add_node and add_edge
+    calls and builds the CodeGraph, edges to unknown nodes add the nodes
+    without attributes like networkx does
+    """
+
+    def __init__(self):
+        self._node_index = {}
+        self._node_attrs = []
+        self._edges = {}
+
+    def __len__(self):
+        return len(self._node_attrs)
+
+    def __contains__(self, node_id):
+        return node_id in self._node_index
+
+    def add_node(self, node_id, attr_dict=None, **attrs):
+        i = self._add_node_id(node_id)
+        self._node_attrs[i].update(attr_dict or {}, **attrs)
+
+    def add_edge(self, u, v, key=None, attr_dict=None, **attrs):
+        """
+        :param key: ignored, keys of parallel edges are their positions
+        """
+        if isinstance(key, dict) and attr_dict is None:
+            attr_dict = key
+        attrs = dict(attr_dict or {}, **attrs)
+        edge_type = attrs.pop('edge_type', DEFAULT_EDGE_TYPE)
+        sources, targets, edge_attrs = self._edges.setdefault(
+            edge_type, ([], [], []))
+        sources.append(self._add_node_id(u))
+        targets.append(self._add_node_id(v))
+        edge_attrs.append(attrs)
+
+    def _add_node_id(self, node_id):
+        i = self._node_index.get(node_id)
+        if i is None:
+            i = self._node_index[node_id] = len(self._node_attrs)
+            self._node_attrs.append({})
+        return i
+
+    def build(self) -> CodeGraph:
+        node_count = len(self._node_attrs)
+        node_ids = StringColumn.from_values(
+            [str(node_id) for node_id in self._node_index])
+        node_columns = encode_columns(list(enumerate(self._node_attrs)),
+                                      node_count)
+        edge_sets = {
+            edge_type: EdgeSet.from_edges(node_count, *edges)
+            for edge_type, edges in self._edges.items()}
+        return CodeGraph(node_ids, node_columns, edge_sets)
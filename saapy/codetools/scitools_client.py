@@ -1,6 +1,7 @@
 # coding=utf-8
 import contextlib
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from tempfile import NamedTemporaryFile
 from pathlib import Path
 
@@ -10,6 +11,10 @@ import shutil
 
 import networkx as nx
 from sortedcontainers import SortedSet
+from toolz import partition_all
+
+from saapy.util.struct_stream import iter_struct_file, open_struct_writer
+from .code_graph import CodeGraph, CodeGraphBuilder, save_graph_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -19,27 +24,118 @@ def und_tool_exists() -> bool:
 
 
 class ScitoolsProject:
-    code_graph: nx.MultiDiGraph
+    code_graph = None  # nx.MultiDiGraph or compact CodeGraph
     metrics: dict
     root_path: Path
     root_arch_ids = None
     entity_kinds: SortedSet
     ref_kinds: SortedSet
 
-    def __init__(self, root_path):
-        self.code_graph = nx.MultiDiGraph()
+    def __init__(self, root_path, include_contents=True,
+                 include_comments=True, compact=False):
+        """
+        :param include_contents: read the source of the entities, skipping
+        it saves most of the extraction time of large projects
+        :param include_comments: read the comments of the entities
+        :param compact: populate code_graph as the array backed CodeGraph
+        instead of networkx MultiDiGraph
+        """
+        self.compact = compact
+        self.code_graph = CodeGraphBuilder() if compact else nx.MultiDiGraph()
         self.metrics = {}
         self.root_path = Path(root_path)
         self.root_arch_ids = []
         self.entity_kinds = SortedSet()
         self.ref_kinds = SortedSet()
+        self.include_contents = include_contents
+        self.include_comments = include_comments
 
-    def populate(self, project_db):
+    def populate(self, project_db, udb_path=None, workers=1,
+                 shard_size=1000):
+        """
+        :param udb_path: path of the project_db udb opened read only by the
+        worker processes, required when workers > 1
+        :param workers: number of processes extracting disjoint shards of
+        the entities
+        :param shard_size: number of entities extracted by a worker task
+        """
         metric_names = project_db.metrics()
         self.metrics = project_db.metric(metric_names)
         self.root_arch_ids = self.add_architectures(project_db.root_archs())
-        for entity in project_db.ents():
-            self.add_entity(entity)
+        for record in self.extract_entity_records(
+                project_db, udb_path=udb_path, workers=workers,
+                shard_size=shard_size):
+            self.add_entity_record(record)
+        if self.compact:
+            self.compact_code_graph()
+
+    def compact_code_graph(self) -> CodeGraph:
+        """
+        replaces code_graph with its CodeGraph
+        """
+        if isinstance(self.code_graph, CodeGraphBuilder):
+            self.code_graph = self.code_graph.build()
+        elif not isinstance(self.code_graph, CodeGraph):
+            self.code_graph = CodeGraph.from_networkx(self.code_graph)
+        return self.code_graph
+
+    def save_code_graph(self, directory) -> CodeGraph:
+        """
+        saves code_graph as a graph snapshot and replaces it with the
+        snapshot opened read only, so pickling the project afterwards
+        stores only the snapshot path of the graph
+        """
+        self.code_graph = save_graph_snapshot(self.compact_code_graph(),
+                                              directory)
+        return self.code_graph
+
+    def extract_entity_records(self, project_db, udb_path=None, workers=1,
+                               shard_size=1000):
+        """
+        :return: iterator of the entity records of add_entity_record in the
+        order of project_db.ents()
+        """
+        if workers == 1:
+            for entity in project_db.ents():
+                yield self.entity_to_record(entity)
+            return
+        if udb_path is None:
+            raise ValueError('udb_path is required to extract entities '
+                             'in {} workers'.format(workers))
+        shards = list(partition_all(
+            shard_size, (entity.id() for entity in project_db.ents())))
+        logger.info('extracting %s shards of entities in %s workers',
+                    len(shards), workers)
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_udb_worker,
+                initargs=(str(udb_path), str(self.root_path),
+                          self.include_contents, self.include_comments)
+        ) as executor:
+            for records in executor.map(_extract_entity_shard, shards):
+                yield from records
+
+    def export_entity_records(self, project_db, records_path, udb_path=None,
+                              workers=1, shard_size=1000):
+        """
+        streams the entity records to a json lines file instead of keeping
+        them in the code graph
+        :return: number of exported records
+        """
+        with open_struct_writer(records_path) as writer:
+            for record in self.extract_entity_records(
+                    project_db, udb_path=udb_path, workers=workers,
+                    shard_size=shard_size):
+                writer.write(record)
+        return writer.count
+
+    def import_entity_records(self, records_path):
+        """
+        adds the entity records exported by export_entity_records
+        """
+        for record in iter_struct_file(records_path):
+            self.add_entity_record(record)
+        if self.compact:
+            self.compact_code_graph()
 
     def add_architectures(self, archs):
         arch_ids = []
@@ -65,20 +161,38 @@ class ScitoolsProject:
         return arch_ids
 
     def add_entity(self, ent):
+        return self.add_entity_record(self.entity_to_record(ent))
+
+    def entity_to_record(self, ent):
+        """
+        :return: dict of the entity attributes, of its parent node id and of
+        its refs with their target node ids, picklable and json friendly
+        """
         e = self.entity_to_dict(ent)
-        node_id = self.get_node_id(ent_attrs=e)
-        self.code_graph.add_node(node_id, attr_dict=e)
-        self.entity_kinds.add(e['kind_longname'])
         parent = ent.parent()
-        if parent:
-            parent_id = self.get_node_id(ent=parent)
-            self.code_graph.add_edge(node_id, parent_id,
-                                     edge_type='parent')
+        refs = []
         for ref in ent.refs():
             r = self.ref_to_dict(ref)
-            self.code_graph.add_edge(node_id,
-                                     self.get_node_id(ref.ent()),
-                                     attr_dict=r)
+            r['target_id'] = self.get_node_id(ref.ent())
+            refs.append(r)
+        return dict(node_id=self.get_node_id(ent_attrs=e),
+                    attrs=e,
+                    parent_id=self.get_node_id(ent=parent) if parent else None,
+                    refs=refs)
+
+    def add_entity_record(self, record):
+        node_id = record['node_id']
+        e = record['attrs']
+        self.code_graph.add_node(node_id, attr_dict=e)
+        self.entity_kinds.add(e['kind_longname'])
+        # struct files drop the parent_id of entities without a parent
+        parent_id = record.get('parent_id')
+        if parent_id is not None:
+            self.code_graph.add_edge(node_id, parent_id, edge_type='parent')
+        for r in record['refs']:
+            r = dict(r)
+            target_id = r.pop('target_id')
+            self.code_graph.add_edge(node_id, target_id, attr_dict=r)
             self.ref_kinds.add(r['kind_longname'])
         return node_id
 
@@ -140,14 +254,16 @@ class ScitoolsProject:
         e['library'] = ent.library()
         metric_names = ent.metrics()
         e['metrics'] = ent.metric(metric_names)
-        try:
-            e['contents'] = ent.contents()
-        except UnicodeDecodeError:
-            e['contents'] = ''
-        try:
-            e['comments'] = ent.comments()
-        except UnicodeDecodeError:
-            e['comments'] = ''
+        if self.include_contents:
+            try:
+                e['contents'] = ent.contents()
+            except UnicodeDecodeError:
+                e['contents'] = ''
+        if self.include_comments:
+            try:
+                e['comments'] = ent.comments()
+            except UnicodeDecodeError:
+                e['comments'] = ''
         e['node_type'] = 'entity'
         # e['ib'] = ent.ib()
         # ent.depends()
@@ -161,6 +277,26 @@ class ScitoolsProject:
         return e
 
 
+_worker_db = None
+
+_worker_project = None
+
+
+def _init_udb_worker(udb_path, root_path, include_contents,
+                     include_comments):
+    global _worker_db, _worker_project
+    import understand
+    _worker_db = understand.open(udb_path)
+    _worker_project = ScitoolsProject(root_path,
+                                      include_contents=include_contents,
+                                      include_comments=include_comments)
+
+
+def _extract_entity_shard(ent_ids):
+    return [_worker_project.entity_to_record(_worker_db.ent_from_id(ent_id))
+            for ent_id in ent_ids]
+
+
 class ScitoolsClient:
     project_db = None
     project_path: Path
@@ -217,9 +353,19 @@ class ScitoolsClient:
     def analyze_project(self):
         subprocess.run(['und', 'analyze', str(self.project_path)])
 
-    def build_project(self, root_path):
-        project = ScitoolsProject(root_path)
-        project.populate(self.project_db)
+    def build_project(self, root_path, workers=1, include_contents=True,
+                      include_comments=True, compact=False):
+        """
+        :param workers: number of processes extracting the entities from the
+        project udb opened read only
+        :param compact: build the code graph as CodeGraph
+        """
+        project = ScitoolsProject(root_path,
+                                  include_contents=include_contents,
+                                  include_comments=include_comments,
+                                  compact=compact)
+        project.populate(self.project_db, udb_path=self.project_path,
+                         workers=workers)
         return project
 
     def remove_project(self):
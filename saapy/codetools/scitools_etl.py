@@ -4,13 +4,67 @@
 implementation of ETL from scitools understand database to other storages
 """
 
+from pathlib import Path
 from typing import List
-from saapy.graphdb import Neo4jClient
+
+from saapy.graphdb import Neo4jClient, Neo4jCsvExport
+from saapy.util.struct_stream import (DEFAULT_ROW_GROUP_SIZE,
+                                      iter_struct_file, open_struct_writer,
+                                      struct_file_path)
 import logging
 
 
 logger = logging.getLogger(__name__)
 
+SCITOOLS_NODESETS = ('ScitoolsProject', 'ScitoolsEntity', 'ScitoolsRef')
+
+# node sets imported to neo4j and the properties they are merged on
+NEO4J_NODESET_KEYS = (('ScitoolsProject', 'name'),
+                      ('ScitoolsEntity', 'ent_id'),
+                      ('ScitoolsRef', 'ref_id'))
+
+# relationship types with the ref property matching the entity id and the
+# relationship pattern
+NEO4J_REF_LINKS = (('Scopes', 'scope_ent_id', '(ent)-[:Scopes]->(ref)'),
+                   ('Refs', 'ent_id', '(ref)-[:Refs]->(ent)'),
+                   ('Includes', 'file_ent_id', '(ent)-[:Includes]->(ref)'))
+
+COUPLES_SCHEMA_QUERIES = ('CREATE INDEX ON :JavaFile(name)',
+                          'CREATE INDEX ON :JavaPackage(name)',
+                          'CREATE INDEX ON :JavaClass(name)')
+
+# queries of store_couples_batched over the rows collected by
+# collect_couples, files without metrics are files of the coupled classes
+COUPLES_UNWIND_QUERIES = (
+    ('files', """
+    UNWIND {rows} AS row
+    MERGE (file:JavaFile {name: row.file_name})
+    MERGE (package:JavaPackage {name: row.package_name})
+    MERGE (file)-[r:DEFINES]->(package)
+    FOREACH (metrics IN CASE WHEN row.count_line_code IS NULL
+                        THEN [] ELSE [row] END |
+        SET file.count_line_code = metrics.count_line_code,
+            file.sum_cyclomatic_strict = metrics.sum_cyclomatic_strict)
+    """),
+    ('classes', """
+    UNWIND {rows} AS row
+    MATCH (file:JavaFile {name: row.file_name})
+    MATCH (package:JavaPackage {name: row.package_name})
+    MERGE (class:JavaClass {name: row.class_name})
+    MERGE (file)-[r:DEFINES]->(class)
+    MERGE (package)-[r1:CONTAINS]->(class)
+    """),
+    ('couples', """
+    UNWIND {rows} AS row
+    MATCH (from_class:JavaClass {name: row.from_class_name})
+    MATCH (to_class:JavaClass {name: row.to_class_name})
+    MERGE (from_class)-[r:COUPLES]->(to_class)
+    """))
+
+# ref properties stay on the ref nodes, not on their relationships
+REF_FIELDS = ('column', 'ent_id', 'file_ent_id', 'kind_longname', 'name',
+              'line', 'scope_ent_id', 'ref_id')
+
 
 class ScitoolsETL:
     """
@@ -25,23 +79,65 @@ class ScitoolsETL:
 
         :param struct_db:
         """
-        project = struct_db['ScitoolsProject'] = []
-        project.append(self.udb_to_struct())
+        for nodeset_name in SCITOOLS_NODESETS:
+            struct_db[nodeset_name] = []
+        for nodeset_name, struct in self.iter_structs():
+            struct_db[nodeset_name].append(struct)
+        return struct_db
+
+    def iter_structs(self):
+        """
+        :return: iterator of (node set name, struct) of the project, of the
+        entities and of the forward refs following their entity
+        """
+        yield 'ScitoolsProject', self.udb_to_struct()
         # archs = json_db.table('scitools_archs')
         # for arch in self.udb.archs():
         #     arch_struct = self.arch_to_struct(arch)
         #     archs.insert(arch_struct)
-        entities = struct_db['ScitoolsEntity'] = []
-        refs = struct_db['ScitoolsRef'] = []
         for entity in self.udb.ents():
-            entity_struct = self.entity_to_struct(entity)
-            entities.append(entity_struct)
+            yield 'ScitoolsEntity', self.entity_to_struct(entity)
             for ref in entity.refs():
                 if not ref.isforward():
                     continue
-                ref_struct = self.ref_to_struct(ref)
-                refs.append(ref_struct)
-        return struct_db
+                yield 'ScitoolsRef', self.ref_to_struct(ref)
+
+    def export_structs(self, output_dir, struct_format: str = 'jsonl',
+                       row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> dict:
+        """
+        streams the structs of transfer_to_struct_db to a file per node set
+        in output_dir as they are read from the udb
+        :param struct_format: 'jsonl' for line delimited json files or
+        'parquet' for parquet datasets written a row group at a time
+        :return: dict of struct counts keyed by node set name
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        writers = {}
+        try:
+            for nodeset_name in SCITOOLS_NODESETS:
+                writers[nodeset_name] = open_struct_writer(
+                    struct_file_path(output_dir, nodeset_name, struct_format),
+                    row_group_size=row_group_size)
+            for nodeset_name, struct in self.iter_structs():
+                writers[nodeset_name].write(struct)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return {nodeset_name: writer.count
+                for nodeset_name, writer in writers.items()}
+
+    @staticmethod
+    def read_structs(input_dir, struct_format: str = 'jsonl') -> dict:
+        """
+        reads the files written by export_structs
+        :return: scitools_db of import_to_neo4j with iterators reading the
+        node set files lazily
+        """
+        return {
+            nodeset_name: iter_struct_file(
+                struct_file_path(input_dir, nodeset_name, struct_format))
+            for nodeset_name in SCITOOLS_NODESETS}
 
     def udb_to_struct(self):
         """
@@ -141,52 +237,180 @@ class ScitoolsETL:
 
     @staticmethod
     def import_to_neo4j(scitools_db: dict, neo4j_client: Neo4jClient,
-                        chunk_size: int = 1000, labels: List[str] = []):
-        nodeset_names_to_import = ['ScitoolsProject',
-                                   'ScitoolsEntity',
-                                   'ScitoolsRef']
-        for nodeset_name in nodeset_names_to_import:
+                        chunk_size: int = 1000, labels: List[str] = [],
+                        link_batch_size: int = 10000, resume: bool = False):
+        """
+        imports the node sets and links refs to entities in batches of ref
+        id ranges, entities and refs are merged on their ids and the links
+        are merged, so the import can be repeated, the completed node sets
+        and ref ranges are recorded in ScitoolsImportProgress nodes
+        :param labels: labels of the project, entity ids are unique per
+        database when no labels are given and indexed otherwise
+        :param link_batch_size: number of refs linked in one transaction
+        :param resume: skip the node sets and ref ranges the previous import
+        completed
+        """
+        labels = list(labels)
+        ScitoolsETL.create_neo4j_schema(neo4j_client, labels)
+        if resume:
+            progress = ScitoolsETL.read_import_progress(neo4j_client, labels)
+        else:
+            neo4j_client.run_query("""
+            MATCH (p:ScitoolsImportProgress$labels) DELETE p
+            """, labels)
+            progress = {}
+        ref_count = None
+        for nodeset_name, key in NEO4J_NODESET_KEYS:
             node_labels = [nodeset_name] + labels
+            if progress.get(nodeset_name) is not None:
+                logger.info('skipping imported %s', nodeset_name)
+                continue
             nodes = scitools_db[nodeset_name]
-            logger.info('importing %s of %s', len(nodes), nodeset_name)
-            neo4j_client.import_nodes(nodes, chunk_size=chunk_size,
-                                      labels=node_labels)
-            logger.info('imported %s', nodeset_name)
+            if nodeset_name == 'ScitoolsRef':
+                nodes = (dict(ref, ref_id=ref_id)
+                         for ref_id, ref in enumerate(nodes))
+            logger.info('importing %s', nodeset_name)
+            query = """
+            MERGE (n$labels {%s: params.%s}) SET n = params
+            """ % (key, key)
+            stats = neo4j_client.bulk_load(query, nodes, labels=node_labels,
+                                           batch_rows=chunk_size)
+            if nodeset_name == 'ScitoolsRef':
+                ref_count = stats.rows
+            ScitoolsETL.save_import_progress(neo4j_client, labels,
+                                             nodeset_name, stats.rows)
+            logger.info('imported %s of %s', stats.rows, nodeset_name)
+        if ref_count is None:
+            ref_count = progress['ScitoolsRef']
 
         logger.info('creating relationships between Refs and Ents in neo4j')
-        neo4j_client.run_query("""
-        MATCH(ref:ScitoolsRef{labels})
-        WITH ref
-        MATCH (ent:ScitoolsEntity{labels})
-        WHERE ent.ent_id = ref.scope_ent_id
-        WITH ent, ref
-        CREATE (ent)-[r:Scopes]->(ref)
-        """, labels)
+        for rel_type, ent_id_property, link_pattern in NEO4J_REF_LINKS:
+            start_ref_id = progress.get(rel_type) or 0
+            for batch_start in range(start_ref_id, ref_count,
+                                     link_batch_size):
+                batch_end = min(batch_start + link_batch_size, ref_count)
+                neo4j_client.run_query("""
+                MATCH (ref:ScitoolsRef$labels)
+                WHERE ref.ref_id >= {batch_start} AND ref.ref_id < {batch_end}
+                MATCH (ent:ScitoolsEntity$labels {ent_id: ref.%s})
+                MERGE %s
+                WITH count(*) AS linked
+                MERGE (p:ScitoolsImportProgress$labels {step: {step}})
+                SET p.count = {batch_end}
+                """ % (ent_id_property, link_pattern), labels, dict(
+                    batch_start=batch_start, batch_end=batch_end,
+                    step=rel_type))
+            logger.info('created %s relationships', rel_type)
+        logger.info('created relationships between Refs and Ents in neo4j')
 
-        neo4j_client.run_query("""
-        MATCH(ref:ScitoolsRef{labels})
-        WITH ref
-        MATCH (ent:ScitoolsEntity{labels})
-        WHERE ent.ent_id = ref.ent_id
-        WITH ent, ref
-        CREATE (ref)-[r:Refs]->(ent)
+    @staticmethod
+    def create_neo4j_schema(neo4j_client: Neo4jClient, labels: List[str]):
+        """
+        creates the indexes and constraints on the entity and ref ids the
+        import merges and links on
+        """
+        if labels:
+            # entity ids of several projects share the ScitoolsEntity label
+            schema_queries = ['CREATE INDEX ON :ScitoolsEntity(ent_id)']
+        else:
+            schema_queries = ['CREATE CONSTRAINT ON (ent:ScitoolsEntity) '
+                              'ASSERT ent.ent_id IS UNIQUE']
+        schema_queries.extend([
+            'CREATE INDEX ON :ScitoolsRef(ref_id)',
+            'CREATE INDEX ON :ScitoolsProject(name)',
+            'CREATE INDEX ON :ScitoolsImportProgress(step)'])
+        for schema_query in schema_queries:
+            neo4j_client.run_query(schema_query)
+
+    @staticmethod
+    def read_import_progress(neo4j_client: Neo4jClient, labels: List[str]):
+        """
+        :return: dict of node counts of the imported node sets and of the
+        next ref ids of the linked ref ranges keyed by the import step
+        """
+        records = neo4j_client.run_query("""
+        MATCH (p:ScitoolsImportProgress$labels)
+        RETURN p.step AS step, p.count AS count
         """, labels)
+        return {record['step']: record['count'] for record in records}
 
+    @staticmethod
+    def save_import_progress(neo4j_client: Neo4jClient, labels: List[str],
+                             step: str, count: int):
         neo4j_client.run_query("""
-        MATCH(ref:ScitoolsRef{labels})
-        WITH ref
-        MATCH (ent:ScitoolsEntity{labels})
-        WHERE ent.ent_id = ref.file_ent_id
-        WITH ent, ref
-        CREATE (ent)-[r:Includes]->(ref)
-        """, labels)
-        logger.info('created relationships between Refs and Ents in neo4j')
+        MERGE (p:ScitoolsImportProgress$labels {step: {step}})
+        SET p.count = {count}
+        """, labels, dict(step=step, count=count))
 
-    def store_couples(self, run_query):
+    def export_udb_to_neo4j_csv(self, export: Neo4jCsvExport,
+                                labels: List[str] = ()):
+        """
+        streams the understand database content to csv files for the
+        offline neo4j-admin import without collecting it in memory
+        """
+        def iter_entities():
+            for entity in self.udb.ents():
+                yield self.entity_to_struct(entity)
+
+        def iter_refs():
+            for entity in self.udb.ents():
+                for ref in entity.refs():
+                    if ref.isforward():
+                        yield self.ref_to_struct(ref)
+
+        scitools_db = dict(ScitoolsProject=[self.udb_to_struct()],
+                           ScitoolsEntity=iter_entities(),
+                           ScitoolsRef=iter_refs())
+        self.export_to_neo4j_csv(scitools_db, export, labels=labels)
+
+    @staticmethod
+    def export_to_neo4j_csv(scitools_db: dict, export: Neo4jCsvExport,
+                            labels: List[str] = ()):
+        """
+        writes the node sets of the scitools db and the Scopes, Refs and
+        Includes relationships of import_to_neo4j to csv files for the
+        offline neo4j-admin import, refs get sequential ref_id keys
+        :param scitools_db: node sets as lists or iterators of dicts
+        """
+        labels = list(labels)
+        project_writer = export.node_writer(
+            'scitools_projects', 'name', 'ScitoolsProject',
+            ['ScitoolsProject'] + labels)
+        project_writer.write_rows(scitools_db['ScitoolsProject'])
+        entity_writer = export.node_writer(
+            'scitools_entities', 'ent_id', 'ScitoolsEntity',
+            ['ScitoolsEntity'] + labels)
+        entity_writer.write_rows(scitools_db['ScitoolsEntity'])
+        ref_writer = export.node_writer(
+            'scitools_refs', 'ref_id', 'ScitoolsRef',
+            ['ScitoolsRef'] + labels)
+        scopes_writer = export.relationship_writer(
+            'scitools_scopes', 'Scopes', 'scope_ent_id', 'ScitoolsEntity',
+            'ref_id', 'ScitoolsRef', skip_fields=REF_FIELDS)
+        refs_writer = export.relationship_writer(
+            'scitools_refs_ents', 'Refs', 'ref_id', 'ScitoolsRef',
+            'ent_id', 'ScitoolsEntity', skip_fields=REF_FIELDS)
+        includes_writer = export.relationship_writer(
+            'scitools_includes', 'Includes', 'file_ent_id', 'ScitoolsEntity',
+            'ref_id', 'ScitoolsRef', skip_fields=REF_FIELDS)
+        for ref_id, ref in enumerate(scitools_db['ScitoolsRef']):
+            ref = dict(ref, ref_id=ref_id)
+            ref_writer.write(ref)
+            scopes_writer.write(ref)
+            refs_writer.write(ref)
+            includes_writer.write(ref)
+
+    def store_couples(self, run_query, batched=False, chunk_size=1000):
         """
 
         :param run_query:
+        :param batched: collect the files, classes and couples first and
+        write them with a few UNWIND queries, see store_couples_batched
+        :param chunk_size: rows of an UNWIND query in the batched mode
         """
+        if batched:
+            return self.store_couples_batched(run_query,
+                                              chunk_size=chunk_size)
         java_files = self.udb.ents("Java File")
         for fent in java_files:
             pfent = fent.refs("Define", "Package")[0].ent()
@@ -243,3 +467,80 @@ class ScitoolsETL:
                     """
                     run_query(couple_query, {"from_class_name": cent.longname(),
                                              "to_class_name": cpent.longname()})
+
+    def collect_couples(self):
+        """
+        collects the java files with their packages and metrics, the
+        classes and the couples stored by store_couples, packages of the
+        coupled classes are resolved once per class
+        :return: dict of lists of row dicts keyed by files, classes and
+        couples
+        """
+        files = {}
+        classes = {}
+        couples = set()
+        file_packages = {}
+        class_files = {}
+
+        def file_package(fent):
+            if fent.id() not in file_packages:
+                file_packages[fent.id()] = fent.refs(
+                    "Define", "Package")[0].ent().longname()
+            return file_packages[fent.id()]
+
+        def class_file(cent):
+            if cent.id() not in class_files:
+                pent = cent.parent()
+                while pent.parent() is not None and pent.kindname() != \
+                        "File":
+                    pent = pent.parent()
+                class_files[cent.id()] = pent
+            return class_files[cent.id()]
+
+        def add_class(fent, package_name, cent):
+            files.setdefault(fent.relname(), dict(
+                file_name=fent.relname(), package_name=package_name))
+            classes.setdefault(
+                (fent.relname(), package_name, cent.longname()), dict(
+                    file_name=fent.relname(), package_name=package_name,
+                    class_name=cent.longname()))
+
+        for fent in self.udb.ents("Java File"):
+            package_name = file_package(fent)
+            fmetrics = fent.metric(["CountLineCode", "SumCyclomaticStrict"])
+            files[fent.relname()] = dict(
+                file_name=fent.relname(), package_name=package_name,
+                count_line_code=fmetrics["CountLineCode"],
+                sum_cyclomatic_strict=fmetrics["SumCyclomaticStrict"])
+            for crel in fent.refs("Define", "Class, Interface"):
+                cent = crel.ent()
+                add_class(fent, package_name, cent)
+                for cprel in cent.refs("Couple"):
+                    cpent = cprel.ent()
+                    pent = class_file(cpent)
+                    coupled_package_name = file_package(pent)
+                    if coupled_package_name == "java.lang":
+                        continue
+                    add_class(pent, coupled_package_name, cpent)
+                    couples.add((cent.longname(), cpent.longname()))
+        return dict(files=list(files.values()),
+                    classes=list(classes.values()),
+                    couples=[dict(from_class_name=from_class_name,
+                                  to_class_name=to_class_name)
+                             for from_class_name, to_class_name
+                             in sorted(couples)])
+
+    def store_couples_batched(self, run_query, chunk_size=1000):
+        """
+        writes the graph of store_couples with UNWIND queries over chunks
+        of the collected files, classes and couples
+        :param run_query: function of query and params
+        """
+        couples = self.collect_couples()
+        for schema_query in COUPLES_SCHEMA_QUERIES:
+            run_query(schema_query, {})
+        for name, query in COUPLES_UNWIND_QUERIES:
+            rows = couples[name]
+            for i in range(0, len(rows), chunk_size):
+                run_query(query, {"rows": rows[i:i + chunk_size]})
+            logger.info('stored %s %s', len(rows), name)
@@ -42,6 +42,7 @@ class Assessment:
     prj1_code_repo_path: Path
     prj1_udb_path: Path
     shelve_prj1_code_db_path: Path
+    prj1_code_graph_path: Path
     prj1_metrics_csv: Path
     # prj2 specific paths
     prj2_root_path: Path
@@ -62,6 +63,7 @@ class Assessment:
         self.prj1_code_repo_path = self.prj1_root_path / 'prj1_main'
         self.prj1_udb_path = self.assessment_path / 'prj1_main.udb'
         self.shelve_prj1_code_db_path = self.assessment_path / 'prj1_code.shelve'
+        self.prj1_code_graph_path = self.assessment_path / 'prj1_code_graph'
         self.prj1_metrics_csv = self.assessment_path / 'prj1_main.csv'
         self.prj1_project_metrics_csv = self.assessment_path / \
                                        'prj1-project-stats.csv'
@@ -267,8 +269,10 @@ class Assessment:
             with shelve.open(str(self.shelve_prj1_code_db_path)) as db:
                 self.prj1_scitools_client.open_project()
                 scitools_project = self.prj1_scitools_client.build_project(
-                    self.prj1_code_repo_path)
+                    self.prj1_code_repo_path, compact=True)
                 self.prj1_scitools_client.close_project()
+                # the shelve keeps the project with the snapshot path only
+                scitools_project.save_code_graph(self.prj1_code_graph_path)
                 db['code_graph'] = scitools_project
                 print('loaded scitools project of size',
                       len(scitools_project.code_graph))
@@ -1,5 +1,8 @@
 # coding=utf-8
 
 from .neo4j_client import Neo4jClient
+from .neo4j_bulk_loader import Neo4jBulkLoader, BulkLoadStats
+from .neo4j_csv_export import (Neo4jCsvExport, Neo4jCsvWriter,
+                               export_commit_history)
 from .neo4j_query import *
 from .dock_neo4j import DockNeo4j
@@ -0,0 +1,210 @@
+# coding=utf-8
+
+"""
+bulk import of node and relationship dicts into neo4j, rows are read
+lazily from any iterable, grouped into UNWIND batches bounded by the rows
+count and by the size of their json payload and written in concurrent
+sessions with at most max_in_flight batches waiting for the server
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+from timeit import default_timer as timer
+from typing import Iterable, List
+
+import ujson
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_ROWS = 10000
+
+DEFAULT_BATCH_BYTES = 4 * 1024 * 1024
+
+PROGRESS_INTERVAL = 10.0
+
+
+class BulkLoadStats:
+    """
+    counters of a bulk load, the results of the batch queries are kept in
+    results when the loader keeps results
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.payload_bytes = 0
+        self.seconds = 0.
+        self.results = []
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.
+
+    def __repr__(self):
+        return ('BulkLoadStats(rows={}, batches={}, payload_bytes={}, '
+                'seconds={:.2f}, rows_per_second={:.1f})'.format(
+                    self.rows, self.batches, self.payload_bytes,
+                    self.seconds, self.rows_per_second))
+
+
+class Neo4jBulkLoader:
+    """
+    writes batches of rows with UNWIND queries, every worker thread keeps
+    its own session and runs each batch in a write transaction retried by
+    the driver
+    """
+    import_nodes_template = Template("CREATE (n$labels) SET n = params")
+
+    relationship_template = Template("""
+        MATCH (start$start_labels {$start_key: params.start})
+        MATCH (end$end_labels {$end_key: params.end})
+        CREATE (start)-[r:$rel_type]->(end)
+        SET r = params.properties""")
+
+    def __init__(self, neo4j_client,
+                 sessions: int = 4,
+                 max_in_flight: int = None,
+                 batch_rows: int = DEFAULT_BATCH_ROWS,
+                 batch_bytes: int = DEFAULT_BATCH_BYTES,
+                 keep_results: bool = False):
+        """
+        :param neo4j_client: connected Neo4jClient
+        :param sessions: number of concurrent sessions
+        :param max_in_flight: number of batches submitted and not written
+        yet, reading of the rows blocks when it is reached, twice the
+        sessions by default
+        :param batch_rows: maximum rows in a batch
+        :param batch_bytes: maximum json payload of a batch
+        :param keep_results: keep the records returned by the batch queries
+        in the stats, the results are consumed and dropped by default
+        """
+        self.neo4j_client = neo4j_client
+        self.sessions = sessions
+        self.max_in_flight = max_in_flight or 2 * sessions
+        self.batch_rows = batch_rows
+        self.batch_bytes = batch_bytes
+        self.keep_results = keep_results
+        self._local = threading.local()
+        self._open_sessions = []
+        self._lock = threading.Lock()
+
+    def import_nodes(self, nodes: Iterable[dict],
+                     labels: List[str] = None) -> BulkLoadStats:
+        query = self.import_nodes_template.safe_substitute(
+            labels=to_labels(labels))
+        return self.load(query, nodes)
+
+    def import_relationships(self, relationships: Iterable[dict],
+                             rel_type: str,
+                             start_labels: List[str],
+                             start_key: str,
+                             end_labels: List[str],
+                             end_key: str) -> BulkLoadStats:
+        """
+        :param relationships: dicts with start and end key values of the
+        related nodes and with a dict of relationship properties
+        """
+        query = self.relationship_template.safe_substitute(
+            start_labels=to_labels(start_labels), start_key=start_key,
+            end_labels=to_labels(end_labels), end_key=end_key,
+            rel_type=rel_type)
+        return self.load(query, relationships)
+
+    def load(self, query: str, rows: Iterable[dict],
+             labels: List[str] = None) -> BulkLoadStats:
+        """
+        runs the query for every row, the row is available in the query as
+        params as in Neo4jClient.run_batch_query
+        """
+        query_template = Template("UNWIND {params} AS params " + query)
+        batch_query = query_template.safe_substitute(labels=to_labels(labels))
+        stats = BulkLoadStats()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        errors = []
+        start = timer()
+        last_report = start
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.sessions) as executor:
+            try:
+                for batch, payload_bytes in self.iter_batches(rows):
+                    in_flight.acquire()
+                    if errors:
+                        in_flight.release()
+                        break
+                    future = executor.submit(self._write_batch,
+                                             batch_query, batch)
+                    future.add_done_callback(
+                        lambda f: self._batch_done(f, in_flight, errors))
+                    futures.append(future)
+                    stats.rows += len(batch)
+                    stats.batches += 1
+                    stats.payload_bytes += payload_bytes
+                    if timer() - last_report > PROGRESS_INTERVAL:
+                        last_report = timer()
+                        logger.info('submitted %s rows in %s batches, '
+                                    '%.1f rows/s', stats.rows, stats.batches,
+                                    stats.rows / (last_report - start))
+                    if not self.keep_results:
+                        futures = [f for f in futures if not f.done()]
+            finally:
+                executor.shutdown(wait=True)
+                self._close_sessions()
+        if errors:
+            raise errors[0]
+        if self.keep_results:
+            stats.results = [future.result() for future in futures]
+        stats.seconds = timer() - start
+        logger.info('loaded %s', stats)
+        return stats
+
+    def iter_batches(self, rows: Iterable[dict]):
+        """
+        :return: iterator of (batch, json payload bytes) of the rows
+        """
+        batch = []
+        batch_bytes = 0
+        for row in rows:
+            row_bytes = len(ujson.dumps(row))
+            if batch and (len(batch) >= self.batch_rows or
+                          batch_bytes + row_bytes > self.batch_bytes):
+                yield batch, batch_bytes
+                batch = []
+                batch_bytes = 0
+            batch.append(row)
+            batch_bytes += row_bytes
+        if batch:
+            yield batch, batch_bytes
+
+    def _batch_done(self, future, in_flight, errors):
+        in_flight.release()
+        if future.exception() is not None:
+            errors.append(future.exception())
+
+    def _write_batch(self, query, batch):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self.neo4j_client.neo4j_driver.session()
+            self._local.session = session
+            with self._lock:
+                self._open_sessions.append(session)
+        return session.write_transaction(self._run_batch, query, batch)
+
+    def _run_batch(self, tx, query, batch):
+        result = tx.run(query, dict(params=batch))
+        if self.keep_results:
+            return list(result)
+        result.consume()
+        return None
+
+    def _close_sessions(self):
+        with self._lock:
+            for session in self._open_sessions:
+                session.close()
+            self._open_sessions = []
+        self._local = threading.local()
+
+
+def to_labels(labels):
+    return ':{0}'.format(':'.join(labels)) if labels else ''
@@ -8,6 +8,8 @@ import logging
 import requests
 from string import Template
 
+from .neo4j_bulk_loader import Neo4jBulkLoader
+
 logger = logging.getLogger(__name__)
 
 
@@ -111,6 +113,21 @@ class Neo4jClient:
         result = self.run_in_tx(batch(), chunk_count=chunk_count)
         return result
 
+    def bulk_load(self, query: str, rows: Iterable,
+                  labels: List[str] = None, **kwargs):
+        """
+        runs the UNWIND batch query over the rows with Neo4jBulkLoader
+        :param kwargs: Neo4jBulkLoader options
+        :return: BulkLoadStats
+        """
+        return Neo4jBulkLoader(self, **kwargs).load(query, rows,
+                                                    labels=labels)
+
+    def bulk_import_nodes(self, nodes: Iterable,
+                          labels: List[str] = None, **kwargs):
+        return Neo4jBulkLoader(self, **kwargs).import_nodes(
+            nodes, labels=labels)
+
     def run_query(self,
                   query: str,
                   labels: List[str] = None,
@@ -0,0 +1,299 @@
+# coding=utf-8
+
+"""
+export of nodes and relationships to csv files for the offline
+neo4j-admin import, rows are written to the data files as they come and
+the header files are written when the export is closed, so properties
+found in later rows extend the columns without keeping the rows in memory
+"""
+
+import csv
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Iterable, List
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ARRAY_DELIMITER = ';'
+
+# wider types win when the values of a property differ
+PROPERTY_TYPES = ('boolean', 'int', 'float', 'string')
+
+
+def property_type(value):
+    if isinstance(value, (list, tuple)):
+        item_types = {property_type(item) for item in value
+                      if not is_missing(item)}
+        item_type = max(item_types, key=PROPERTY_TYPES.index,
+                        default='string')
+        return '{}[]'.format(item_type)
+    if isinstance(value, bool) or type(value).__name__ == 'bool_':
+        return 'boolean'
+    if isinstance(value, int) or type(value).__name__.startswith('int'):
+        return 'int'
+    if isinstance(value, float) or type(value).__name__.startswith('float'):
+        return 'float'
+    return 'string'
+
+
+def wider_type(type1, type2):
+    if type1 is None or type1 == type2:
+        return type2
+    if type1.endswith('[]') or type2.endswith('[]'):
+        return 'string[]'
+    if {type1, type2} == {'int', 'float'}:
+        return 'float'
+    return 'string'
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def format_value(value):
+    if isinstance(value, (list, tuple)):
+        return ARRAY_DELIMITER.join(format_value(item) for item in value
+                                    if not is_missing(item))
+    if is_missing(value) or value is pd.NaT:
+        return ''
+    if property_type(value) == 'boolean':
+        return 'true' if value else 'false'
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+
+class Neo4jCsvWriter:
+    """
+    writer of a node or relationship data file and of its header file,
+    the key columns come first followed by the properties in the order
+    they are first found in the rows
+    """
+
+    def __init__(self, directory, name, key_columns, key_fields,
+                 skip_fields=()):
+        """
+        :param key_columns: header names of the key columns, e.g.
+        ['ent_id:ID(ScitoolsEntity)', ':LABEL']
+        :param key_fields: row fields or constant values of the key
+        columns, constants are given as ('value',) tuples
+        :param skip_fields: row fields not exported as properties
+        """
+        self.directory = Path(directory)
+        self.name = name
+        self.key_columns = list(key_columns)
+        self.key_fields = list(key_fields)
+        self.skip_fields = set(skip_fields) | {
+            field for field in key_fields if isinstance(field, str)}
+        self.properties = {}
+        self._property_index = {}
+        self.row_count = 0
+        self._row_widths = set()
+        self._data_file = open(str(self.data_path), 'w', newline='',
+                               encoding='utf-8')
+        self._writer = csv.writer(self._data_file)
+
+    @property
+    def data_path(self):
+        return self.directory / '{}.csv'.format(self.name)
+
+    @property
+    def header_path(self):
+        return self.directory / '{}_header.csv'.format(self.name)
+
+    def write(self, row: dict):
+        values = [field[0] if isinstance(field, tuple) else row[field]
+                  for field in self.key_fields]
+        property_values = [None] * len(self.properties)
+        for field, value in row.items():
+            if field in self.skip_fields or is_missing(value):
+                continue
+            if field not in self.properties:
+                self.properties[field] = None
+                self._property_index[field] = len(self._property_index)
+                property_values.append(None)
+            self.properties[field] = wider_type(self.properties[field],
+                                                property_type(value))
+            property_values[self._property_index[field]] = value
+        while property_values and property_values[-1] is None:
+            property_values.pop()
+        values.extend(property_values)
+        self._row_widths.add(len(values))
+        self._writer.writerow([format_value(value) for value in values])
+        self.row_count += 1
+
+    def write_rows(self, rows: Iterable[dict]):
+        for row in rows:
+            self.write(row)
+
+    @property
+    def closed(self):
+        return self._data_file.closed
+
+    def close(self):
+        """
+        writes the header file and pads the short rows written before the
+        last properties were found
+        """
+        self._data_file.close()
+        header = self.key_columns + [
+            '{}:{}'.format(field, field_type)
+            for field, field_type in self.properties.items()]
+        with open(str(self.header_path), 'w', newline='',
+                  encoding='utf-8') as header_file:
+            csv.writer(header_file).writerow(header)
+        if self._row_widths - {len(header)}:
+            self._pad_rows(len(header))
+        logger.info('exported %s rows to %s', self.row_count, self.data_path)
+
+    def _pad_rows(self, width):
+        padded_path = self.data_path.with_suffix('.padded')
+        with open(str(self.data_path), newline='',
+                  encoding='utf-8') as data_file, \
+                open(str(padded_path), 'w', newline='',
+                     encoding='utf-8') as padded_file:
+            writer = csv.writer(padded_file)
+            for values in csv.reader(data_file):
+                writer.writerow(values + [''] * (width - len(values)))
+        os.replace(str(padded_path), str(self.data_path))
+
+
+class Neo4jCsvExport:
+    """
+    directory of node and relationship csv files for neo4j-admin import
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.node_writers = []
+        self.relationship_writers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def node_writer(self, name, id_field, id_space, labels: List[str],
+                    skip_fields=()) -> Neo4jCsvWriter:
+        """
+        :param id_field: row field with the node id unique in the id space,
+        the id column stores it as a node property as well
+        """
+        writer = Neo4jCsvWriter(
+            self.directory, name,
+            ['{}:ID({})'.format(id_field, id_space), ':LABEL'],
+            [id_field, (';'.join(labels),)], skip_fields=skip_fields)
+        self.node_writers.append(writer)
+        return writer
+
+    def relationship_writer(self, name, rel_type,
+                            start_field, start_space,
+                            end_field, end_space,
+                            skip_fields=()) -> Neo4jCsvWriter:
+        writer = Neo4jCsvWriter(
+            self.directory, name,
+            [':START_ID({})'.format(start_space),
+             ':END_ID({})'.format(end_space), ':TYPE'],
+            [start_field, end_field, (rel_type,)], skip_fields=skip_fields)
+        self.relationship_writers.append(writer)
+        return writer
+
+    def close(self):
+        for writer in self.node_writers + self.relationship_writers:
+            if not writer.closed:
+                writer.close()
+
+    def import_args(self):
+        """
+        :return: neo4j-admin import arguments of the exported files
+        """
+        args = []
+        for option, writers in (('--nodes', self.node_writers),
+                                ('--relationships',
+                                 self.relationship_writers)):
+            for writer in writers:
+                args.extend([option, '{},{}'.format(writer.header_path,
+                                                    writer.data_path)])
+        # parents of the oldest commits of a partial history are not
+        # exported, their relationships are skipped
+        args.extend(['--array-delimiter', ARRAY_DELIMITER,
+                     '--multiline-fields', 'true',
+                     '--ignore-missing-nodes', 'true'])
+        return args
+
+
+def iter_frame_rows(df, chunk_size=10000):
+    """
+    :return: iterator of row dicts of the frame converted in chunks
+    """
+    for i in range(0, len(df), chunk_size):
+        chunk = df.iloc[i:i + chunk_size]
+        for col in chunk.columns:
+            if pd.api.types.is_categorical_dtype(chunk[col].dtype):
+                chunk = chunk.assign(**{col: chunk[col].astype(object)})
+        yield from chunk.to_dict('records')
+
+
+def export_commit_history(commit_history: dict, export: Neo4jCsvExport,
+                          labels: List[str] = (), chunk_size=10000):
+    """
+    exports the commit, actor, file and parent frames of the commit
+    history, commits are GitCommit nodes keyed by hexsha, actors are
+    GitAuthor nodes keyed by 'name <email>' related to the commits they
+    authored and committed, files are GitFile nodes keyed by path changed
+    by the commits, root commits have no Parent relationships and parents
+    outside of the history are dropped by neo4j-admin import with the
+    --ignore-missing-nodes option of import_args
+    """
+    labels = list(labels)
+    commit_frame = commit_history['commit_frame']
+    commit_writer = export.node_writer(
+        'git_commits', 'hexsha', 'GitCommit', ['GitCommit'] + labels)
+    actor_writer = export.node_writer(
+        'git_authors', 'actor_id', 'GitAuthor', ['GitAuthor'] + labels)
+    authors_writer = export.relationship_writer(
+        'git_authors_commits', 'Authors', 'author_id', 'GitAuthor',
+        'hexsha', 'GitCommit')
+    commits_writer = export.relationship_writer(
+        'git_committers_commits', 'Commits', 'committer_id', 'GitAuthor',
+        'hexsha', 'GitCommit')
+    for commit in iter_frame_rows(commit_frame, chunk_size):
+        commit_writer.write(commit)
+        for role, writer in (('author', authors_writer),
+                             ('committer', commits_writer)):
+            writer.write({
+                '{}_id'.format(role): to_actor_id(
+                    commit['{}_name'.format(role)],
+                    commit['{}_email'.format(role)]),
+                'hexsha': commit['hexsha']})
+    for actor in iter_frame_rows(commit_history['actor_frame'], chunk_size):
+        actor = dict(actor)
+        actor['actor_id'] = to_actor_id(actor['name'], actor['email'])
+        actor['author_name'] = actor.pop('name')
+        actor['author_email'] = actor.pop('email')
+        actor_writer.write(actor)
+    parent_writer = export.relationship_writer(
+        'git_commit_parents', 'Parent', 'hexsha', 'GitCommit',
+        'parent_hexsha', 'GitCommit')
+    parent_writer.write_rows(iter_frame_rows(
+        commit_history['parent_frame'].dropna(subset=['parent_hexsha']),
+        chunk_size))
+    file_frame = commit_history['file_frame']
+    file_writer = export.node_writer(
+        'git_files', 'path', 'GitFile', ['GitFile'] + labels)
+    file_writer.write_rows(
+        dict(path=path) for path in file_frame.file_path2.dropna().unique())
+    changes_writer = export.relationship_writer(
+        'git_commit_files', 'Changes', 'hexsha', 'GitCommit',
+        'file_path2', 'GitFile')
+    changes_writer.write_rows(iter_frame_rows(file_frame, chunk_size))
+
+
+def to_actor_id(name, email):
+    return '{} <{}>'.format(name, email)
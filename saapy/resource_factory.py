@@ -40,7 +40,13 @@ def create_neo4j(ws, resource_name):
 def create_git(ws, resource_name):
     if "git_local_service" == ws.get_resource_type(resource_name):
         git_path = ws.get_resource_path(resource_name, resolve_relative=True)
-        client = GitClient(git_path)
+        # commit_cache: true in the resource conf enables GitCommitCache
+        if ws.conf('resources', resource_name).get('commit_cache'):
+            commit_cache_path = ws.work_dir / 'cache' / (
+                '{}_commits.sqlite'.format(resource_name))
+        else:
+            commit_cache_path = None
+        client = GitClient(git_path, commit_cache_path=commit_cache_path)
         return client
     else:
         return None
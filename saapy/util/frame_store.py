@@ -0,0 +1,353 @@
+# coding=utf-8
+
+"""
+persistence of pandas frames in feather files and parquet datasets, frames
+with a datetime partition column are split into year partitions of the
+parquet dataset, categorical columns are dictionary encoded and restored as
+categories, loading reads only the requested columns and the partitions and
+row groups overlapping the requested date range
+"""
+
+import logging
+import shutil
+import tempfile
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+PARQUET_SUFFIX = '.parquet'
+
+PARTITION_DATETIME_COLUMN = 'committed_datetime'
+
+PARTITION_COLUMN = 'year'
+
+# partitions are read back year by year, the column keeps the saved order
+ROW_ORDER_COLUMN = '_row_order'
+
+# columns keeping the index levels of the spilled frames
+SPILL_INDEX_COLUMN = '_index_{}'
+
+
+def is_parquet_path(path):
+    return Path(path).suffix == PARQUET_SUFFIX
+
+
+def has_default_index(df):
+    """
+    :return: True when the frame index is the unnamed range index, the only
+    index feather files keep
+    """
+    return df.index.name is None and df.index.equals(pd.RangeIndex(len(df)))
+
+
+def save_frame_file(df, path):
+    """
+    saves the frame as a parquet dataset when the path has .parquet suffix
+    and as a feather file otherwise
+    """
+    if is_parquet_path(path):
+        save_parquet_frame(df, path)
+    else:
+        df.to_feather(str(path))
+
+
+def load_frame_file(path, columns=None, date_range=None,
+                    datetime_column=PARTITION_DATETIME_COLUMN):
+    """
+    loads the frame saved by save_frame_file
+    :param columns: columns to read, all by default
+    :param date_range: (start, end) of datetime_column values to read,
+    start inclusive, end exclusive, either can be None
+    """
+    if is_parquet_path(path):
+        return load_parquet_frame(path, columns=columns,
+                                  date_range=date_range,
+                                  partition_datetime_column=datetime_column)
+    read_columns = columns
+    if columns is not None and date_range is not None:
+        read_columns = list(columns) + [datetime_column]
+    df = pd.read_feather(str(path), columns=read_columns)
+    if date_range is not None:
+        start, end = date_range
+        if start is not None:
+            df = df[df[datetime_column] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df[datetime_column] < pd.Timestamp(end)]
+        df = df.reset_index(drop=True)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def frame_file_columns(path):
+    """
+    :return: column names of the saved frame read from its schema without
+    reading the data
+    """
+    if is_parquet_path(path):
+        schema = pq.ParquetDataset(str(path)).schema
+    else:
+        schema = feather.read_table(str(path), memory_map=True).schema
+    return [name for name in schema.names
+            if name not in (PARTITION_COLUMN, ROW_ORDER_COLUMN)]
+
+
+def save_parquet_frame(df, path,
+                       partition_datetime_column=PARTITION_DATETIME_COLUMN):
+    """
+    writes the frame to the parquet dataset directory replacing the
+    previous dataset
+    :param partition_datetime_column: frames having this column are
+    partitioned by its year
+    """
+    path = Path(path)
+    if path.exists():
+        shutil.rmtree(str(path))
+    path.mkdir(parents=True)
+    categorical_columns = [
+        str(c) for c in df.columns
+        if pd.api.types.is_categorical_dtype(df[c].dtype)]
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    partition_cols = None
+    if partition_datetime_column in df.columns:
+        years = df[partition_datetime_column].dt.year
+        table = table.append_column(
+            PARTITION_COLUMN, pa.array(years.fillna(0).astype('int32')))
+        table = table.append_column(
+            ROW_ORDER_COLUMN, pa.array(range(len(df)), type=pa.int64()))
+        partition_cols = [PARTITION_COLUMN]
+    pq.write_to_dataset(table, str(path), partition_cols=partition_cols,
+                        use_dictionary=categorical_columns or False)
+
+
+def load_parquet_frame(path, columns=None, date_range=None,
+                       partition_datetime_column=PARTITION_DATETIME_COLUMN):
+    """
+    reads the frame written by save_parquet_frame
+    :param columns: columns to read, all by default
+    :param date_range: (start, end) of partition_datetime_column values to
+    read, start inclusive, end exclusive, either can be None
+    """
+    filters = date_range_filters(date_range, partition_datetime_column)
+    dataset = pq.ParquetDataset(str(path), filters=filters or None)
+    partitioned = ROW_ORDER_COLUMN in dataset.schema.names
+    read_columns = columns
+    if columns is not None and partitioned:
+        read_columns = list(columns) + [ROW_ORDER_COLUMN]
+    table = dataset.read(columns=read_columns)
+    if partitioned:
+        table = table.sort_by(ROW_ORDER_COLUMN)
+        table = table.drop([c for c in (PARTITION_COLUMN, ROW_ORDER_COLUMN)
+                            if c in table.column_names])
+    return table.to_pandas()
+
+
+def date_range_filters(date_range, datetime_column):
+    filters = []
+    if date_range is None:
+        return filters
+    start, end = (pd.Timestamp(d) if d is not None else None
+                  for d in date_range)
+    # the year partitions let the reader skip whole directories, the
+    # datetime bounds filter row groups and rows of the remaining ones
+    if start is not None:
+        filters.append((PARTITION_COLUMN, '>=', start.year))
+        filters.append((datetime_column, '>=', start))
+    if end is not None:
+        filters.append((PARTITION_COLUMN, '<=', end.year))
+        filters.append((datetime_column, '<', end))
+    return filters
+
+
+class FrameRegistry(MutableMapping):
+    """
+    dict like registry of frames which loads persisted frames on the first
+    access and keeps the resident frames within the memory budget evicting
+    the least recently used ones, evicted frames set in the registry are
+    saved to their paths first or to a spill directory when they have no
+    path, frames loaded from disk are dropped as is, so a frame changed in
+    place should be set again with registry[key] = frame, frames with a
+    feather path must have the default index
+    """
+
+    def __init__(self, frame_paths=None, memory_budget=None,
+                 spill_directory=None):
+        """
+        :param frame_paths: dict of frame paths keyed by frame key, shared
+        with the owner and updated when frames are spilled
+        :param memory_budget: bytes the resident frames may take, no limit
+        by default
+        :param spill_directory: directory for evicted frames without path,
+        a temporary one by default
+        """
+        self.frame_paths = frame_paths if frame_paths is not None else {}
+        self.memory_budget = memory_budget
+        self.spill_directory = spill_directory
+        self._frames = OrderedDict()
+        self._frame_sizes = {}
+        self._spilled_paths = {}
+        self._spilled_index_names = {}
+        self._changed_keys = set()
+
+    def __getitem__(self, key):
+        if key in self._frames:
+            self._frames.move_to_end(key)
+            return self._frames[key]
+        if key in self._spilled_paths:
+            df = self._load_spilled(key)
+            self._put(key, df, changed=True)
+            return df
+        if key in self.frame_paths:
+            return self.load(key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, df):
+        path = self.frame_paths.get(key)
+        if (path is not None and not is_parquet_path(path) and
+                not has_default_index(df)):
+            raise ValueError(
+                'frame {} is saved to feather file {} which keeps only the '
+                'default index, reset the frame index first'.format(key, path))
+        self._drop_spilled(key)
+        self._put(key, df, changed=True)
+
+    def __delitem__(self, key):
+        """
+        drops the frame from memory and the spill directory, the frame path
+        is kept, so the frame is loaded from it on the next access
+        """
+        if key not in self:
+            raise KeyError(key)
+        self._frames.pop(key, None)
+        self._frame_sizes.pop(key, None)
+        self._drop_spilled(key)
+        self._changed_keys.discard(key)
+
+    def clear(self):
+        # the frame paths stay, so the frames cannot be popped one by one
+        for key in set(self._frames) | set(self._spilled_paths):
+            del self[key]
+
+    def __contains__(self, key):
+        return (key in self._frames or key in self._spilled_paths or
+                key in self.frame_paths)
+
+    def __iter__(self):
+        keys = list(self._frames)
+        keys.extend(k for k in self._spilled_paths if k not in self._frames)
+        keys.extend(k for k in self.frame_paths
+                    if k not in self._frames and k not in self._spilled_paths)
+        return iter(keys)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def register(self, key, path):
+        """
+        sets the path of the persisted frame which is loaded on the first
+        access, the frame loaded before is dropped unless it was set
+        """
+        self.frame_paths[key] = str(path)
+        if key in self._frames and key not in self._changed_keys:
+            del self[key]
+
+    def load(self, key, **kwargs):
+        """
+        loads the frame from its path making it resident
+        """
+        df = load_frame_file(self.frame_paths[key], **kwargs)
+        self._put(key, df, changed=False)
+        return df
+
+    def set_saved(self, key, df=None):
+        """
+        sets the frame saved to its path, so it is dropped without saving
+        when evicted
+        """
+        if df is None:
+            df = self._frames[key]
+        self._drop_spilled(key)
+        self._put(key, df, changed=False)
+
+    def is_resident(self, key):
+        return key in self._frames
+
+    def memory_usage(self):
+        """
+        :return: series of bytes taken by the resident frames in the least
+        to the most recently used order
+        """
+        return pd.Series([self._frame_sizes[key] for key in self._frames],
+                         index=list(self._frames), dtype='int64')
+
+    def evict(self, key):
+        """
+        removes the frame from memory saving it first when it was set
+        """
+        df = self._frames.pop(key)
+        self._frame_sizes.pop(key)
+        if key in self._changed_keys:
+            if key in self.frame_paths:
+                save_frame_file(df, self.frame_paths[key])
+            else:
+                self._spilled_paths[key] = self._spill(key, df)
+            self._changed_keys.discard(key)
+        logger.debug('evicted frame %s', key)
+
+    def _put(self, key, df, changed):
+        self._frames[key] = df
+        self._frames.move_to_end(key)
+        self._frame_sizes[key] = int(df.memory_usage(deep=True).sum())
+        if changed:
+            self._changed_keys.add(key)
+        else:
+            self._changed_keys.discard(key)
+        self.enforce_budget(keep_key=key)
+
+    def enforce_budget(self, keep_key=None):
+        """
+        evicts the least recently used frames but keep_key until the
+        resident frames fit into the memory budget
+        """
+        if self.memory_budget is None:
+            return
+        for key in list(self._frames):
+            if sum(self._frame_sizes.values()) <= self.memory_budget:
+                break
+            if key != keep_key:
+                self.evict(key)
+
+    def _spill(self, key, df):
+        if self.spill_directory is None:
+            self.spill_directory = tempfile.mkdtemp(prefix='saapy_frames_')
+        spill_path = Path(self.spill_directory) / '{}.feather'.format(key)
+        spill_path.parent.mkdir(parents=True, exist_ok=True)
+        self._spilled_index_names.pop(key, None)
+        if not has_default_index(df):
+            # the index levels are kept in columns and set again on load
+            self._spilled_index_names[key] = list(df.index.names)
+            index_columns = [SPILL_INDEX_COLUMN.format(level)
+                             for level in range(df.index.nlevels)]
+            df = df.rename_axis(index_columns).reset_index()
+        save_frame_file(df, spill_path)
+        return str(spill_path)
+
+    def _load_spilled(self, key):
+        df = load_frame_file(self._spilled_paths[key])
+        index_names = self._spilled_index_names.get(key)
+        if index_names is not None:
+            index_columns = [SPILL_INDEX_COLUMN.format(level)
+                             for level in range(len(index_names))]
+            df = df.set_index(index_columns).rename_axis(index_names)
+        return df
+
+    def _drop_spilled(self, key):
+        self._spilled_paths.pop(key, None)
+        self._spilled_index_names.pop(key, None)
@@ -0,0 +1,155 @@
+# coding=utf-8
+
+"""
+streaming of dict structs to line delimited json files or to parquet
+datasets written a row group at a time, structs are read back lazily in
+the order they were written, keys with None values are dropped from the
+read structs in both formats as parquet does not tell them from missing
+keys
+"""
+
+import logging
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import ujson
+
+from .frame_store import PARQUET_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+JSONL_SUFFIX = '.jsonl'
+
+STRUCT_FORMATS = {'jsonl': JSONL_SUFFIX, 'parquet': PARQUET_SUFFIX}
+
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+
+def struct_file_path(directory, name, struct_format='jsonl'):
+    if struct_format not in STRUCT_FORMATS:
+        raise ValueError('unknown struct format {}, expected one of {}'.format(
+            struct_format, sorted(STRUCT_FORMATS)))
+    return Path(directory) / '{}{}'.format(name, STRUCT_FORMATS[struct_format])
+
+
+def open_struct_writer(path, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    :return: writer of the structs to the path, a parquet dataset directory
+    when the path has .parquet suffix and a json lines file otherwise
+    """
+    if Path(path).suffix == PARQUET_SUFFIX:
+        return ParquetStructWriter(path, row_group_size=row_group_size)
+    return JsonlStructWriter(path)
+
+
+def iter_struct_file(path):
+    """
+    :return: iterator of the structs written by open_struct_writer
+    """
+    if Path(path).suffix == PARQUET_SUFFIX:
+        return iter_parquet_structs(path)
+    return iter_jsonl_structs(path)
+
+
+class JsonlStructWriter:
+    """
+    writer of one json struct per line
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.count = 0
+        self._file = open(str(self.path), 'w', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, struct: dict):
+        self._file.write(ujson.dumps(struct, ensure_ascii=False))
+        self._file.write('\n')
+        self.count += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            logger.info('wrote %s structs to %s', self.count, self.path)
+
+
+class ParquetStructWriter:
+    """
+    writer of the structs to a parquet dataset directory, every row group
+    of structs goes to its own part file with the columns of its structs,
+    so structs with different keys need no common schema
+    """
+
+    def __init__(self, path, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.path = Path(path)
+        self.row_group_size = row_group_size
+        self.count = 0
+        self.part_count = 0
+        self._row_group = []
+        if self.path.exists():
+            shutil.rmtree(str(self.path))
+        self.path.mkdir(parents=True)
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, struct: dict):
+        self._row_group.append(struct)
+        self.count += 1
+        if len(self._row_group) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        # from_pylist takes the columns of the first struct only
+        columns = {}
+        for struct in self._row_group:
+            columns.update(dict.fromkeys(struct))
+        table = pa.Table.from_pydict({
+            column: [struct.get(column) for struct in self._row_group]
+            for column in columns})
+        part_path = self.path / 'part-{:05d}{}'.format(self.part_count,
+                                                       PARQUET_SUFFIX)
+        pq.write_table(table, str(part_path))
+        self.part_count += 1
+        self._row_group = []
+
+    def close(self):
+        if self.closed:
+            return
+        if self._row_group:
+            self._write_row_group()
+        self.closed = True
+        logger.info('wrote %s structs in %s parts to %s', self.count,
+                    self.part_count, self.path)
+
+
+def iter_jsonl_structs(path):
+    with open(str(path), encoding='utf-8') as input_file:
+        for line in input_file:
+            if line.strip():
+                yield {key: value for key, value in ujson.loads(line).items()
+                       if value is not None}
+
+
+def iter_parquet_structs(path):
+    """
+    missing values of a part are dropped from its structs, keys absent in
+    some structs of a row group are read as missing values
+    """
+    for part_path in sorted(Path(path).glob('part-*' + PARQUET_SUFFIX)):
+        parquet_file = pq.ParquetFile(str(part_path))
+        for i in range(parquet_file.num_row_groups):
+            for struct in parquet_file.read_row_group(i).to_pylist():
+                yield {key: value for key, value in struct.items()
+                       if value is not None}
@@ -4,6 +4,9 @@ import glob
 import json
 import re
 from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from operator import attrgetter, itemgetter
 from pathlib import Path
 from typing import List
 
@@ -21,8 +24,9 @@ def dicts_to_dataframe(records: List[dict]) -> pd.DataFrame:
     if not records:
         df = pd.DataFrame()
     else:
-        record_values = (r.values() for r in records)
-        df = pd.DataFrame(record_values, columns=records[0].keys())
+        keys = list(records[0].keys())
+        columns = zip(*(r.values() for r in records))
+        df = pd.DataFrame(dict(zip(keys, map(list, columns))), columns=keys)
     return df
 
 
@@ -114,26 +118,152 @@ def attr_to_value(obj, attr_path, default_value=None, sep='.', cache=None):
     return default_value
 
 
+_MISSING = object()
+
+
+def compile_attr_paths(attrs, sep='.'):
+    """
+    :param sep: separator of the path parts, None for paths of one part
+    :return: (steps, leaves), steps are (parent step or -1 for the object,
+    attribute name) with the steps of the path prefixes shared by the paths
+    coming once, leaves are the last steps of the paths
+    """
+    steps = []
+    step_index = {}
+    leaves = []
+    for attr in attrs:
+        parts = attr.split(sep) if sep else [attr]
+        parent = -1
+        for i, part in enumerate(parts):
+            prefix = tuple(parts[:i + 1])
+            if prefix not in step_index:
+                step_index[prefix] = len(steps)
+                steps.append((parent, part))
+            parent = step_index[prefix]
+        leaves.append(parent)
+    return steps, leaves
+
+
+@lru_cache(maxsize=64)
+def _cached_attr_paths(attrs, sep):
+    return compile_attr_paths(attrs, sep)
+
+
+def _get_attr_part(cur_obj, name):
+    if cur_obj is _MISSING or cur_obj is None:
+        return _MISSING
+    try:
+        if isinstance(cur_obj, dict):
+            return cur_obj[name]
+        return getattr(cur_obj, name)
+    except (AttributeError, KeyError):
+        return _MISSING
+
+
 def obj_to_dict(obj, attrs, default_value=None, sep='.',
                 cache_attrs=True):
-    attr_cache = {} if cache_attrs else None
-    return {attr: attr_to_value(obj, attr,
-                                default_value=default_value,
-                                sep=sep, cache=attr_cache)
-            for attr in attrs}
+    """
+    :param cache_attrs: kept for compatibility, shared path prefixes are
+    always looked up once
+    """
+    attrs = tuple(attrs)
+    steps, leaves = _cached_attr_paths(attrs, sep)
+    values = []
+    for parent, name in steps:
+        values.append(_get_attr_part(
+            obj if parent < 0 else values[parent], name))
+    return {attr: default_value if values[leaf] is _MISSING
+            else values[leaf] for attr, leaf in zip(attrs, leaves)}
 
 
-def objs_to_dicts(objs, attrs, default_value=None, sep='.', cache_attrs=True):
+def objs_to_dicts(objs, attrs, default_value=None, sep='.', cache_attrs=True,
+                  chunk_size=10000):
     """
     Extracts specified attributes 'attrs' from iterable 'objs'
     and returns them as dictionaries. Can traverse object trees splitting
     attributes by 'sep'.
+    :param chunk_size: number of objects looked up at once by attr_columns
     """
-    return map(lambda obj: obj_to_dict(obj, attrs,
-                                       default_value=default_value,
-                                       sep=sep,
-                                       cache_attrs=cache_attrs),
-               objs)
+    attrs = tuple(attrs)
+    objs = iter(objs)
+    while True:
+        obj_chunk = list(islice(objs, chunk_size))
+        if not obj_chunk:
+            return
+        columns = attr_columns(obj_chunk, attrs, default_value=default_value,
+                               sep=sep)
+        rows = zip(*columns) if attrs else [()] * len(obj_chunk)
+        for values in rows:
+            yield dict(zip(attrs, values))
+
+
+def attr_columns(objs, attrs, default_value=None, sep='.'):
+    """
+    :return: list of the value lists of the attribute paths, every path
+    step is looked up for all the objects at once with attrgetter or
+    itemgetter and falls back to the object by object lookup when they fail
+    """
+    objs = list(objs)
+    steps, leaves = compile_attr_paths(attrs, sep)
+    values = []
+    missing = []
+    for parent, name in steps:
+        cur_objs = objs if parent < 0 else values[parent]
+        cur_missing = parent >= 0 and missing[parent]
+        step_values = None
+        if not cur_missing:
+            types = set(map(type, cur_objs))
+            # attr_to_value reads dicts by key, attrgetter would return
+            # dict methods named like the key and follows dots
+            if types == {dict}:
+                getter = itemgetter(name)
+            elif not any(issubclass(t, dict) for t in types) and (
+                    '.' not in name):
+                getter = attrgetter(name)
+            else:
+                getter = None
+            if getter is not None:
+                try:
+                    step_values = list(map(getter, cur_objs))
+                except (AttributeError, KeyError, TypeError):
+                    pass
+        if step_values is None:
+            step_values = [_get_attr_part(cur_obj, name)
+                           for cur_obj in cur_objs]
+            cur_missing = any(value is _MISSING for value in step_values)
+        values.append(step_values)
+        missing.append(cur_missing)
+    return [[default_value if value is _MISSING else value
+             for value in values[leaf]] if missing[leaf] else values[leaf]
+            for leaf in leaves]
+
+
+def objs_to_columns(objs, attrs, default_value=None, sep='.', dtypes=None,
+                    categories=()) -> pd.DataFrame:
+    """
+    extracts the attributes of the objects like objs_to_dicts straight into
+    the columns of a data frame
+    :param attrs: attribute paths or dict of column names keyed by
+    attribute paths
+    :param dtypes: dict of column dtypes keyed by column name
+    :param categories: names of the categorical columns
+    :return: data frame with a column per attribute and a row per object
+    """
+    if isinstance(attrs, dict):
+        paths, names = list(attrs.keys()), list(attrs.values())
+    else:
+        paths = names = list(attrs)
+    columns = attr_columns(objs, paths, default_value=default_value, sep=sep)
+    dtypes = dtypes or {}
+    data = {}
+    for name, values in zip(names, columns):
+        if name in categories:
+            data[name] = pd.Categorical(values)
+        elif name in dtypes:
+            data[name] = pd.Series(values, dtype=dtypes[name])
+        else:
+            data[name] = values
+    return pd.DataFrame(data, columns=names)
 
 
 def categorize(data):
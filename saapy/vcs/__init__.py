@@ -1,5 +1,9 @@
 # coding=utf-8
 
 from .git_commit_utils import *
+from .git_log_utils import *
+from .git_tree_store import GitTreeStore
+from .git_commit_cache import GitCommitCache
+from .git_parallel_utils import *
 from .git_etl import GitETL
 from .git_client import GitClient
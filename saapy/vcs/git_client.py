@@ -8,19 +8,37 @@ import logging
 
 from git import Repo, Commit
 
-from .git_commit_utils import commit_history_to_frames
+from .git_commit_cache import DEFAULT_CACHE_SIZE, GitCommitCache
+from .git_commit_utils import (commit_history_to_frames, get_ref_tips,
+                               filter_known_commits)
+from .git_log_utils import git_log_history_to_frames
+from .git_parallel_utils import parallel_commit_history_to_frames
 
 logger = logging.getLogger(__name__)
 
+COMMIT_HISTORY_BACKENDS = dict(gitpython=commit_history_to_frames,
+                               git_log=git_log_history_to_frames)
+
 
 class GitClient:
     """
     connects to the local git repository and extracts project history
     """
 
-    def __init__(self, local_repo_path):
+    def __init__(self, local_repo_path, commit_cache_path=None,
+                 commit_cache_size=DEFAULT_CACHE_SIZE):
+        """
+        :param commit_cache_path: sqlite file of GitCommitCache used by the
+        gitpython history extraction, no cache by default
+        :param commit_cache_size: bytes of commit records to keep in cache
+        """
         self.local_repo_path = local_repo_path
         self.repository = Repo(str(self.local_repo_path))
+        if commit_cache_path:
+            self.commit_cache = GitCommitCache(commit_cache_path,
+                                               max_size=commit_cache_size)
+        else:
+            self.commit_cache = None
 
     def to_commit(self, revision) -> Commit:
         if isinstance(revision, str) or revision is None:
@@ -31,13 +49,59 @@ class GitClient:
             commit = None
         return commit
 
+    def get_ref_tips(self, revs='all_refs') -> dict:
+        return get_ref_tips(self.repository, revs=revs)
+
+    def filter_known_commits(self, hexshas) -> list:
+        return filter_known_commits(self.repository, hexshas)
+
+    def count_commits(self, revs, exclude_revs=(), paths='') -> int:
+        """
+        counts commits reachable from revs and not from exclude_revs
+        """
+        args = list(revs) + ['^{}'.format(rev) for rev in exclude_revs]
+        if paths:
+            args.append('--')
+            args.extend([paths] if isinstance(paths, str) else paths)
+        return int(self.repository.git.rev_list('--count', *args))
+
     def extract_commit_history(self,
                                revs='all_refs',
                                include_trees=True,
                                paths='',
+                               chunk_size=None,
+                               backend='gitpython',
+                               workers=None,
+                               shard_by='revs',
                                **kwargs) -> dict:
-        return commit_history_to_frames(self.repository,
-                                        revs=revs,
-                                        include_trees=include_trees,
-                                        paths=paths,
-                                        **kwargs)
+        """
+        extracts commit history into a dict of pandas frames
+        :param chunk_size: when set, commits are streamed from the repository
+        in chunks of this size keeping memory bounded by the chunk
+        :param backend: 'gitpython' reads commits through GitPython objects,
+        'git_log' parses the output of a single git log --numstat process
+        :param workers: when set, extract the history in a pool of that many
+        processes sharding the commits by shard_by
+        :param shard_by: 'revs' or 'paths', see
+        parallel_commit_history_to_frames
+        """
+        if backend not in COMMIT_HISTORY_BACKENDS:
+            raise ValueError('unsupported commit history backend {}'.format(
+                backend))
+        if workers:
+            if chunk_size:
+                kwargs['chunk_size'] = chunk_size
+            return parallel_commit_history_to_frames(
+                self.repository, revs=revs, include_trees=include_trees,
+                paths=paths, workers=workers, shard_by=shard_by,
+                backend=backend, **kwargs)
+        history_to_frames = COMMIT_HISTORY_BACKENDS[backend]
+        if self.commit_cache is not None and backend == 'gitpython':
+            kwargs.setdefault('commit_cache', self.commit_cache)
+        if chunk_size:
+            kwargs['chunk_size'] = chunk_size
+        return history_to_frames(self.repository,
+                                 revs=revs,
+                                 include_trees=include_trees,
+                                 paths=paths,
+                                 **kwargs)
@@ -0,0 +1,227 @@
+# coding=utf-8
+
+"""
+persistent cache of commit metadata keyed by commit hexsha, repeated
+extractions from the same repository read commit attributes from an sqlite
+database instead of loading and diffing git objects through GitPython
+"""
+
+import hashlib
+import logging
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+CACHE_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_info '
+    '(key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS commits '
+    '(hexsha TEXT PRIMARY KEY, record BLOB, record_size INTEGER, '
+    'accessed REAL)',
+    'CREATE TABLE IF NOT EXISTS rev_lists '
+    '(key TEXT PRIMARY KEY, record BLOB, record_size INTEGER, '
+    'accessed REAL)',
+    'CREATE TABLE IF NOT EXISTS name_revs '
+    '(hexsha TEXT PRIMARY KEY, name_rev TEXT)',
+    'CREATE INDEX IF NOT EXISTS commits_accessed ON commits (accessed)',
+    'CREATE INDEX IF NOT EXISTS rev_lists_accessed ON rev_lists (accessed)')
+
+CACHE_TABLES = dict(commits='hexsha', rev_lists='key')
+
+# tables of the entries depending on the refs of the repository
+REF_TABLES = ('rev_lists', 'name_revs')
+
+SQLITE_MAX_VARIABLES = 900
+
+
+class GitCommitCache:
+    """
+    sqlite database of pickled commit records and of commit lists of the
+    walked revisions, the least recently used entries are evicted when the
+    records exceed max_size bytes, the commit lists and the name_rev of the
+    commits are dropped when the refs of the repository change, see
+    refs_fingerprint, the rest of a commit record never changes
+    """
+
+    def __init__(self, cache_path, max_size=DEFAULT_CACHE_SIZE):
+        self.cache_path = Path(cache_path)
+        self.max_size = max_size
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.cache_path))
+            with self._connection:
+                for statement in CACHE_SCHEMA:
+                    self._connection.execute(statement)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def validate(self, repo):
+        """
+        drops the entries depending on the refs when the refs of the
+        repository changed since they were stored, a new cache is cleared
+        :return: True when all the cached entries are kept
+        """
+        fingerprint = refs_fingerprint(repo)
+        with self.connection as connection:
+            row = connection.execute(
+                'SELECT value FROM cache_info WHERE key = ?',
+                ('refs',)).fetchone()
+            if row is not None and row[0] == fingerprint:
+                return True
+            if row is not None:
+                logger.info('refs of %s changed, clearing rev lists of %s',
+                            repo.git_dir, self.cache_path)
+                tables = REF_TABLES
+            else:
+                tables = tuple(CACHE_TABLES) + REF_TABLES
+            for table in tables:
+                connection.execute('DELETE FROM {}'.format(table))
+            connection.execute(
+                'INSERT OR REPLACE INTO cache_info VALUES (?, ?)',
+                ('refs', fingerprint))
+        return False
+
+    def get_commit_records(self, hexshas):
+        """
+        :return: dict of cached records of the hexshas found in the cache,
+        records without a name_rev cached for the current refs have no
+        'name_rev' key
+        """
+        records = self._get_records('commits', hexshas)
+        keys = list(records)
+        for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+            key_batch = keys[i:i + SQLITE_MAX_VARIABLES]
+            rows = self.connection.execute(
+                'SELECT hexsha, name_rev FROM name_revs '
+                'WHERE hexsha IN ({})'.format(','.join('?' * len(key_batch))),
+                key_batch)
+            for hexsha, name_rev in rows:
+                records[hexsha]['name_rev'] = name_rev
+        return records
+
+    def put_commit_records(self, records):
+        """
+        :param records: dict of records keyed by hexsha, their name_rev is
+        kept apart from the rest of the record
+        """
+        commit_records = OrderedDict()
+        name_revs = {}
+        for hexsha, record in records.items():
+            record = dict(record)
+            if 'name_rev' in record:
+                name_revs[hexsha] = record.pop('name_rev')
+            commit_records[hexsha] = record
+        self.put_name_revs(name_revs)
+        self._put_records('commits', commit_records)
+
+    def put_name_revs(self, name_revs):
+        """
+        :param name_revs: dict of commit name_rev keyed by hexsha
+        """
+        with self.connection as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO name_revs VALUES (?, ?)',
+                name_revs.items())
+
+    def get_rev_list(self, key):
+        return self._get_records('rev_lists', [key]).get(key)
+
+    def put_rev_list(self, key, hexshas):
+        self._put_records('rev_lists', {key: list(hexshas)})
+
+    def cached_size(self):
+        return sum(self.connection.execute(
+            'SELECT COALESCE(SUM(record_size), 0) FROM {}'.format(
+                table)).fetchone()[0] for table in CACHE_TABLES)
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM commits').fetchone()[0]
+
+    def _get_records(self, table, keys):
+        key_column = CACHE_TABLES[table]
+        keys = list(keys)
+        records = {}
+        with self.connection as connection:
+            for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                key_batch = keys[i:i + SQLITE_MAX_VARIABLES]
+                rows = connection.execute(
+                    'SELECT {0}, record FROM {1} WHERE {0} IN ({2})'.format(
+                        key_column, table, ','.join('?' * len(key_batch))),
+                    key_batch)
+                records.update((key, pickle.loads(record))
+                               for key, record in rows)
+            connection.executemany(
+                'UPDATE {} SET accessed = ? WHERE {} = ?'.format(
+                    table, key_column),
+                ((time.time(), key) for key in records))
+        return records
+
+    def _put_records(self, table, records):
+        if not records:
+            return
+        accessed = time.time()
+        rows = []
+        for key, record in records.items():
+            blob = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, sqlite3.Binary(blob), len(blob), accessed))
+        with self.connection as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO {} VALUES (?, ?, ?, ?)'.format(table),
+                rows)
+        self.evict()
+
+    def evict(self):
+        """
+        deletes the least recently used entries until the cached records
+        fit into max_size bytes
+        """
+        excess_size = self.cached_size() - self.max_size
+        if excess_size <= 0:
+            return
+        rows = self.connection.execute(
+            'SELECT table_name, key, record_size FROM ('
+            'SELECT \'commits\' AS table_name, hexsha AS key, record_size, '
+            'accessed FROM commits UNION ALL '
+            'SELECT \'rev_lists\', key, record_size, accessed '
+            'FROM rev_lists) ORDER BY accessed')
+        evicted = {table: [] for table in CACHE_TABLES}
+        for table, key, record_size in rows:
+            if excess_size <= 0:
+                break
+            evicted[table].append((key,))
+            excess_size -= record_size
+        with self.connection as connection:
+            for table, keys in evicted.items():
+                connection.executemany(
+                    'DELETE FROM {} WHERE {} = ?'.format(
+                        table, CACHE_TABLES[table]), keys)
+            connection.executemany(
+                'DELETE FROM name_revs WHERE hexsha = ?', evicted['commits'])
+        logger.debug('evicted %s entries from %s',
+                     sum(len(keys) for keys in evicted.values()),
+                     self.cache_path)
+
+
+def refs_fingerprint(repo):
+    """
+    digest of the refs of the repository, the commits reachable from the
+    walked revisions and the names of commits in name_rev are relative to
+    the refs
+    """
+    refs = repo.git.for_each_ref('--format=%(objectname) %(refname)')
+    return hashlib.sha1(refs.encode('utf-8')).hexdigest()
@@ -1,76 +1,325 @@
 # coding=utf-8
 import difflib
 import re
+from collections import OrderedDict
+from functools import partial
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import time
+from git import Commit
+from gitdb.exc import BadName, BadObject
+from gitdb.util import hex_to_bin
+from toolz import partition_all
 
 import saapy.util as su
+from .git_tree_store import GitTreeStore, TREE_ENTRY_CATEGORICAL_COLUMNS
+
+
+COMMIT_CATEGORICAL_COLUMNS = (
+    'name_rev', 'author_name', 'author_email',
+    'committer_name', 'committer_email', 'encoding')
+
+TREE_CATEGORICAL_COLUMNS = ('hexsha', 'tree', 'child', 'child_type')
+
+COMMIT_ATTRS = (
+    'hexsha', 'name_rev', 'size',
+    'author.name', 'author.email',
+    'authored_datetime', 'author_tz_offset',
+    'committer.name', 'committer.email',
+    'committed_datetime', 'committer_tz_offset',
+    'encoding', 'message',
+    'stats.total.files', 'stats.total.lines',
+    'stats.total.insertions', 'stats.total.deletions',
+    'stats.files')
 
 
 def commit_history_to_frames(repo, revs='all_refs',
                              include_trees=True,
-                             paths='', **kwargs):
+                             paths='', chunk_size=None,
+                             dedup_trees=False, commit_cache=None,
+                             **kwargs):
+    """
+    extracts commit history from the repository into pandas frames
+    :param chunk_size: stream commits in chunks of this size, see
+    chunked_commit_history_to_frames
+    :param dedup_trees: with include_trees, replace tree_frame listing the
+    whole tree of every commit by tree_entry_frame and commit_tree_frame
+    of GitTreeStore which keep every distinct tree object once
+    :param commit_cache: GitCommitCache to read commit lists and commit
+    records from before walking and loading the commits
+    :return: dict of frames keyed by frame name
+    """
+    if chunk_size:
+        return chunked_commit_history_to_frames(
+            repo, revs=revs, include_trees=include_trees, paths=paths,
+            chunk_size=chunk_size, dedup_trees=dedup_trees,
+            commit_cache=commit_cache, **kwargs)
+    if commit_cache is not None:
+        commit_cache.validate(repo)
     ref_frame = refs_to_ref_frame(repo.refs)
+    commit_revs = to_commit_revs(repo, revs)
+    commits = get_commits(repo, commit_revs, paths=paths,
+                          commit_cache=commit_cache, **kwargs)
+    tree_store = GitTreeStore() if include_trees and dedup_trees else None
+    result = dict(ref_frame=ref_frame)
+    result.update(commits_to_frames(commits, include_trees=include_trees,
+                                    tree_store=tree_store,
+                                    commit_cache=commit_cache))
+    if commit_cache is not None:
+        # counting actors over commits would load the cached commits again
+        result['actor_frame'] = commit_frame_to_actor_frame(
+            result['commit_frame'])
+    else:
+        result['actor_frame'] = commits_to_actor_frame(commits)
+    if tree_store is not None:
+        result.update(tree_store.to_frames())
+    return result
+
+
+def chunked_commit_history_to_frames(repo, revs='all_refs',
+                                     include_trees=True,
+                                     paths='', chunk_size=1000,
+                                     dedup_trees=False, commit_cache=None,
+                                     **kwargs):
+    """
+    extracts the same frames as commit_history_to_frames but streams commits
+    from the repository in chunks of chunk_size, so only one chunk of git
+    commit objects is alive at a time and the history is walked once
+    """
+    if commit_cache is not None:
+        commit_cache.validate(repo)
+    ref_frame = refs_to_ref_frame(repo.refs)
+    commit_revs = to_commit_revs(repo, revs)
+    commits = iter_commits(repo, commit_revs, paths=paths, **kwargs)
+    tree_store = GitTreeStore() if include_trees and dedup_trees else None
+    histories = (commits_to_frames(commit_chunk, include_trees=include_trees,
+                                   tree_store=tree_store,
+                                   commit_cache=commit_cache)
+                 for commit_chunk in partition_all(chunk_size, commits))
+    result = dict(ref_frame=ref_frame)
+    result.update(concat_history_frames(histories))
+    if tree_store is not None:
+        result.update(tree_store.to_frames())
+    return result
+
+
+def to_commit_revs(repo, revs):
     if revs == 'all_refs':
         commit_revs = (ref.commit.hexsha for ref in repo.refs)
     else:
         commit_revs = revs
-    commits = get_commits(repo, commit_revs, paths=paths, **kwargs)
-    actor_frame = commits_to_actor_frame(commits)
-    commit_frame = commits_to_frame(commits)
+    return commit_revs
+
+
+def get_ref_tips(repo, revs='all_refs'):
+    """
+    resolves revs to the hexsha of the commits they point to
+    :return: ordered dict of ref path or rev to commit hexsha
+    """
+    if revs == 'all_refs':
+        return OrderedDict((ref.path, ref.commit.hexsha) for ref in repo.refs)
+    else:
+        return OrderedDict((rev, repo.commit(rev).hexsha) for rev in revs)
+
+
+def filter_known_commits(repo, hexshas):
+    """
+    drops hexshas of commits missing in the repository, e.g. the ones lost
+    after a force push and garbage collection
+    """
+    known_hexshas = []
+    for hexsha in hexshas:
+        try:
+            repo.commit(hexsha)
+        except (ValueError, BadName, BadObject):
+            continue
+        known_hexshas.append(hexsha)
+    return known_hexshas
+
+
+def merge_commit_history(history, new_history):
+    """
+    merges frames extracted for new commits only into the frames of the
+    previously extracted history, actor commit counts are recomputed and
+    columns added to the previous actor frame, such as actor_id, are kept
+    :param history: dict of previously extracted frames keyed by frame name
+    :param new_history: dict of frames extracted for commits missing in
+    history, commits found in both, e.g. extracted again when a previous
+    ref tip was lost after a force push, are kept from new_history
+    :return: dict of merged frames keyed by frame name
+    """
+    result = dict(ref_frame=new_history['ref_frame'])
+    result.update(concat_history_frames([new_history, history], dedup=True))
+    previous_actor_frame = history.get('actor_frame')
+    if previous_actor_frame is not None:
+        actor_frame = result['actor_frame']
+        keys = ['name', 'email']
+        extra_columns = [c for c in previous_actor_frame.columns
+                         if c not in actor_frame.columns]
+        if extra_columns:
+            actor_frame = pd.merge(
+                actor_frame.astype({key: object for key in keys}),
+                previous_actor_frame[keys + extra_columns].astype(
+                    {key: object for key in keys}),
+                on=keys, how='left')
+            for key in keys:
+                actor_frame[key] = su.categorize(actor_frame[key])
+            result['actor_frame'] = actor_frame
+    return result
+
+
+def commits_to_frames(commits, include_trees=True, tree_store=None,
+                      commit_cache=None):
+    """
+    builds commit, file, parent and optionally tree frames from a sequence
+    of commits, actors are left out as they are counted over the whole
+    history, see commit_frame_to_actor_frame
+    :param tree_store: GitTreeStore collecting commit trees instead of
+    the tree frame
+    :param commit_cache: GitCommitCache with records of the commits
+    """
+    commit_records = commits_to_records(commits, commit_cache=commit_cache)
+    commit_frame = commit_records_to_frame(commit_records)
     stats_files_frame = commit_frame[['hexsha', 'stats_files']]
     commit_frame.drop('stats_files', axis=1, inplace=True)
     file_frame = stats_files_to_frame(stats_files_frame)
-    parent_frame = commit_parents_to_frame(commits)
-    result = dict(ref_frame=ref_frame,
-                  actor_frame=actor_frame,
-                  commit_frame=commit_frame,
+    parent_frame = commit_records_to_parent_frame(commit_records)
+    result = dict(commit_frame=commit_frame,
                   file_frame=file_frame,
                   parent_frame=parent_frame)
-    if include_trees:
-        tree_frame = commit_trees_to_frame(commits)
-        result['tree_frame'] = tree_frame
+    if include_trees and tree_store is not None:
+        tree_store.add_commits(commits)
+    elif include_trees:
+        result['tree_frame'] = commit_trees_to_frame(commits)
+    return result
+
+
+def concat_history_frames(histories, dedup=False):
+    """
+    concatenates frames extracted from separate chunks of the commit history
+    as returned by commits_to_frames and recomputes the actor frame over the
+    combined commits
+    :param histories: iterable of dicts of frames keyed by frame name
+    :param dedup: keep frames of a commit extracted in several chunks once,
+    from the first chunk it appears in
+    :return: dict of combined frames keyed by frame name
+    """
+    frame_parts = OrderedDict()
+    for history in histories:
+        for key, frame in history.items():
+            frame_parts.setdefault(key, []).append(frame)
+    if dedup:
+        concat_commit_frames = partial(concat_keyed_frames, key='hexsha')
+    else:
+        concat_commit_frames = concat_frames
+    commit_frame = concat_commit_frames(
+        frame_parts['commit_frame'],
+        categorical_columns=COMMIT_CATEGORICAL_COLUMNS)
+    commit_frame = commit_frame.sort_values(
+        'committed_datetime', ascending=False).reset_index(drop=True)
+    result = dict(
+        actor_frame=commit_frame_to_actor_frame(commit_frame),
+        commit_frame=commit_frame,
+        file_frame=concat_commit_frames(frame_parts['file_frame']),
+        parent_frame=concat_commit_frames(frame_parts['parent_frame']))
+    if 'tree_frame' in frame_parts:
+        result['tree_frame'] = concat_commit_frames(
+            frame_parts['tree_frame'],
+            categorical_columns=TREE_CATEGORICAL_COLUMNS)
+    if 'tree_entry_frame' in frame_parts:
+        result['tree_entry_frame'] = concat_keyed_frames(
+            frame_parts['tree_entry_frame'], 'tree',
+            TREE_ENTRY_CATEGORICAL_COLUMNS)
+        result['commit_tree_frame'] = concat_keyed_frames(
+            frame_parts['commit_tree_frame'], 'hexsha')
     return result
 
 
+def concat_frames(frames, categorical_columns=()):
+    frame = pd.concat(frames, ignore_index=True)
+    # categories of the parts differ, so concat falls back to object columns
+    for col in categorical_columns:
+        frame[col] = su.categorize(frame[col])
+    return frame
+
+
+def concat_keyed_frames(frames, key, categorical_columns=()):
+    """
+    concatenates frames keeping rows of each key value from the first frame
+    the value appears in, e.g. tree entries stored by several tree stores
+    """
+    parts = [frame.assign(_part=i) for i, frame in enumerate(frames)]
+    frame = concat_frames(parts)
+    first_part = frame.groupby(
+        frame[key].astype(object))['_part'].transform('min')
+    frame = frame[frame['_part'] == first_part].drop('_part', axis=1)
+    frame.reset_index(drop=True, inplace=True)
+    for col in categorical_columns:
+        frame[col] = su.categorize(frame[col])
+    return frame
+
+
 def stats_files_to_frame(stats_files_frame):
     file_changes = []
     for row in stats_files_frame.itertuples():
         for file_path, file_change in row.stats_files.items():
-            file_path1, file_path2 = check_file_move(file_path)
-            move = file_path1 != file_path2
-            d = dict(hexsha=row.hexsha,
-                     file_path1=file_path1,
-                     file_path2=file_path2,
-                     move=move)
+            d = dict(hexsha=row.hexsha, file_path=file_path)
             d.update(file_change)
             file_changes.append(d)
     file_frame = pd.DataFrame(file_changes, columns=(
-        'hexsha', 'file_path1', 'file_path2', 'move', 'lines', 'insertions',
-        'deletions'))
+        'hexsha', 'file_path', 'lines', 'insertions', 'deletions'))
+    file_moves = parse_file_moves(file_frame['file_path'])
+    file_frame = pd.concat([file_frame[['hexsha']], file_moves,
+                            file_frame[['lines', 'insertions', 'deletions']]],
+                           axis=1)
     return file_frame
 
 
-def get_commits(repo, revs, paths='', **kwargs):
-    commits = []
+def get_commits(repo, revs, paths='', commit_cache=None, **kwargs):
+    """
+    :param commit_cache: GitCommitCache keeping hexshas of the commits
+    walked with the same arguments, commits are then created from the
+    hexshas without walking the history
+    """
+    if commit_cache is None:
+        return list(iter_commits(repo, revs, paths=paths, **kwargs))
+    revs = list(revs)
+    rev_list_key = repr((revs, paths, sorted(kwargs.items())))
+    hexshas = commit_cache.get_rev_list(rev_list_key)
+    if hexshas is None:
+        commits = list(iter_commits(repo, revs, paths=paths, **kwargs))
+        commit_cache.put_rev_list(rev_list_key,
+                                  [commit.hexsha for commit in commits])
+        return commits
+    return [Commit(repo, hex_to_bin(hexsha)) for hexsha in hexshas]
+
+
+def iter_commits(repo, revs, paths='', exclude_revs=(), **kwargs):
+    """
+    lazily iterates commits reachable from revs skipping the ones already
+    visited from the previous revs and the ones reachable from exclude_revs
+    """
+    excluded = ['^{}'.format(rev) for rev in exclude_revs]
     visited_commit_hexsha = set()
     for rev in revs:
-        for commit in repo.iter_commits(rev=rev, paths=paths, **kwargs):
+        rev_range = [rev] + excluded if excluded else rev
+        for commit in repo.iter_commits(rev=rev_range, paths=paths,
+                                        **kwargs):
             commit_hexsha = commit.hexsha
             if commit_hexsha in visited_commit_hexsha:
                 continue
             else:
                 visited_commit_hexsha.add(commit_hexsha)
-            commits.append(commit)
-    return commits
+            yield commit
 
 
 def extract_actors(commits, actor_type, attrs):
     actor_attrs = ['{}.{}'.format(actor_type, attr) for attr in attrs]
-    actors = su.dicts_to_dataframe(list(
-        su.objs_to_dicts(commits, actor_attrs)))
+    actors = su.objs_to_columns(commits, actor_attrs)
     actors = actors.groupby(by=actor_attrs).size()
     actors = actors.reset_index().sort_values(actor_attrs)
     # noinspection PyTypeChecker
@@ -84,6 +333,34 @@ def commits_to_actor_frame(commits):
     attrs = ('name', 'email')
     authors = extract_actors(commits, 'author', attrs)
     committers = extract_actors(commits, 'committer', attrs)
+    return merge_actors(authors, committers, attrs)
+
+
+def count_frame_actors(commit_frame, actor_type, attrs):
+    actor_columns = ['{}_{}'.format(actor_type, attr) for attr in attrs]
+    # categorical group keys would produce all combinations of categories
+    actors = commit_frame[actor_columns].astype(object).groupby(
+        by=actor_columns).size()
+    actors = actors.reset_index().sort_values(actor_columns)
+    # noinspection PyTypeChecker
+    new_columns = dict(list(zip(actor_columns, attrs)) +
+                       [(0, '{}_commits'.format(actor_type))])
+    actors.rename(columns=new_columns, inplace=True)
+    return actors
+
+
+def commit_frame_to_actor_frame(commit_frame):
+    """
+    builds the same actor frame as commits_to_actor_frame counting actors
+    over the commit frame columns instead of git commit objects
+    """
+    attrs = ('name', 'email')
+    authors = count_frame_actors(commit_frame, 'author', attrs)
+    committers = count_frame_actors(commit_frame, 'committer', attrs)
+    return merge_actors(authors, committers, attrs)
+
+
+def merge_actors(authors, committers, attrs):
     actors = pd.merge(authors, committers, on=attrs, how='outer')
     actors = actors.drop_duplicates().reset_index(drop=True).fillna(0)
     for attr in attrs:
@@ -96,36 +373,89 @@ def commits_to_actor_frame(commits):
 def refs_to_ref_frame(git_refs):
     attrs = {'__class__.__name__': 'ref_type', 'name': 'name',
              'path': 'path', 'commit.hexsha': 'commit'}
-    ref_frame = su.dicts_to_dataframe(list(
-        su.objs_to_dicts(git_refs, attrs.keys())))
-    ref_frame.rename(columns=attrs, inplace=True)
-    return ref_frame
-
-
-def commits_to_frame(commits):
-    commit_attrs = (
-        'hexsha', 'name_rev', 'size',
-        'author.name', 'author.email',
-        'authored_datetime', 'author_tz_offset',
-        'committer.name', 'committer.email',
-        'committed_datetime', 'committer_tz_offset',
-        'encoding', 'message',
-        'stats.total.files', 'stats.total.lines',
-        'stats.total.insertions', 'stats.total.deletions',
-        'stats.files')
-    column_names = {attr: attr.replace('.', '_') for attr in commit_attrs}
-    commit_frame = su.dicts_to_dataframe(list(
-        su.objs_to_dicts(commits, commit_attrs)))
-    commit_frame.rename(columns=column_names, inplace=True)
+    return su.objs_to_columns(git_refs, attrs)
+
+
+def commits_to_frame(commits, commit_cache=None):
+    if commit_cache is not None:
+        return commit_records_to_frame(
+            commits_to_records(commits, commit_cache=commit_cache))
+    commit_frame = su.objs_to_columns(
+        commits, {attr: attr.replace('.', '_') for attr in COMMIT_ATTRS})
+    return finish_commit_frame(commit_frame)
+
+
+def commits_to_records(commits, commit_cache=None):
+    """
+    extracts COMMIT_ATTRS and 'parents' hexshas of the commits into dicts,
+    records of the commits found in commit_cache are read from the cache
+    and the records of the rest are added to it
+    """
+    commits = list(commits)
+    if commit_cache is not None:
+        cached_records = commit_cache.get_commit_records(
+            commit.hexsha for commit in commits)
+    else:
+        cached_records = {}
+    stale_hexshas = [hexsha for hexsha, record in cached_records.items()
+                     if 'name_rev' not in record]
+    if stale_hexshas:
+        # names of the cached commits are dropped when the refs change
+        name_revs = OrderedDict(
+            (hexsha, '{} {}'.format(hexsha, name))
+            for hexsha, name in get_name_revs(
+                commits[0].repo, stale_hexshas).items())
+        for hexsha, name_rev in name_revs.items():
+            cached_records[hexsha]['name_rev'] = name_rev
+        commit_cache.put_name_revs(name_revs)
+    new_commits = [commit for commit in commits
+                   if commit.hexsha not in cached_records]
+    new_records = OrderedDict()
+    # the attributes of the new commits are looked up column by column
+    for commit, record in zip(new_commits,
+                              su.objs_to_dicts(new_commits, COMMIT_ATTRS)):
+        record['parents'] = [parent.hexsha for parent in commit.parents]
+        new_records[commit.hexsha] = record
+    records = [cached_records.get(commit.hexsha) or
+               new_records[commit.hexsha] for commit in commits]
+    if commit_cache is not None:
+        commit_cache.put_commit_records(new_records)
+    return records
+
+
+def get_name_revs(repo, hexshas, batch_size=1000):
+    """
+    resolves commit names relative to refs as Commit.name_rev does, but
+    with one git name-rev process per batch of commits
+    """
+    name_revs = {}
+    for hexsha_batch in partition_all(batch_size, hexshas):
+        names = repo.git.name_rev('--name-only', *hexsha_batch).splitlines()
+        name_revs.update(zip(hexsha_batch, names))
+    return name_revs
+
+
+def commit_records_to_frame(commit_records):
+    # record keys are the dotted attribute paths
+    commit_frame = su.objs_to_columns(
+        commit_records,
+        {attr: attr.replace('.', '_') for attr in COMMIT_ATTRS}, sep=None)
+    return finish_commit_frame(commit_frame)
+
+
+def finish_commit_frame(commit_frame):
     commit_frame['name_rev'] = commit_frame['name_rev'].str.split(
         ' ', 1).apply(lambda x: x[-1])
-    categorical_cols = (
-        'name_rev', 'author_name', 'author_email',
-        'committer_name', 'committer_email', 'encoding')
-    for c in categorical_cols:
+    return format_commit_frame(commit_frame)
+
+
+def format_commit_frame(commit_frame):
+    for c in COMMIT_CATEGORICAL_COLUMNS:
         commit_frame[c] = su.categorize(commit_frame[c])
     for c in ('authored_datetime', 'committed_datetime'):
-        commit_frame[c] = commit_frame[c].astype('datetime64[ns]')
+        # tz aware commit datetimes are kept as naive utc
+        commit_frame[c] = pd.to_datetime(
+            commit_frame[c], utc=True).dt.tz_localize(None)
     commit_frame['message'] = commit_frame['message'].str.replace('\n', '\\n')
     commit_frame = commit_frame.sort_values(
         'committed_datetime', ascending=False).reset_index(drop=True)
@@ -146,6 +476,19 @@ def commit_parents_to_frame(commits):
     return pd.DataFrame(commit_parents, columns=['hexsha', 'parent_hexsha'])
 
 
+def commit_records_to_parent_frame(commit_records):
+    commit_parents = []
+    for record in commit_records:
+        hexsha = record['hexsha']
+        if not record['parents']:
+            commit_parents.append(dict(hexsha=hexsha, parent_hexsha=None))
+        else:
+            commit_parents.extend(
+                (dict(hexsha=hexsha, parent_hexsha=p)
+                 for p in record['parents']))
+    return pd.DataFrame(commit_parents, columns=['hexsha', 'parent_hexsha'])
+
+
 def commit_trees_to_frame(commits):
     frame: pd.DataFrame = pd.concat(
         (commit_tree_to_frame(c) for c in commits))
@@ -197,6 +540,86 @@ def check_file_move(file_path):
         return change_part, change_part
 
 
+def parse_file_moves(file_paths):
+    """
+    vectorised check_file_move over a whole column of stats file paths,
+    paths with a single rename in the usual git forms 'a => b' and
+    'pre/{a => b}/post' are parsed by arrow string kernels, the remaining
+    rare forms fall back to check_file_move
+    :param file_paths: pandas series, arrow string array or list of paths
+    :return: frame with file_path1, file_path2 and move columns, indexed as
+    the series of file paths
+    """
+    index = file_paths.index if isinstance(file_paths, pd.Series) else None
+    paths = (file_paths if isinstance(file_paths, pa.Array)
+             else pa.array(file_paths, type=pa.string(), from_pandas=True))
+    arrow_counts = pc.count_substring(paths, '=>')
+    open_counts = pc.count_substring(paths, '{')
+    braced = pc.equal(open_counts, 1)
+    arrow_positions = pc.find_substring(paths, ' => ')
+    single_move = pc.and_(
+        pc.and_(pc.equal(arrow_counts, 1),
+                pc.greater_equal(arrow_positions, 0)),
+        pc.and_(pc.equal(open_counts, pc.count_substring(paths, '}')),
+                pc.less_equal(open_counts, 1)))
+    single_move = pc.and_(single_move,
+                          pc.equal(pc.count_substring(paths, '\n'), 0))
+    # the braces have to enclose the arrow to be a renamed path part
+    single_move = pc.and_(single_move, pc.or_(
+        pc.invert(braced),
+        pc.and_(pc.less(pc.find_substring(paths, '{'), arrow_positions),
+                pc.less(arrow_positions, pc.find_substring(paths, '}')))))
+    file_path1 = paths.to_numpy(zero_copy_only=False)
+    file_path2 = file_path1.copy()
+    # 'a => b' renames the whole path
+    plain_moves = pc.and_(single_move, pc.invert(braced))
+    old_paths, new_paths = _split_file_moves(paths.filter(plain_moves))
+    _set_rows(file_path1, plain_moves, old_paths)
+    _set_rows(file_path2, plain_moves, new_paths)
+    # 'pre/{a => b}/post' renames the part in braces
+    braced_moves = pc.and_(single_move, braced)
+    old_parts, new_parts = _split_file_moves(paths.filter(braced_moves))
+    old_parts = pc.split_pattern(old_parts, '{', max_splits=1)
+    new_parts = pc.split_pattern(new_parts, '}', max_splits=1)
+    pre_parts = pc.list_element(old_parts, 0)
+    post_parts = pc.list_element(new_parts, 1)
+    _set_rows(file_path1, braced_moves, _combine_path_parts(
+        pre_parts, pc.list_element(old_parts, 1), post_parts))
+    _set_rows(file_path2, braced_moves, _combine_path_parts(
+        pre_parts, pc.list_element(new_parts, 0), post_parts))
+    other_moves = pc.and_(pc.greater(arrow_counts, 0),
+                          pc.invert(single_move))
+    for row in np.flatnonzero(other_moves.to_numpy(zero_copy_only=False)):
+        file_path1[row], file_path2[row] = check_file_move(file_path1[row])
+    return pd.DataFrame(dict(file_path1=file_path1,
+                             file_path2=file_path2,
+                             move=file_path1 != file_path2),
+                        columns=('file_path1', 'file_path2', 'move'),
+                        index=index)
+
+
+def _split_file_moves(move_paths):
+    move_parts = pc.split_pattern(move_paths, ' => ', max_splits=1)
+    return pc.list_element(move_parts, 0), pc.list_element(move_parts, 1)
+
+
+def _set_rows(values, mask, row_values):
+    rows = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+    values[rows] = row_values.to_numpy(zero_copy_only=False)
+
+
+def _combine_path_parts(pre_parts, inner_parts, post_parts):
+    # arrow counterpart of combine_path_parts
+    file_paths = pc.binary_join_element_wise(pre_parts, inner_parts,
+                                             post_parts, '')
+    squashed = pc.and_(pc.equal(inner_parts, ''),
+                       pc.and_(pc.ends_with(pre_parts, '/'),
+                               pc.starts_with(post_parts, '/')))
+    squashed_paths = pc.binary_join_element_wise(
+        pc.utf8_slice_codeunits(pre_parts, 0, -1), post_parts, '')
+    return pc.if_else(squashed, squashed_paths, file_paths)
+
+
 def combine_path_parts(pre_part, inner_part, post_part):
     if inner_part:
         file_path = pre_part + inner_part + post_part
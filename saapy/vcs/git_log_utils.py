@@ -0,0 +1,247 @@
+# coding=utf-8
+
+"""
+bulk extraction of the commit history from a single git log process,
+an alternative to the GitPython based extraction in git_commit_utils
+which starts a git diff per commit to read its stats
+"""
+
+import logging
+import subprocess
+
+import pandas as pd
+from git.objects.util import utctz_to_altz
+from gitdb.util import hex_to_bin
+from toolz import partition_all
+
+from .git_commit_utils import (
+    commit_trees_to_frame, concat_history_frames,
+    format_commit_frame, get_name_revs, refs_to_ref_frame,
+    stats_files_to_frame, to_commit_revs)
+from .git_tree_store import GitTreeStore
+
+logger = logging.getLogger(__name__)
+
+RECORD_START = '\x1e'
+FIELD_SEPARATOR = '\x1f'
+MESSAGE_END = '\x1d'
+
+GIT_LOG_FIELDS = (
+    ('hexsha', '%H'),
+    ('parents', '%P'),
+    ('author_name', '%an'),
+    ('author_email', '%ae'),
+    ('authored_date', '%at'),
+    ('author_date_iso', '%ai'),
+    ('committer_name', '%cn'),
+    ('committer_email', '%ce'),
+    ('committed_date', '%ct'),
+    ('committer_date_iso', '%ci'),
+    ('encoding', '%e'),
+    ('message', '%B'))
+
+GIT_LOG_FORMAT = '{}{}{}'.format(
+    '%x1e',
+    '%x1f'.join(placeholder for _, placeholder in GIT_LOG_FIELDS),
+    '%x1d')
+
+COMMIT_FRAME_COLUMNS = (
+    'hexsha', 'name_rev', 'size',
+    'author_name', 'author_email',
+    'authored_datetime', 'author_tz_offset',
+    'committer_name', 'committer_email',
+    'committed_datetime', 'committer_tz_offset',
+    'encoding', 'message',
+    'stats_total_files', 'stats_total_lines',
+    'stats_total_insertions', 'stats_total_deletions',
+    'stats_files')
+
+DEFAULT_ENCODING = 'UTF-8'
+
+
+def git_log_history_to_frames(repo, revs='all_refs',
+                              include_trees=True,
+                              paths='', chunk_size=10000,
+                              no_renames=True, dedup_trees=False, **kwargs):
+    """
+    extracts the same frames as commit_history_to_frames streaming commits
+    and their file stats from one git log --numstat process
+    :param repo: GitPython repository
+    :param revs: revisions to walk or 'all_refs' for all repository refs
+    :param include_trees: extract commit trees, they are still read through
+    GitPython
+    :param paths: restrict commits to the ones touching the paths, stats
+    cover all the commit files like in the GitPython extraction
+    :param chunk_size: number of parsed commits converted to frames at once
+    :param no_renames: report renames as a deletion and an addition as
+    GitPython commit stats do
+    :param dedup_trees: keep trees in GitTreeStore frames, see
+    commit_history_to_frames
+    :param kwargs: further git log options, e.g. max_count=100
+    :return: dict of frames keyed by frame name
+    """
+    ref_frame = refs_to_ref_frame(repo.refs)
+    commit_revs = list(to_commit_revs(repo, revs))
+    log_records = iter_git_log_records(repo, commit_revs, paths=paths,
+                                       no_renames=no_renames, **kwargs)
+    tree_store = GitTreeStore() if include_trees and dedup_trees else None
+    histories = (log_records_to_frames(repo, record_chunk,
+                                       include_trees=include_trees,
+                                       tree_store=tree_store)
+                 for record_chunk in partition_all(chunk_size, log_records))
+    result = dict(ref_frame=ref_frame)
+    result.update(concat_history_frames(histories))
+    if tree_store is not None:
+        result.update(tree_store.to_frames())
+    return result
+
+
+def iter_git_log_records(repo, revs, paths='', no_renames=True,
+                         exclude_revs=(), **kwargs):
+    """
+    runs git log --numstat over revs excluding commits reachable from
+    exclude_revs and yields one dict per commit with GIT_LOG_FIELDS and
+    the 'stats_files' dict in the GitPython stats format, with paths the
+    commits are the ones git rev-list selects for the paths
+    """
+    # merges are diffed against their first parent like GitPython commit
+    # stats, -m would skip the empty first parent diff of a merge
+    args = ['--diff-merges=first-parent', '--numstat',
+            '--format={}'.format(GIT_LOG_FORMAT)]
+    if no_renames:
+        args.append('--no-renames')
+    rev_args = list(revs) + ['^{}'.format(rev) for rev in exclude_revs]
+    if paths:
+        # --diff-merges changes the history simplification by paths, so the
+        # commits are selected by rev-list as in the GitPython extraction
+        # and git log reads them from stdin without walking the history
+        hexshas = repo.git.rev_list(
+            *rev_args, '--',
+            *([paths] if isinstance(paths, str) else paths),
+            **kwargs).split()
+        if not hexshas:
+            return
+        process = repo.git.log('--no-walk=unsorted', '--stdin', *args,
+                               as_process=True, istream=subprocess.PIPE)
+        process.stdin.write('\n'.join(hexshas).encode('ascii'))
+        process.stdin.close()
+    else:
+        process = repo.git.log(*(args + rev_args), as_process=True,
+                               **kwargs)
+    for record_text in _split_records(process.stdout):
+        yield parse_git_log_record(record_text)
+    process.wait()
+
+
+def _split_records(stream):
+    lines = []
+    for line in stream:
+        line = line.decode('utf-8', 'replace')
+        if line.startswith(RECORD_START) and lines:
+            yield ''.join(lines)
+            lines = []
+        lines.append(line)
+    if lines:
+        yield ''.join(lines)
+
+
+def parse_git_log_record(record_text):
+    header, _, numstat = record_text.partition(MESSAGE_END)
+    values = header[len(RECORD_START):].split(
+        FIELD_SEPARATOR, len(GIT_LOG_FIELDS) - 1)
+    record = dict(zip((name for name, _ in GIT_LOG_FIELDS), values))
+    record['stats_files'] = parse_numstat(numstat)
+    return record
+
+
+def parse_numstat(numstat):
+    stats_files = {}
+    for line in numstat.splitlines():
+        if not line:
+            continue
+        raw_insertions, raw_deletions, file_path = line.split('\t', 2)
+        # binary files are reported with - instead of line counts
+        insertions = int(raw_insertions) if raw_insertions != '-' else 0
+        deletions = int(raw_deletions) if raw_deletions != '-' else 0
+        stats_files[file_path] = dict(insertions=insertions,
+                                      deletions=deletions,
+                                      lines=insertions + deletions)
+    return stats_files
+
+
+def log_records_to_frames(repo, records, include_trees=True,
+                          tree_store=None):
+    """
+    builds commit, file, parent and optionally tree frames from git log
+    records in the same shape as commits_to_frames does from commits
+    """
+    commit_frame = log_records_to_commit_frame(repo, records)
+    stats_files_frame = commit_frame[['hexsha', 'stats_files']]
+    commit_frame.drop('stats_files', axis=1, inplace=True)
+    file_frame = stats_files_to_frame(stats_files_frame)
+    parent_frame = log_records_to_parent_frame(records)
+    result = dict(commit_frame=commit_frame,
+                  file_frame=file_frame,
+                  parent_frame=parent_frame)
+    if include_trees:
+        commits = [repo.commit(record['hexsha']) for record in records]
+        if tree_store is not None:
+            tree_store.add_commits(commits)
+        else:
+            result['tree_frame'] = commit_trees_to_frame(commits)
+    return result
+
+
+def log_records_to_commit_frame(repo, records):
+    hexshas = [record['hexsha'] for record in records]
+    name_revs = get_name_revs(repo, hexshas)
+    commit_dicts = []
+    for record in records:
+        hexsha = record['hexsha']
+        stats_files = record['stats_files']
+        insertions = sum(f['insertions'] for f in stats_files.values())
+        deletions = sum(f['deletions'] for f in stats_files.values())
+        commit_dicts.append(dict(
+            hexsha=hexsha,
+            name_rev=name_revs[hexsha],
+            size=repo.odb.info(hex_to_bin(hexsha)).size,
+            author_name=record['author_name'],
+            author_email=record['author_email'],
+            authored_datetime=int(record['authored_date']),
+            author_tz_offset=_to_tz_offset(record['author_date_iso']),
+            committer_name=record['committer_name'],
+            committer_email=record['committer_email'],
+            committed_datetime=int(record['committed_date']),
+            committer_tz_offset=_to_tz_offset(record['committer_date_iso']),
+            encoding=record['encoding'] or DEFAULT_ENCODING,
+            message=record['message'],
+            stats_total_files=len(stats_files),
+            stats_total_lines=insertions + deletions,
+            stats_total_insertions=insertions,
+            stats_total_deletions=deletions,
+            stats_files=stats_files))
+    commit_frame = pd.DataFrame(commit_dicts, columns=COMMIT_FRAME_COLUMNS)
+    # git log reports seconds since epoch, GitPython datetimes become
+    # naive utc datetimes in the commit frame as well
+    for c in ('authored_datetime', 'committed_datetime'):
+        commit_frame[c] = pd.to_datetime(commit_frame[c], unit='s')
+    return format_commit_frame(commit_frame)
+
+
+def _to_tz_offset(iso_date):
+    # GitPython keeps offsets in seconds west of utc
+    return utctz_to_altz(iso_date.rsplit(' ', 1)[-1])
+
+
+def log_records_to_parent_frame(records):
+    commit_parents = []
+    for record in records:
+        hexsha = record['hexsha']
+        parent_hexshas = record['parents'].split()
+        if not len(parent_hexshas):
+            commit_parents.append(dict(hexsha=hexsha, parent_hexsha=None))
+        else:
+            commit_parents.extend(
+                (dict(hexsha=hexsha, parent_hexsha=p)
+                 for p in parent_hexshas))
+    return pd.DataFrame(commit_parents, columns=['hexsha', 'parent_hexsha'])
@@ -0,0 +1,151 @@
+# coding=utf-8
+
+"""
+multi-process extraction of the commit history, commits are sharded either
+by slices of the rev-list of the requested revs or by groups of paths,
+every worker process opens its own repository and returns partial frames
+which are merged in the shard order and deduplicated by commit
+"""
+
+import logging
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from git import Repo
+from toolz import partition_all
+
+from .git_commit_utils import (commit_history_to_frames, commits_to_frames,
+                               concat_history_frames, refs_to_ref_frame,
+                               to_commit_revs)
+from .git_log_utils import (git_log_history_to_frames, iter_git_log_records,
+                            log_records_to_frames)
+from .git_tree_store import GitTreeStore
+
+logger = logging.getLogger(__name__)
+
+SHARD_MODES = ('revs', 'paths')
+
+SHARDS_PER_WORKER = 4
+
+
+def parallel_commit_history_to_frames(repo, revs='all_refs',
+                                      include_trees=True, paths='',
+                                      workers=None, shard_by='revs',
+                                      backend='gitpython', chunk_size=1000,
+                                      dedup_trees=False, exclude_revs=(),
+                                      **kwargs):
+    """
+    extracts the same frames as commit_history_to_frames in a pool of
+    worker processes
+    :param repo: GitPython repository, workers open it by its git dir
+    :param workers: number of worker processes, all cpus by default
+    :param shard_by: 'revs' lists the commits to extract with one rev-list
+    and hands out contiguous slices of it, 'paths' runs the whole history
+    extraction per group of paths, commits touching paths of several groups
+    are kept once
+    :param backend: 'gitpython' or 'git_log' as in
+    GitClient.extract_commit_history
+    :param chunk_size: number of commits a worker converts to frames at once
+    :param kwargs: further rev-list options, e.g. max_count=100, no_renames
+    is passed on to the git_log backend
+    :return: dict of frames keyed by frame name
+    """
+    if shard_by not in SHARD_MODES:
+        raise ValueError('unsupported shard mode {}'.format(shard_by))
+    workers = workers or os.cpu_count()
+    commit_revs = list(to_commit_revs(repo, revs))
+    if shard_by == 'revs':
+        extract_shard = partial(
+            extract_commit_shard, repo.git_dir,
+            include_trees=include_trees, backend=backend,
+            chunk_size=chunk_size, dedup_trees=dedup_trees,
+            no_renames=kwargs.pop('no_renames', True))
+        hexshas = list_commits(repo, commit_revs, paths=paths,
+                               exclude_revs=exclude_revs, **kwargs)
+        shard_count = min(len(hexshas), workers * SHARDS_PER_WORKER) or 1
+        shard_size = math.ceil(len(hexshas) / shard_count) or 1
+        shards = list(partition_all(shard_size, hexshas))
+    else:
+        if not paths or isinstance(paths, str):
+            raise ValueError('sharding by paths requires a list of paths')
+        extract_shard = partial(
+            extract_path_shard, repo.git_dir, commit_revs,
+            include_trees=include_trees, backend=backend,
+            chunk_size=chunk_size, dedup_trees=dedup_trees,
+            exclude_revs=exclude_revs, **kwargs)
+        shard_count = min(len(paths), workers)
+        shards = [list(paths[i::shard_count]) for i in range(shard_count)]
+    logger.info('extracting commit history in %s shards by %s',
+                len(shards), shard_by)
+    ref_frame = refs_to_ref_frame(repo.refs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map yields results in the shard order, so the merge is
+        # deterministic whatever order the workers finish in
+        histories = list(executor.map(extract_shard, shards))
+    result = dict(ref_frame=ref_frame)
+    result.update(concat_history_frames(
+        [history for history in histories if history], dedup=True))
+    return result
+
+
+def list_commits(repo, revs, paths='', exclude_revs=(), **kwargs):
+    """
+    :return: hexshas of commits reachable from revs and not from
+    exclude_revs in the rev-list order
+    """
+    args = list(revs) + ['^{}'.format(rev) for rev in exclude_revs]
+    if paths:
+        args.append('--')
+        args.extend([paths] if isinstance(paths, str) else paths)
+    return repo.git.rev_list(*args, **kwargs).split()
+
+
+def extract_commit_shard(git_dir, hexshas, include_trees=True,
+                         backend='gitpython', chunk_size=1000,
+                         dedup_trees=False, no_renames=True):
+    """
+    worker building frames of the listed commits
+    """
+    repo = Repo(git_dir)
+    tree_store = GitTreeStore() if include_trees and dedup_trees else None
+    histories = []
+    for hexsha_chunk in partition_all(chunk_size, hexshas):
+        if backend == 'git_log':
+            records = list(iter_git_log_records(
+                repo, hexsha_chunk, no_renames=no_renames, no_walk=True))
+            history = log_records_to_frames(repo, records,
+                                            include_trees=include_trees,
+                                            tree_store=tree_store)
+        else:
+            commits = [repo.commit(hexsha) for hexsha in hexsha_chunk]
+            history = commits_to_frames(commits, include_trees=include_trees,
+                                        tree_store=tree_store)
+        histories.append(history)
+    if not histories:
+        return {}
+    result = concat_history_frames(histories)
+    if tree_store is not None:
+        result.update(tree_store.to_frames())
+    return result
+
+
+def extract_path_shard(git_dir, revs, paths, include_trees=True,
+                       backend='gitpython', chunk_size=1000,
+                       dedup_trees=False, **kwargs):
+    """
+    worker extracting the history of commits touching the paths
+    """
+    repo = Repo(git_dir)
+    rev_list_kwargs = {key: value for key, value in kwargs.items()
+                       if key != 'no_renames'}
+    if not list_commits(repo, revs, paths=paths, **rev_list_kwargs):
+        return {}
+    if backend == 'git_log':
+        history_to_frames = git_log_history_to_frames
+    else:
+        history_to_frames = commit_history_to_frames
+    return history_to_frames(repo, revs=revs, include_trees=include_trees,
+                             paths=paths, chunk_size=chunk_size,
+                             dedup_trees=dedup_trees, **kwargs)
@@ -0,0 +1,122 @@
+# coding=utf-8
+
+"""
+content addressed storage of commit trees, every distinct git tree object
+is kept once under its sha and commits refer to their root tree only
+"""
+
+from collections import OrderedDict
+
+import pandas as pd
+
+import saapy.util as su
+
+
+TREE_ENTRY_COLUMNS = ('tree', 'name', 'child', 'child_type')
+
+TREE_ENTRY_CATEGORICAL_COLUMNS = ('tree', 'name', 'child_type')
+
+COMMIT_TREE_COLUMNS = ('hexsha', 'tree')
+
+
+class GitTreeStore:
+    """
+    collects tree objects of commits keyed by tree sha, so a subtree shared
+    by many commits is recorded once, and rebuilds file listings of a commit
+    on demand
+    """
+
+    def __init__(self):
+        self.tree_entries = OrderedDict()
+        self.commit_trees = OrderedDict()
+
+    def add_commits(self, commits):
+        for commit in commits:
+            self.add_commit(commit)
+
+    def add_commit(self, commit):
+        root_tree = commit.tree
+        self.commit_trees[commit.hexsha] = root_tree.hexsha
+        self.add_tree(root_tree)
+
+    def add_tree(self, tree):
+        pending_trees = [tree]
+        while pending_trees:
+            tree = pending_trees.pop()
+            if tree.hexsha in self.tree_entries:
+                continue
+            entries = [(subtree.name, subtree.hexsha, 'tree')
+                       for subtree in tree.trees]
+            entries.extend((blob.name, blob.hexsha, 'blob')
+                           for blob in tree.blobs)
+            self.tree_entries[tree.hexsha] = entries
+            pending_trees.extend(
+                subtree for subtree in tree.trees
+                if subtree.hexsha not in self.tree_entries)
+
+    def to_frames(self):
+        """
+        :return: dict with tree_entry_frame listing entries of each distinct
+        tree and commit_tree_frame mapping commits to their root trees
+        """
+        tree_entry_frame = pd.DataFrame(
+            [(tree_sha,) + entry
+             for tree_sha, entries in self.tree_entries.items()
+             for entry in entries],
+            columns=TREE_ENTRY_COLUMNS)
+        for col in TREE_ENTRY_CATEGORICAL_COLUMNS:
+            tree_entry_frame[col] = su.categorize(tree_entry_frame[col])
+        commit_tree_frame = pd.DataFrame(list(self.commit_trees.items()),
+                                         columns=COMMIT_TREE_COLUMNS)
+        return dict(tree_entry_frame=tree_entry_frame,
+                    commit_tree_frame=commit_tree_frame)
+
+    @classmethod
+    def from_frames(cls, tree_entry_frame, commit_tree_frame):
+        store = cls()
+        for row in tree_entry_frame.itertuples(index=False):
+            store.tree_entries.setdefault(row.tree, []).append(
+                (row.name, row.child, row.child_type))
+        store.commit_trees.update(
+            zip(commit_tree_frame.hexsha, commit_tree_frame.tree))
+        return store
+
+    def walk_commit_tree(self, hexsha):
+        """
+        yields (tree path, child path, child type) for the commit tree
+        in the order commit_tree_to_frame lists them
+        """
+        pending_trees = [(self.commit_trees[hexsha], '.')]
+        while pending_trees:
+            tree_sha, tree_path = pending_trees.pop(0)
+            entries = self.tree_entries[tree_sha]
+            subtrees = []
+            for child_type in ('tree', 'blob'):
+                for name, child_sha, entry_type in entries:
+                    if entry_type != child_type:
+                        continue
+                    child_path = (name if tree_path == '.'
+                                  else '{}/{}'.format(tree_path, name))
+                    yield tree_path, child_path, child_type
+                    if child_type == 'tree':
+                        subtrees.append((child_sha, child_path))
+            pending_trees[:0] = subtrees
+
+    def commit_files(self, hexsha, child_type='blob'):
+        """
+        :return: paths of the commit files, or of its directories when
+        child_type is 'tree'
+        """
+        return [child_path for _, child_path, entry_type
+                in self.walk_commit_tree(hexsha)
+                if entry_type == child_type]
+
+    def commit_tree_to_frame(self, hexsha):
+        """
+        rebuilds the frame commit_tree_to_frame extracts from the commit
+        """
+        tree_frame = pd.DataFrame(list(self.walk_commit_tree(hexsha)),
+                                  columns=('tree', 'child', 'child_type'))
+        tree_frame['hexsha'] = hexsha
+        tree_frame['child_type'] = su.categorize(tree_frame['child_type'])
+        return tree_frame
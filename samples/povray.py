@@ -1,6 +1,7 @@
 # coding=utf-8
 import contextlib
 import shelve
+import shutil
 from collections import OrderedDict
 from pathlib import Path
 from pprint import pprint
@@ -22,6 +23,7 @@ class Povray:
     git_repo_path: Path
     analysis_dir_path: Path
     shelve_db_path: Path
+    code_graph_path: Path
     scitools_udb_path: Path
     git_graph = None
     similarity_graph = None
@@ -33,6 +35,7 @@ class Povray:
         self.git_repo_path = self.root_path / 'povray'
         self.analysis_dir_path = self.root_path / 'povray-analysis'
         self.shelve_db_path = self.analysis_dir_path / 'povray.shelve'
+        self.code_graph_path = self.analysis_dir_path / 'povray-code-graph'
         self.scitools_udb_path = self.analysis_dir_path / 'povray-master.udb'
         self.scitools_client = ScitoolsClient(self.scitools_udb_path)
 
@@ -100,8 +103,9 @@ class Povray:
             with shelve.open(str(self.shelve_db_path)) as db:
                 self.scitools_client.open_project()
                 self.scitools_project = self.scitools_client.build_project(
-                    self.git_repo_path)
+                    self.git_repo_path, compact=True)
                 self.scitools_client.close_project()
+                self.scitools_project.save_code_graph(self.code_graph_path)
                 db['code_graph'] = self.scitools_project
                 print('loaded scitools project of size',
                       len(self.scitools_project.code_graph))
@@ -176,6 +180,7 @@ def cleanup(ctx):
     with contextlib.suppress(FileNotFoundError):
         pv.shelve_db_path.unlink()
         pv.scitools_udb_path.unlink()
+    shutil.rmtree(str(pv.code_graph_path), ignore_errors=True)
 
 
 @task
@@ -51,6 +51,7 @@ deps = [
     # text localization and formatting of numbers, percents, currencies
     'python-Levenshtein',  # fast string comparison
     'fuzzywuzzy',  # fuzzy string matching with heuristics based on difflib
+    'rapidfuzz',  # fast fuzzy string matching of whole arrays of strings
     'pyenchant',  # spell checking
     'spacy',
     'gensim',
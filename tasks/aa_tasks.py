@@ -94,6 +94,44 @@ def import_scitools_yaml_to_neo4j(ctx, yaml_path, neo4j_url='bolt://localhost',
     ScitoolsETL.import_to_neo4j(scitools_db, neo4j_client, labels=label_list)
 
 
+# noinspection PyUnusedLocal
+@task
+def stream_scitools(ctx, udb_path, output_dir, struct_format='jsonl'):
+    """
+    streams the udb structs to a file per node set without loading the
+    whole database into memory
+    :param struct_format: jsonl or parquet
+    """
+    scitools_client = ScitoolsClient(udb_path)
+    project_db = scitools_client.open_project()
+    if project_db is None:
+        return
+    etl = ScitoolsETL(project_db)
+    start = timer()
+    try:
+        counts = etl.export_structs(output_dir, struct_format=struct_format)
+    finally:
+        scitools_client.close_project()
+    end = timer()
+    print('exported:', counts)
+    print('transfer time:', timedelta(seconds=end - start))
+
+
+# noinspection PyUnusedLocal
+@task
+def import_scitools_structs_to_neo4j(ctx, input_dir, struct_format='jsonl',
+                                     neo4j_url='bolt://localhost',
+                                     user='neo4j', labels=''):
+    """
+    imports the node set files written by stream_scitools reading them
+    lazily
+    """
+    label_list = to_label_list(labels)
+    scitools_db = ScitoolsETL.read_structs(input_dir, struct_format)
+    neo4j_client = connect_neo4j(ctx, neo4j_url, user)
+    ScitoolsETL.import_to_neo4j(scitools_db, neo4j_client, labels=label_list)
+
+
 # noinspection PyUnusedLocal
 @task
 def import_scitools_to_neo4j(ctx, udb_path, neo4j_url='bolt://localhost',
@@ -52,6 +52,40 @@ def data_root():
     return Path(FIXTURE_DIR)
 
 
+@pytest.fixture
+def git_repo_path(tmpdir):
+    """
+    builds a small git repository with a feature branch merged into master
+    """
+    from git import Actor, Repo
+    repo_path = Path(str(tmpdir)) / 'repo'
+    repo = Repo.init(str(repo_path))
+    author = Actor('John Smith', 'john.smith@example.com')
+    other_author = Actor('Ken Trove', 'ken.trove@example.com')
+
+    def commit_file(file_name, content, message, commit_author=author):
+        file_path = repo_path / file_name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+        repo.index.add([file_name])
+        return repo.index.commit(message, author=commit_author,
+                                 committer=author)
+
+    commit_file('src/a.txt', 'a\n', 'first')
+    commit_file('src/sub/b.txt', 'b\n', 'second')
+    master = repo.head.reference
+    feature = repo.create_head('feature')
+    feature.checkout()
+    commit_file('src/c.txt', 'c\n', 'feature', commit_author=other_author)
+    master.checkout()
+    commit_file('src/a.txt', 'a\naa\n', 'third')
+    repo.index.merge_tree(feature)
+    repo.index.commit('merge feature', parent_commits=(
+        master.commit, feature.commit), author=author, committer=author)
+    master.checkout(force=True)
+    return repo_path
+
+
 @pytest.fixture
 @pytest.mark.datafiles(os.path.join(FIXTURE_DIR, 'neo4j-test-ws'))
 def neo4j_test_ws_dir(datafiles):
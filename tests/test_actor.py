@@ -1,10 +1,14 @@
 # coding=utf-8
+import random
 import shelve
 from pprint import pprint
+from timeit import default_timer as timer
+
+import pytest
 
 from saapy.analysis import ActorParser, ActorSimilarityGraph
 from saapy.util import csv_to_list
-from .test_utils import skip_on_travisciorg
+from .test_utils import skip_on_travisciorg, skip_unless_benchmark
 
 
 samples = [('John Smith', 'john.smith@example.com'),
@@ -71,3 +75,81 @@ def test_unshelve_similarity_graph(data_root):
     print()
     actor_groups = graph.group_similar_actors()
     pprint(actor_groups)
+
+
+def test_blocked_similarity_graph(data_root):
+    parser = build_parser(data_root)
+    actors = [parser.parse_actor(*sample) for sample in samples]
+    graph = ActorSimilarityGraph()
+    blocked_graph = ActorSimilarityGraph(blocking=True)
+    for actor in actors:
+        graph.add_actor(actor)
+        blocked_graph.add_actor(actor)
+    assert edge_set(blocked_graph) == edge_set(graph)
+
+
+def edge_set(graph):
+    return {frozenset(edge) for edge in graph.actor_graph.edges()}
+
+
+def synthetic_actors(person_count, seed=7):
+    """
+    :return: ((name, email), person) of several identities per person
+    """
+    first_names = ['john', 'ken', 'maria', 'olena', 'andriy', 'peter',
+                   'susan', 'li', 'ahmed', 'carlos', 'anna', 'dmitry',
+                   'george', 'fatima', 'yuki', 'brian', 'chris', 'laura',
+                   'nikolai', 'sofia', 'thomas', 'emma', 'ivan', 'julia']
+    last_names = ['smith', 'trove', 'garcia', 'shevchenko', 'kowalski',
+                  'nguyen', 'mueller', 'rossi', 'tanaka', 'oconnor',
+                  'petrenko', 'dubois', 'silva', 'andersen', 'novak',
+                  'fischer', 'moreau', 'kim', 'lopez', 'ivanova']
+    domains = ['example.com', 'gmail.com', 'users.noreply.github.com',
+               'corp.local', 'mail.org']
+    rng = random.Random(seed)
+    actors = {}
+    for i in range(person_count):
+        first, last = rng.choice(first_names), rng.choice(last_names)
+        if rng.random() < 0.3:
+            last = '{}{}'.format(last, i)
+        identities = [
+            ('{} {}'.format(first.title(), last.title()),
+             '{}.{}@{}'.format(first, last, rng.choice(domains))),
+            ('{} {}'.format(first, last),
+             '{}{}@{}'.format(first[0], last, rng.choice(domains))),
+            ('', '{}_{}@{}'.format(first, last, rng.choice(domains))),
+            (last.title(), '{}{}@{}'.format(first, rng.randint(1, 99),
+                                            rng.choice(domains)))]
+        for name, email in rng.sample(identities, rng.randint(1, 3)):
+            actors.setdefault((name, email), i)
+    return sorted(actors.items())
+
+
+@pytest.mark.benchmark
+@skip_unless_benchmark
+def test_blocked_similarity_graph_recall(data_root):
+    parser = build_parser(data_root)
+    identities = synthetic_actors(person_count=800)
+    actors = [parser.parse_actor(*identity) for identity, _ in identities]
+    persons = {actor.actor_id: person
+               for actor, (_, person) in zip(actors, identities)}
+    graphs = {}
+    for blocking in (False, True):
+        graph = ActorSimilarityGraph(blocking=blocking)
+        start = timer()
+        for actor in actors:
+            graph.add_actor(actor)
+        print('\n{} actors, blocking={}: {:.2f}s'.format(
+            len(actors), blocking, timer() - start))
+        graphs[blocking] = edge_set(graph)
+    # exhaustive mode also links many actors of different persons with the
+    # loose default thresholds, recall is asserted for the same person pairs
+    person_edges = {edge for edge in graphs[False]
+                    if len({persons[actor_id] for actor_id in edge}) == 1}
+    recall = len(graphs[True] & graphs[False]) / len(graphs[False])
+    person_recall = len(graphs[True] & person_edges) / len(person_edges)
+    print('similar pairs {}, recall {:.4f}, same person pairs {}, '
+          'recall {:.4f}'.format(len(graphs[False]), recall,
+                                 len(person_edges), person_recall))
+    assert graphs[True] <= graphs[False]
+    assert person_recall >= 0.95
@@ -0,0 +1,26 @@
+# coding=utf-8
+from timeit import default_timer as timer
+
+import pandas as pd
+import pytest
+
+from saapy.vcs import check_file_move, parse_file_moves
+from .test_utils import skip_unless_benchmark
+
+
+@pytest.mark.benchmark
+@skip_unless_benchmark
+def test_parse_file_moves_benchmark():
+    row_count = 1000000
+    file_paths = pd.Series(['src/pkg{}/{{mod{} => lib{}}}/file{}.py'.format(
+        i % 100, i % 7, i % 11, i) for i in range(row_count)])
+    start = timer()
+    expected = [check_file_move(file_path) for file_path in file_paths]
+    loop_time = timer() - start
+    start = timer()
+    file_moves = parse_file_moves(file_paths)
+    vectorised_time = timer() - start
+    print('\ncheck_file_move: {:.2f}s, parse_file_moves: {:.2f}s'.format(
+        loop_time, vectorised_time))
+    assert list(zip(file_moves.file_path1, file_moves.file_path2)) == expected
+    assert file_moves.move.all()
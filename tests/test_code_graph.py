@@ -0,0 +1,159 @@
+# coding=utf-8
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from saapy.codetools import (CodeGraph, CodeGraphBuilder, open_graph_snapshot,
+                             save_graph_snapshot)
+
+
+def build_graph():
+    builder = CodeGraphBuilder()
+    builder.add_node('src', name='src', node_type='arch')
+    builder.add_node('a.cpp', attr_dict=dict(
+        name='a.cpp', kindname='file', node_type='entity', ent_id=1,
+        contents='int main() {}', metrics=dict(CountLine=10, Cyclomatic=1)))
+    builder.add_node('main', attr_dict=dict(
+        name='main', kindname='function', node_type='entity', ent_id=2,
+        contents=None, metrics=dict(CountLine=3)))
+    builder.add_node('f', attr_dict=dict(
+        name='f', kindname='function', node_type='entity', ent_id=3,
+        contents='void f() {}', metrics={}))
+    builder.add_edge('src', 'a.cpp', edge_type='contain')
+    builder.add_edge('main', 'a.cpp', edge_type='parent')
+    builder.add_edge('f', 'a.cpp', edge_type='parent')
+    builder.add_edge('main', 'f', attr_dict=dict(
+        edge_type='ref', kind_longname='c call', line=1, file='a.cpp'))
+    builder.add_edge('main', 'f', attr_dict=dict(
+        edge_type='ref', kind_longname='c call', line=2, file='a.cpp'))
+    builder.add_edge('f', 'main', attr_dict=dict(
+        edge_type='ref', kind_longname='c callby', line=1, file='a.cpp'))
+    # edges to unknown nodes add them like networkx does
+    builder.add_edge('src', 'lib', edge_type='depend')
+    return builder.build()
+
+
+def check_graph(graph):
+    assert len(graph) == 5
+    assert list(graph) == ['src', 'a.cpp', 'main', 'f', 'lib']
+    assert graph.number_of_edges() == 7
+    assert sorted(graph.edge_types) == [
+        'contain', 'depend', 'parent', 'ref']
+    assert graph.node['a.cpp'] == dict(
+        name='a.cpp', kindname='file', node_type='entity', ent_id=1,
+        contents='int main() {}',
+        metrics=dict(CountLine=10., Cyclomatic=1.))
+    assert graph.node['main']['metrics'] == dict(CountLine=3.)
+    assert 'contents' not in graph.node['main']
+    assert graph.node['lib'] == {}
+    assert graph.node_columns['kindname'].kind == 'intern'
+    metrics, metric_names = graph.matrix('metrics')
+    assert metric_names == ['CountLine', 'Cyclomatic']
+    assert metrics.shape == (5, 2)
+    assert graph['main'] == {
+        'a.cpp': {0: dict(edge_type='parent')},
+        'f': {0: dict(edge_type='ref', kind_longname='c call', line=1,
+                      file='a.cpp'),
+              1: dict(edge_type='ref', kind_longname='c call', line=2,
+                      file='a.cpp')}}
+    assert graph.successors('main') == ['a.cpp', 'f']
+    assert sorted(graph.predecessors('a.cpp')) == ['f', 'main', 'src']
+    assert graph.in_degree('a.cpp') == 3
+    assert graph.out_degree('main') == 3
+    assert graph.has_edge('f', 'main')
+    assert not graph.has_edge('a.cpp', 'main')
+    assert [(u, v, d['line'])
+            for u, v, d in graph.out_edges_iter('f', data=True)
+            if d['edge_type'] == 'ref'] == [('f', 'main', 1)]
+    indptr, indices = graph.csr('parent')
+    assert list(indptr) == [0, 0, 0, 1, 2, 2]
+    assert list(indices) == [1, 1]
+    assert 'missing' not in graph
+
+
+def test_code_graph():
+    check_graph(build_graph())
+
+
+def test_column_types(tmpdir):
+    builder = CodeGraphBuilder()
+    builder.add_node('a', line=3, flag=True, size=1.5)
+    builder.add_node('b', flag=False, size=2)
+    builder.add_node('c', line=5)
+    graph = builder.build()
+    graph.save(str(tmpdir))
+    for g in (graph, CodeGraph.load(str(tmpdir))):
+        assert g.node_columns['line'].kind == 'int'
+        assert g.node_columns['flag'].kind == 'bool'
+        # the attribute types are the ones of a networkx graph
+        assert [tuple((key, type(value)) for key, value in sorted(
+            g.node[node_id].items())) for node_id in g] == [
+            (('flag', bool), ('line', int), ('size', float)),
+            (('flag', bool), ('size', float)),
+            (('line', int),)]
+        assert g.node['a'] == dict(line=3, flag=True, size=1.5)
+        assert g.node['b'] == dict(flag=False, size=2.)
+
+
+def test_save_load_code_graph(tmpdir):
+    graph = build_graph()
+    graph.save(str(tmpdir))
+    loaded = CodeGraph.load(str(tmpdir))
+    assert isinstance(loaded.csr('ref')[1], np.memmap)
+    check_graph(loaded)
+    assert loaded.nodes(data=True) == graph.nodes(data=True)
+    assert loaded.edges(data=True) == graph.edges(data=True)
+
+
+def count_nodes(graph):
+    return len(graph), graph.successors('main')
+
+
+def test_graph_snapshot(tmpdir):
+    graph = build_graph()
+    snapshot = save_graph_snapshot(graph, str(tmpdir))
+    assert snapshot.path is not None
+    assert isinstance(snapshot.node_columns['contents'].strings.data,
+                      np.memmap)
+    # the snapshot is pickled as its path and mapped again when unpickled
+    assert len(pickle.dumps(snapshot)) < 200
+    assert len(pickle.dumps(graph)) > 1000
+    unpickled = pickle.loads(pickle.dumps(snapshot))
+    assert unpickled.nodes(data=True) == graph.nodes(data=True)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(count_nodes, [snapshot] * 2))
+    assert results == [(5, ['a.cpp', 'f'])] * 2
+    old_snapshot = tmpdir.mkdir('old')
+    old_snapshot.join('meta.json').write('{"node_columns": {}}')
+    with pytest.raises(ValueError):
+        open_graph_snapshot(str(old_snapshot))
+
+
+def test_save_over_snapshot(tmpdir, monkeypatch):
+    graph = build_graph()
+    snapshot_dir = tmpdir.join('snapshot')
+    snapshot = save_graph_snapshot(graph, str(snapshot_dir))
+    builder = CodeGraphBuilder()
+    builder.add_node('x', name='x')
+    # the mapped snapshot keeps reading the files it was opened from
+    save_graph_snapshot(builder.build(), str(snapshot_dir))
+    assert snapshot.nodes(data=True) == graph.nodes(data=True)
+    assert open_graph_snapshot(str(snapshot_dir)).nodes() == ['x']
+    save_graph_snapshot(snapshot, str(snapshot_dir))
+    assert open_graph_snapshot(str(snapshot_dir)).nodes() == graph.nodes()
+
+    def interrupted_save(*args, **kwargs):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(np, 'save', interrupted_save)
+    with pytest.raises(KeyboardInterrupt):
+        builder.build().save(str(snapshot_dir))
+    monkeypatch.undo()
+    assert open_graph_snapshot(str(snapshot_dir)).nodes() == graph.nodes()
+    assert tmpdir.listdir() == [snapshot_dir]
+    other_dir = tmpdir.mkdir('other')
+    other_dir.join('notes.txt').write('notes')
+    with pytest.raises(ValueError):
+        graph.save(str(other_dir))
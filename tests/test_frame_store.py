@@ -0,0 +1,90 @@
+# coding=utf-8
+import pandas as pd
+import pytest
+
+from saapy.util.frame_store import (FrameRegistry, frame_file_columns,
+                                    load_frame_file, save_frame_file)
+
+
+def sample_commit_frame():
+    commit_frame = pd.DataFrame(dict(
+        hexsha=['d', 'c', 'b', 'a'],
+        author_name=['x', 'y', 'x', 'z'],
+        committed_datetime=pd.to_datetime(
+            ['2020-03-03', '2019-12-31', '2019-01-02', '2018-05-01']),
+        lines=[1, 2, 3, 4]))
+    commit_frame['author_name'] = commit_frame['author_name'].astype(
+        'category')
+    return commit_frame
+
+
+def test_parquet_frame_round_trip(tmpdir):
+    commit_frame = sample_commit_frame()
+    frame_path = str(tmpdir / 'commit_frame.parquet')
+    save_frame_file(commit_frame, frame_path)
+    assert sorted(p.basename for p in tmpdir.join(
+        'commit_frame.parquet').listdir()) == [
+        'year=2018', 'year=2019', 'year=2020']
+    assert load_frame_file(frame_path).equals(commit_frame)
+    assert frame_file_columns(frame_path) == list(commit_frame.columns)
+
+
+def test_load_frame_file_subset(tmpdir):
+    commit_frame = sample_commit_frame()
+    for file_name in ('commit_frame.parquet', 'commit_frame.feather'):
+        frame_path = str(tmpdir / file_name)
+        save_frame_file(commit_frame, frame_path)
+        df = load_frame_file(frame_path, columns=['hexsha', 'author_name'],
+                             date_range=('2019-01-01', '2020-01-01'))
+        assert list(df.columns) == ['hexsha', 'author_name']
+        assert list(df.hexsha) == ['c', 'b']
+        assert df.author_name.dtype.name == 'category'
+        df = load_frame_file(frame_path, columns=['hexsha'],
+                             date_range=('2020-01-01', None))
+        assert list(df.hexsha) == ['d']
+
+
+def test_frame_registry_eviction(tmpdir):
+    commit_frame = sample_commit_frame()
+    frame_paths = dict(saved=str(tmpdir / 'saved.feather'),
+                       added=str(tmpdir / 'added.parquet'))
+    save_frame_file(commit_frame, frame_paths['saved'])
+    registry = FrameRegistry(frame_paths, spill_directory=str(tmpdir))
+    assert 'saved' in registry and not registry.is_resident('saved')
+    assert registry['saved'].equals(commit_frame)
+    registry['added'] = commit_frame
+    registry['unsaved'] = commit_frame
+    frame_size = registry.memory_usage()['saved']
+    assert list(registry.memory_usage().index) == ['saved', 'added', 'unsaved']
+    registry.memory_budget = frame_size
+    registry.enforce_budget(keep_key='unsaved')
+    assert list(registry.memory_usage().index) == ['unsaved']
+    # changed frames are saved to their paths or spilled when evicted
+    assert load_frame_file(frame_paths['added']).equals(commit_frame)
+    assert registry['added'].equals(commit_frame)
+    assert registry['unsaved'].equals(commit_frame)
+    assert sorted(registry) == ['added', 'saved', 'unsaved']
+
+
+def test_frame_registry_index(tmpdir):
+    commit_frame = sample_commit_frame()
+    indexed_frame = commit_frame.set_index(['hexsha', 'lines'])
+    frame_paths = dict(saved=str(tmpdir / 'saved.feather'))
+    save_frame_file(commit_frame, frame_paths['saved'])
+    registry = FrameRegistry(frame_paths, spill_directory=str(tmpdir))
+    # feather files keep no index, so the frame is refused when it is set
+    with pytest.raises(ValueError):
+        registry['saved'] = indexed_frame
+    registry['unsaved'] = indexed_frame
+    registry.evict('unsaved')
+    assert registry['unsaved'].equals(indexed_frame)
+    assert list(registry['unsaved'].index.names) == ['hexsha', 'lines']
+    # deleting the frame keeps its path, the frame is loaded again
+    del registry['saved']
+    assert frame_paths == dict(saved=str(tmpdir / 'saved.feather'))
+    assert not registry.is_resident('saved')
+    registry.clear()
+    assert list(registry) == ['saved']
+    registry.register('added', frame_paths['saved'])
+    assert not registry.is_resident('added')
+    assert registry['added'].equals(commit_frame)
@@ -0,0 +1,41 @@
+# coding=utf-8
+import pandas as pd
+from fuzzywuzzy import fuzz
+
+from saapy.analysis import GitAuthorAnalysis
+
+
+authors = [('John Smith', 'john.smith@example.com'),
+           ('john smith', 'jsmith@example.com'),
+           ('Smith John', 'john.smith@example.com'),
+           ('Ken Trove', 'ken.trove@example.com'),
+           ('ktrove', 'ktrove@example.com'),
+           ('Travis CI', 'builds@travis-ci.org'),
+           ('Maria Garcia', 'not an email'),
+           ('', 'garcia.maria@example.com')]
+
+
+def test_compute_similar_authors():
+    analysis = GitAuthorAnalysis(('test',), None, pair_chunk_size=10)
+    author_frame = analysis._enrich_authors(pd.DataFrame(
+        authors, columns=['author_name', 'author_email']))
+    similar_authors = analysis._compute_similar_authors(author_frame)
+    expected_pairs = []
+    for i, author in author_frame.iterrows():
+        for j, other in author_frame.iloc[i + 1:].iterrows():
+            pair = dict(
+                same_email=author.author_email == other.author_email,
+                name_similarity=fuzz.token_set_ratio(
+                    author.author_name, other.author_name),
+                email_name_similarity=fuzz.ratio(
+                    author.email_name, other.email_name),
+                name_to_email_similarity=fuzz.token_set_ratio(
+                    author.author_name, other.name_from_email.name),
+                is_valid_email=author.is_valid_email)
+            if len(analysis._select_similar_authors(pd.DataFrame([pair]))):
+                expected_pairs.append((i, j))
+    assert list(zip(similar_authors.author_idx,
+                    similar_authors.other_author_idx)) == expected_pairs
+    assert (similar_authors.author_email ==
+            author_frame.author_email[similar_authors.author_idx].values).all()
+    assert 'author_name_other' in similar_authors.columns
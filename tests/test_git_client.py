@@ -1,8 +1,19 @@
 # coding=utf-8
 
+import pandas as pd
 from git import Commit
+from toolz import partition_all
 
-from saapy.vcs import GitClient, check_file_move
+from saapy.vcs import (COMMIT_CATEGORICAL_COLUMNS, GitClient, GitCommitCache,
+                       GitTreeStore, check_file_move,
+                       chunked_commit_history_to_frames,
+                       commit_frame_to_actor_frame,
+                       commit_history_to_frames,
+                       commit_parents_to_frame, commit_tree_to_frame,
+                       commits_to_records,
+                       concat_frames, concat_keyed_frames, get_commits,
+                       iter_commits, merge_commit_history,
+                       parse_file_moves, parse_git_log_record)
 
 
 sample_revision = '4254c8c'
@@ -29,3 +40,268 @@ def test_file_move_parsing():
             assert old_file_path != new_file_path
         else:
             assert old_file_path == new_file_path
+
+
+def test_parse_file_moves():
+    samples = pd.Series(['tests/{ => data/ws1}/conf/workspace.yaml',
+                         'saapy/{scitools.py => clients/scitools_client.py}',
+                         '{saapy/scripts => scripts}/manage_password.py',
+                         'Dockerfile => dock/Dockerfile',
+                         'saapy/{antlr => lang}/__init__.py',
+                         'src/{a => b}/{c => d}/e.py',
+                         'a/{b => }/c',
+                         'tasks/__init__.py'], index=range(10, 18))
+    file_moves = parse_file_moves(samples)
+    assert list(file_moves.index) == list(samples.index)
+    assert list(zip(file_moves.file_path1, file_moves.file_path2)) == [
+        check_file_move(sample) for sample in samples]
+    assert list(file_moves.move) == [True] * 7 + [False]
+
+
+def test_iter_commits_skips_visited(git_repo_path):
+    git_client = GitClient(git_repo_path)
+    repo = git_client.repository
+    revs = ['master', 'feature']
+    commits = list(iter_commits(repo, revs))
+    hexshas = [c.hexsha for c in commits]
+    assert len(hexshas) == len(set(hexshas)) == 5
+    assert hexshas == [c.hexsha for c in get_commits(repo, revs)]
+
+
+def test_chunked_parent_frames(git_repo_path):
+    repo = GitClient(git_repo_path).repository
+    commits = get_commits(repo, ['master', 'feature'])
+    parent_frame = commit_parents_to_frame(commits)
+    chunked_frame = concat_frames([commit_parents_to_frame(chunk)
+                                   for chunk in partition_all(2, commits)])
+    assert parent_frame.equals(chunked_frame)
+
+
+def test_chunked_commit_history(git_repo_path):
+    repo = GitClient(git_repo_path).repository
+    history = commit_history_to_frames(repo)
+    chunked_history = chunked_commit_history_to_frames(repo, chunk_size=2)
+    assert sorted(chunked_history) == sorted(history)
+    assert len(history['commit_frame']) == 5
+    for key, frame in history.items():
+        # commits of the same second come in either order
+        frame, chunked_frame = (
+            f.astype(object).sort_values(list(f.columns)).reset_index(
+                drop=True) for f in (frame, chunked_history[key]))
+        assert chunked_frame.equals(frame), key
+
+
+def test_commit_frame_to_actor_frame():
+    commit_frame = pd.DataFrame(dict(
+        author_name=['a', 'a', 'b'],
+        author_email=['a@x', 'a@x', 'b@x'],
+        committer_name=['a', 'c', 'c'],
+        committer_email=['a@x', 'c@x', 'c@x']))
+    for col in commit_frame.columns:
+        commit_frame[col] = commit_frame[col].astype('category')
+    actor_frame = commit_frame_to_actor_frame(commit_frame)
+    assert list(actor_frame.name) == ['a', 'b', 'c']
+    assert list(actor_frame.author_commits) == [2, 1, 0]
+    assert list(actor_frame.committer_commits) == [1, 0, 2]
+
+
+def test_parse_git_log_record():
+    record_text = ('\x1e' + '\x1f'.join([
+        'c52733b', 'a1 b2', 'John Smith', 'john.smith@example.com',
+        '1500000000', '2017-07-14 04:40:00 +0200',
+        'John Smith', 'john.smith@example.com',
+        '1500000000', '2017-07-14 04:40:00 +0200', '',
+        'first line\nsecond line\n']) +
+        '\x1d\n\n1\t2\tsrc/a.py\n-\t-\tdata.bin\n')
+    record = parse_git_log_record(record_text)
+    assert record['hexsha'] == 'c52733b'
+    assert record['parents'] == 'a1 b2'
+    assert record['message'] == 'first line\nsecond line\n'
+    assert record['stats_files'] == {
+        'src/a.py': dict(insertions=1, deletions=2, lines=3),
+        'data.bin': dict(insertions=0, deletions=0, lines=0)}
+
+
+def test_git_log_backend(git_repo_path):
+    git_client = GitClient(git_repo_path)
+    history = git_client.extract_commit_history(
+        backend='git_log', include_trees=False, chunk_size=2)
+    commits = get_commits(git_client.repository, ['master', 'feature'])
+    commit_frame = history['commit_frame']
+    assert set(commit_frame.hexsha) == {c.hexsha for c in commits}
+    assert commit_frame.set_index('hexsha').stats_total_files.to_dict() == {
+        c.hexsha: c.stats.total['files'] for c in commits}
+    parent_frame = history['parent_frame'].sort_values(
+        ['hexsha', 'parent_hexsha']).reset_index(drop=True)
+    expected_parent_frame = commit_parents_to_frame(commits).sort_values(
+        ['hexsha', 'parent_hexsha']).reset_index(drop=True)
+    assert parent_frame.equals(expected_parent_frame)
+    actor_frame = history['actor_frame'].set_index('name')
+    assert actor_frame.author_commits['Ken Trove'] == 1
+    assert actor_frame.committer_commits['John Smith'] == 5
+
+
+def test_git_log_merge_stats(git_repo_path):
+    git_client = GitClient(git_repo_path)
+    repo = git_client.repository
+    feature = repo.heads.feature
+    feature.checkout()
+    (git_repo_path / 'y.txt').write_text('y\n')
+    repo.index.add(['y.txt'])
+    repo.index.commit('add y')
+    repo.heads.master.checkout()
+    # an ours merge keeps the master tree, its first parent diff is empty
+    master_commit = repo.head.commit
+    merge = repo.index.commit('ours merge', parent_commits=(
+        master_commit, feature.commit))
+    assert merge.tree == master_commit.tree
+    history = git_client.extract_commit_history(
+        backend='git_log', include_trees=False)
+    file_frame = history['file_frame']
+    assert merge.stats.files == {}
+    assert merge.hexsha not in set(file_frame.hexsha)
+    commits = get_commits(repo, ['master', 'feature'])
+    commit_frame = history['commit_frame']
+    assert len(commit_frame) == len(commits)
+    assert commit_frame.set_index('hexsha').stats_total_lines.to_dict() == {
+        c.hexsha: c.stats.total['lines'] for c in commits}
+
+
+def test_git_log_backend_paths(git_repo_path):
+    git_client = GitClient(git_repo_path)
+    repo = git_client.repository
+    for paths in ('src/a.txt', ['src/c.txt'], ['src/sub', 'src/c.txt']):
+        history = git_client.extract_commit_history(
+            backend='git_log', include_trees=False, paths=paths)
+        commits = get_commits(repo, ['master', 'feature'], paths=paths)
+        commit_frame = history['commit_frame']
+        assert sorted(commit_frame.hexsha) == sorted(
+            c.hexsha for c in commits)
+        assert commit_frame.set_index(
+            'hexsha').stats_total_lines.to_dict() == {
+            c.hexsha: c.stats.total['lines'] for c in commits}
+
+
+def test_iter_commits_exclude_revs(git_repo_path):
+    repo = GitClient(git_repo_path).repository
+    commits = list(iter_commits(repo, ['master'], exclude_revs=['feature']))
+    assert [c.message for c in commits] == ['merge feature', 'third']
+
+
+def test_merge_commit_history():
+    def history(hexshas, authors, with_actor_id=False):
+        commit_frame = pd.DataFrame(dict(
+            hexsha=hexshas, name_rev=hexshas, encoding='UTF-8',
+            committed_datetime=pd.to_datetime(
+                [int(h) for h in hexshas], unit='s'),
+            author_name=authors, author_email=authors,
+            committer_name=authors, committer_email=authors))
+        for col in COMMIT_CATEGORICAL_COLUMNS:
+            commit_frame[col] = commit_frame[col].astype('category')
+        frames = dict(
+            ref_frame=pd.DataFrame(dict(commit=hexshas[:1])),
+            actor_frame=commit_frame_to_actor_frame(commit_frame),
+            commit_frame=commit_frame,
+            file_frame=pd.DataFrame(dict(hexsha=hexshas)),
+            parent_frame=pd.DataFrame(dict(hexsha=hexshas)))
+        if with_actor_id:
+            frames['actor_frame']['actor_id'] = range(
+                len(frames['actor_frame']))
+        return frames
+
+    previous_history = history(['1', '2'], ['a', 'b'], with_actor_id=True)
+    new_history = history(['3'], ['a'])
+    merged = merge_commit_history(previous_history, new_history)
+    assert list(merged['commit_frame'].hexsha) == ['3', '2', '1']
+    assert list(merged['ref_frame'].commit) == ['3']
+    assert len(merged['file_frame']) == len(merged['parent_frame']) == 3
+    actor_frame = merged['actor_frame'].set_index('name')
+    assert actor_frame.author_commits.to_dict() == dict(a=2, b=1)
+    assert actor_frame.actor_id.to_dict() == dict(a=0, b=1)
+    # a lost previous tip makes the new history repeat stored commits
+    rewritten_history = history(['3', '2'], ['a', 'b'])
+    merged = merge_commit_history(previous_history, rewritten_history)
+    assert list(merged['commit_frame'].hexsha) == ['3', '2', '1']
+    assert len(merged['file_frame']) == len(merged['parent_frame']) == 3
+    actor_frame = merged['actor_frame'].set_index('name')
+    assert actor_frame.author_commits.to_dict() == dict(a=2, b=1)
+
+
+def test_git_tree_store(git_repo_path):
+    repo = GitClient(git_repo_path).repository
+    commits = get_commits(repo, ['master'])
+    store = GitTreeStore()
+    store.add_commits(commits)
+    frames = store.to_frames()
+    assert len(frames['commit_tree_frame']) == len(commits)
+    tree_entry_frame = frames['tree_entry_frame']
+    # src/sub is the same tree object in all commits after the second one
+    assert tree_entry_frame.tree.astype(object).nunique() == len(
+        store.tree_entries)
+    store = GitTreeStore.from_frames(frames['tree_entry_frame'],
+                                     frames['commit_tree_frame'])
+    for commit in commits:
+        expected = commit_tree_to_frame(commit)
+        actual = store.commit_tree_to_frame(commit.hexsha)
+        assert expected.astype(object).equals(actual.astype(object))
+    assert store.commit_files(commits[0].hexsha) == [
+        'src/a.txt', 'src/c.txt', 'src/sub/b.txt']
+
+
+def test_concat_keyed_frames():
+    frames = [
+        pd.DataFrame(dict(tree=['t1', 't1', 't2'], name=['a', 'b', 'c'])),
+        pd.DataFrame(dict(tree=['t2', 't3'], name=['c', 'd']))]
+    frame = concat_keyed_frames(frames, 'tree', ['tree'])
+    assert list(frame.name) == ['a', 'b', 'c', 'd']
+
+
+def test_parallel_extraction(git_repo_path):
+    git_client = GitClient(git_repo_path)
+    for shard_by, paths in (('revs', ''), ('paths', ['src/sub', 'src'])):
+        history = git_client.extract_commit_history(
+            backend='git_log', include_trees=False, paths=paths)
+        parallel_history = git_client.extract_commit_history(
+            backend='git_log', include_trees=False, workers=2,
+            shard_by=shard_by, paths=paths, chunk_size=1)
+        commit_frame = parallel_history['commit_frame']
+        # commits touching both path shards are kept once
+        assert commit_frame.hexsha.is_unique
+        assert set(commit_frame.hexsha) == set(history['commit_frame'].hexsha)
+        assert len(parallel_history['file_frame']) == len(
+            history['file_frame'])
+        actor_frame = parallel_history['actor_frame'].set_index('name')
+        assert actor_frame.committer_commits['John Smith'] == len(
+            commit_frame)
+
+
+def test_git_commit_cache(git_repo_path, tmpdir):
+    repo = GitClient(git_repo_path).repository
+    cache = GitCommitCache(str(tmpdir / 'commits.sqlite'))
+    assert not cache.validate(repo)
+    commits = get_commits(repo, ['master'], commit_cache=cache)
+    records = commits_to_records(commits, commit_cache=cache)
+    assert len(cache) == len(commits)
+    assert cache.validate(repo)
+    cached_commits = get_commits(repo, ['master'], commit_cache=cache)
+    assert [c.hexsha for c in cached_commits] == [c.hexsha for c in commits]
+    assert commits_to_records(cached_commits, commit_cache=cache) == records
+    assert records[0]['parents'] == [p.hexsha for p in commits[0].parents]
+    cache.max_size = cache.cached_size() - 1
+    cache.evict()
+    # the commit list was read before the records and is evicted first
+    assert cache.cached_size() <= cache.max_size
+    assert len(cache) == len(commits)
+    # a new commit drops the rev lists and names, records are kept
+    repo.index.commit('empty')
+    assert not cache.validate(repo)
+    assert len(cache) == len(commits)
+    assert 'name_rev' not in cache.get_commit_records(
+        [commits[0].hexsha])[commits[0].hexsha]
+    assert cache.get_rev_list(repr((['master'], '', []))) is None
+    renamed_records = commits_to_records(commits, commit_cache=cache)
+    assert [record['name_rev'] for record in renamed_records] == [
+        commit.name_rev for commit in commits]
+    assert renamed_records[0]['name_rev'] != records[0]['name_rev']
+    assert cache.validate(repo)
+    assert commits_to_records(commits, commit_cache=cache) == renamed_records
@@ -0,0 +1,86 @@
+# coding=utf-8
+from timeit import default_timer as timer
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from saapy.analysis.history import (
+    CO_CHANGE_COLUMNS, build_co_change_graph, build_correlation_graph,
+    co_change_frame, file_commit_correlation, file_commit_incidence,
+    frame_incidence)
+from .test_utils import skip_unless_benchmark
+
+
+def random_file_frame(commit_count, file_count, files_per_commit, seed=0):
+    """
+    commits change files of a module of 10 files, so files of a module are
+    changed together
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for commit in range(commit_count):
+        module = rng.integers(0, file_count // 10)
+        files = module * 10 + rng.choice(10, size=files_per_commit,
+                                         replace=False)
+        rows.extend(('c{}'.format(commit), 'f{}'.format(f)) for f in files)
+    return pd.DataFrame(rows, columns=['hexsha', 'file_path2'])
+
+
+def edge_dict(graph):
+    return {tuple(sorted((u, v))): round(d['correlation'], 10)
+            for u, v, d in graph.edges(data=True)}
+
+
+def test_co_change_graph_matches_dense_correlation():
+    file_frame = random_file_frame(300, 40, 3)
+    # a file changed in every commit has no correlation
+    file_frame = pd.concat([file_frame, pd.DataFrame(dict(
+        hexsha=file_frame.hexsha.unique(), file_path2='always'))])
+    dense = pd.crosstab(file_frame.hexsha, file_frame.file_path2)
+    dense_graph = build_correlation_graph(file_commit_correlation(dense),
+                                          min_corr=0.2)
+    incidence, commits, files = file_commit_incidence(file_frame)
+    assert incidence.shape == (300, 41)
+    sparse_graph = build_co_change_graph(incidence, files, min_corr=0.2,
+                                         block_size=7)
+    assert len(dense_graph.edges()) > 50
+    assert edge_dict(sparse_graph) == edge_dict(dense_graph)
+    assert 'always' not in sparse_graph
+    frame_graph = build_co_change_graph(*frame_incidence(dense)[::2],
+                                        min_corr=0.2)
+    assert edge_dict(frame_graph) == edge_dict(dense_graph)
+    with pytest.raises(ValueError):
+        build_co_change_graph(incidence, files, min_corr=0)
+
+
+def test_co_change_frame():
+    file_frame = pd.DataFrame(dict(
+        hexsha=['a', 'a', 'a', 'b', 'b', 'c', 'c', 'd'],
+        file_path2=['x', 'y', 'x', 'x', 'y', 'x', 'z', 'z']))
+    frame = co_change_frame(file_frame).sort_values(['file1', 'file2'])
+    assert list(zip(frame.file1, frame.file2, frame.co_changes)) == [
+        ('x', 'y', 2), ('x', 'z', 1)]
+    x_y = frame.iloc[0]
+    assert (x_y.changes1, x_y.changes2) == (3, 2)
+    assert x_y.support == 0.5
+    assert x_y.confidence1 == 2 / 3
+    assert x_y.confidence2 == 1.
+    assert len(co_change_frame(file_frame, min_co_changes=2)) == 1
+    empty_frame = co_change_frame(file_frame.iloc[:0])
+    assert empty_frame.empty
+    assert list(empty_frame.columns) == list(CO_CHANGE_COLUMNS)
+
+
+@pytest.mark.benchmark
+@skip_unless_benchmark
+def test_co_change_graph_benchmark():
+    file_frame = random_file_frame(200000, 100000, 5)
+    start = timer()
+    incidence, _, files = file_commit_incidence(file_frame)
+    graph = build_co_change_graph(incidence, files, min_corr=0.5)
+    seconds = timer() - start
+    print('co-change graph of {} files and {} edges in {:.1f}s'.format(
+        len(files), graph.number_of_edges(), seconds))
+    assert len(files) > 90000
+    assert seconds < 120
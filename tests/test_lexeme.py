@@ -1,10 +1,19 @@
 # coding=utf-8
 from pprint import pprint
 
+import random
+from timeit import default_timer as timer
+
+import pandas as pd
 import pytest as pytest
 
-from saapy.analysis import (LexemeParser, fuzzy_distance, flatten_parsed_lexeme,
-                            split_lexeme)
+from saapy.analysis import (LexemeParser, TermIndex, fuzzy_distance,
+                            flatten_parsed_lexeme, split_lexeme)
+from .test_utils import skip_unless_benchmark
+
+sample_identifiers = ['ConfigClazz', 'configurationclazz', 'inventoryfacade',
+                      'inventary_facade', 'crud_servise', 'HL7Adapter',
+                      'DataRepository', 'MicropaymentWebservice']
 
 
 def test_map_segment():
@@ -65,8 +74,160 @@ def test_parse_lexeme1():
         pprint(flatten_parsed_lexeme(lexeme_words))
 
 
-def build_parser():
-    parser = LexemeParser()
+def test_segment_lexeme_dp():
+    parser = build_parser()
+    dp_parser = build_parser(segmentation='dp')
+    sample_lexemes = ['configclazz', 'configurationclazz', 'inventoryfacade',
+                      'crudservise', 'dataservice', 'xq', 'x', '']
+    for lexeme in sample_lexemes:
+        assert (dp_parser.segment_into_words(lexeme, lexeme) ==
+                parser.segment_into_words(lexeme, lexeme))
+    assert dp_parser.parse_lexeme('ConfigClazz') == parser.parse_lexeme(
+        'ConfigClazz')
+    # the longest prefix leaving a coverable suffix is kept, not the cover
+    # with the longest segments
+    terms = {'abcde': None, 'fgh': None, 'ab': None, 'cdefgh': None}
+    parser.add_terms(terms)
+    dp_parser.add_terms(terms)
+    segments = dp_parser.segment_into_words('abcdefgh', 'abcdefgh')
+    assert [segment.segment for segment in segments] == ['abcde', 'fgh']
+    assert segments == parser.segment_into_words('abcdefgh', 'abcdefgh')
+
+
+def synthetic_identifiers(lengths, seed=11):
+    words = ['config', 'configuration', 'clazz', 'inventory', 'facade',
+             'service', 'data', 'repository', 'crud', 'html', 'plugin',
+             'dialog', 'money', 'compute', 'average', 'texture', 'colours']
+    rng = random.Random(seed)
+    identifiers = []
+    for length in lengths:
+        identifier = ''
+        while len(identifier) < length:
+            identifier += rng.choice(words)
+        identifiers.append(identifier)
+    return identifiers
+
+
+@pytest.mark.benchmark
+@skip_unless_benchmark
+def test_segment_lexeme_latency():
+    print()
+    for length in range(10, 61, 10):
+        identifiers = synthetic_identifiers([length] * 20)
+        # an unknown tail makes backtracking explore every dead end
+        for tail in ('', 'qz'):
+            for segmentation in ('backtrack', 'dp'):
+                parser = build_parser(segmentation=segmentation)
+                start = timer()
+                for identifier in identifiers:
+                    identifier += tail
+                    segments = parser.segment_into_words(identifier,
+                                                         identifier)
+                    assert ''.join(s.segment
+                                   for s in segments) == identifier
+                print('{} chars, tail {!r}, {}: {:.2f}ms per identifier, '
+                      '{} segments mapped'.format(
+                          length, tail, segmentation,
+                          (timer() - start) * 1000 / len(identifiers),
+                          len(parser.segment_memo)))
+
+
+def synthetic_terms(term_count, seed=13):
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return ['{}{}'.format(''.join(rng.choice(letters)
+                                  for _ in range(rng.randint(2, 12))), i % 7)
+            for i in range(term_count)]
+
+
+def test_term_index():
+    terms = synthetic_terms(2000) + ['clazz', 'class', 'claws', 'close']
+    index = TermIndex()
+    index.add_terms(terms)
+    rng = random.Random(5)
+    queries = ['clazz', 'clas', 'x', 'closer'] + [
+        term[:-1] + rng.choice('xyz') for term in rng.sample(terms, 100)]
+    for query in queries:
+        for min_score in (50, 75, 90):
+            best_term, distance = fuzzy_distance(query, terms)[0]
+            expected = ((best_term, distance) if distance >= min_score
+                        else None)
+            assert index.best_match(query, min_score) == expected
+
+
+@pytest.mark.benchmark
+@skip_unless_benchmark
+def test_term_index_latency():
+    terms = synthetic_terms(100000)
+    index = TermIndex()
+    start = timer()
+    index.add_terms(terms)
+    print('\nindexed {} terms in {:.2f}s'.format(len(terms),
+                                                 timer() - start))
+    queries = [term[:-1] + 'z' for term in random.Random(3).sample(terms, 50)]
+    for min_score in (75, 90):
+        start = timer()
+        matches = [index.best_match(query, min_score) for query in queries]
+        index_time = timer() - start
+        start = timer()
+        scan_matches = [fuzzy_distance(query, terms)[0] for query in queries]
+        scan_time = timer() - start
+        assert [match[1] if match else None for match in matches] == [
+            distance if distance >= min_score else None
+            for _, distance in scan_matches]
+        print('min score {}: index {:.2f}ms, scan {:.2f}ms per query'.format(
+            min_score, index_time * 1000 / len(queries),
+            scan_time * 1000 / len(queries)))
+
+
+def test_parse_lexeme_memo(tmpdir):
+    cache_path = str(tmpdir.join('lexemes.sqlite'))
+    parser = build_parser(cache_path=cache_path)
+    parsed_lexeme = parser.parse_lexeme('ConfigClazz')
+    # callers get copies of the memoised result
+    parsed_lexeme[0][1][0].seg_type = 'changed'
+    parsed_lexeme = parser.parse_lexeme('ConfigClazz')
+    assert parsed_lexeme[0][1][0].seg_type == 'term'
+    assert parser.parse_lexeme('ConfigClazz') is not parsed_lexeme
+    assert parser.parse_lexeme('ConfigClazz') == parsed_lexeme
+    # parse_lexeme writes to the cache in batches
+    assert not parser.cache.get_parsed_lexemes(parser.terms_hash,
+                                               ['ConfigClazz'])
+    parser.flush_cache()
+    row = parser.parse_lexeme_row(['ConfigClazz ConfigClazz'])
+    assert row == [parsed_lexeme] * 2
+    assert row[0][0][1][0] is not row[1][0][1][0]
+    assert ('Config', 100, 100) in parser.segment_memo
+    segment_map = parser.map_segment('Config', 'ConfigService')
+    assert segment_map.lexeme == 'ConfigService'
+    assert parser.map_segment('Config', 'Config').lexeme == 'Config'
+    # a new parser with the same terms reads the lexeme from the cache
+    cached_parser = build_parser(cache_path=cache_path)
+    cached_parser._parse_lexeme = None
+    assert cached_parser.parse_lexeme('ConfigClazz') == parsed_lexeme
+    # other terms miss the cache
+    cached_parser.add_terms({'facade': None})
+    assert not cached_parser.cache.get_parsed_lexemes(
+        cached_parser.terms_hash, ['ConfigClazz'])
+
+
+def test_parse_lexeme_series():
+    parser = build_parser()
+    lexemes = pd.Series([sample_identifiers[:3], sample_identifiers,
+                         sample_identifiers[2:], []])
+    expected = lexemes.map(lambda lexeme_list: [
+        build_parser().parse_lexeme(lexeme) for lexeme in lexeme_list])
+    parsed_lexemes = parser.parse_lexeme_series(lexemes)
+    assert parsed_lexemes.tolist() == expected.tolist()
+    parallel_parser = build_parser()
+    parallel_parser.parse_lexemes(sample_identifiers, workers=2, chunk_size=3)
+    assert len(parallel_parser.lexeme_memo) == len(sample_identifiers)
+    assert parallel_parser.parse_lexeme_series(
+        lexemes, workers=2).tolist() == expected.tolist()
+
+
+def build_parser(**kwargs):
+    parser = LexemeParser(**kwargs)
     parser.add_terms({
         'dlg': 'dialog',
         'clazz': 'class',
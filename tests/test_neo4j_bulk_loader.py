@@ -0,0 +1,103 @@
+# coding=utf-8
+import threading
+import time
+
+import pytest
+
+from saapy.graphdb import Neo4jBulkLoader
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter([dict(count=len(self.rows))])
+
+    def consume(self):
+        pass
+
+
+class FakeTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, params):
+        with self.driver.lock:
+            self.driver.in_flight += 1
+            self.driver.max_in_flight = max(self.driver.max_in_flight,
+                                            self.driver.in_flight)
+        time.sleep(0.01)
+        with self.driver.lock:
+            self.driver.in_flight -= 1
+            self.driver.batches.append((query, params['params']))
+        if self.driver.fail_rows in params['params']:
+            raise RuntimeError('write failed')
+        return FakeResult(params['params'])
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.closed = False
+
+    def write_transaction(self, unit_of_work, *args):
+        return unit_of_work(FakeTransaction(self.driver), *args)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    def __init__(self, fail_rows=None):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.batches = []
+        self.sessions = []
+        self.fail_rows = fail_rows
+
+    def session(self):
+        session = FakeSession(self)
+        self.sessions.append(session)
+        return session
+
+
+class FakeClient:
+    def __init__(self, driver):
+        self.neo4j_driver = driver
+
+
+def test_bulk_import_nodes():
+    driver = FakeDriver()
+    loader = Neo4jBulkLoader(FakeClient(driver), sessions=3,
+                             batch_rows=10, batch_bytes=200)
+    nodes = (dict(name='node{}'.format(i), value=i) for i in range(100))
+    stats = loader.import_nodes(nodes, labels=['TestNode', 'test'])
+    assert stats.rows == 100
+    assert stats.batches == len(driver.batches)
+    assert stats.rows_per_second > 0
+    assert not stats.results
+    # batches are limited by the payload size before the rows count
+    assert all(len(batch) < 10 for _, batch in driver.batches)
+    assert sorted(row['value'] for _, batch in driver.batches
+                  for row in batch) == list(range(100))
+    assert all('CREATE (n:TestNode:test)' in query
+               for query, _ in driver.batches)
+    assert driver.max_in_flight <= 3
+    assert all(session.closed for session in driver.sessions)
+
+
+def test_bulk_load_results_and_errors():
+    driver = FakeDriver()
+    loader = Neo4jBulkLoader(FakeClient(driver), sessions=2,
+                             batch_rows=7, keep_results=True)
+    stats = loader.load('MATCH (n {name: params.name}) DELETE n',
+                        [dict(name=i) for i in range(20)])
+    assert [result[0]['count'] for result in stats.results] == [7, 7, 6]
+    fail_row = dict(name=11)
+    failing_loader = Neo4jBulkLoader(FakeClient(FakeDriver(fail_row)),
+                                     batch_rows=5)
+    with pytest.raises(RuntimeError):
+        failing_loader.load('MATCH (n {name: params.name}) DELETE n',
+                            [dict(name=i) for i in range(20)])
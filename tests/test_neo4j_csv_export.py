@@ -0,0 +1,82 @@
+# coding=utf-8
+import csv
+
+from saapy.codetools import ScitoolsETL
+from saapy.graphdb import Neo4jCsvExport, export_commit_history
+from saapy.vcs import GitClient
+
+
+def read_csv(path):
+    with open(str(path), newline='', encoding='utf-8') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_export_scitools_csv(tmpdir):
+    scitools_db = dict(
+        ScitoolsProject=[dict(name='project', metric_CountLine=10)],
+        ScitoolsEntity=iter([
+            dict(ent_id=1, name='a.java', kindname='File',
+                 parameters=None),
+            dict(ent_id=2, name='A', kindname='Class', metric_CountLine=5,
+                 contents='class A {\n}', abstract=False),
+            dict(ent_id=3, name='f', kindname='Method', metric_CountLine=2.5,
+                 tags=['x', 'y'])]),
+        ScitoolsRef=iter([
+            dict(ent_id=2, file_ent_id=1, scope_ent_id=1, line=1, column=0,
+                 kind_longname='Define', name='Define'),
+            dict(ent_id=3, file_ent_id=1, scope_ent_id=2, line=2, column=4,
+                 kind_longname='Define', name='Define')]))
+    with Neo4jCsvExport(str(tmpdir)) as export:
+        ScitoolsETL.export_to_neo4j_csv(scitools_db, export, labels=['p'])
+    entity_header = read_csv(tmpdir.join('scitools_entities_header.csv'))
+    assert entity_header == [[
+        'ent_id:ID(ScitoolsEntity)', ':LABEL', 'name:string',
+        'kindname:string', 'metric_CountLine:float', 'contents:string',
+        'abstract:boolean', 'tags:string[]']]
+    entities = read_csv(tmpdir.join('scitools_entities.csv'))
+    assert entities == [
+        ['1', 'ScitoolsEntity;p', 'a.java', 'File', '', '', '', ''],
+        ['2', 'ScitoolsEntity;p', 'A', 'Class', '5', 'class A {\n}',
+         'false', ''],
+        ['3', 'ScitoolsEntity;p', 'f', 'Method', '2.5', '', '', 'x;y']]
+    assert read_csv(tmpdir.join('scitools_refs_header.csv'))[0][0] == \
+        'ref_id:ID(ScitoolsRef)'
+    assert len(read_csv(tmpdir.join('scitools_refs.csv'))) == 2
+    assert read_csv(tmpdir.join('scitools_scopes_header.csv')) == [[
+        ':START_ID(ScitoolsEntity)', ':END_ID(ScitoolsRef)', ':TYPE']]
+    assert read_csv(tmpdir.join('scitools_scopes.csv')) == [
+        ['1', '0', 'Scopes'], ['2', '1', 'Scopes']]
+    assert read_csv(tmpdir.join('scitools_refs_ents.csv')) == [
+        ['0', '2', 'Refs'], ['1', '3', 'Refs']]
+    args = export.import_args()
+    assert args.count('--nodes') == 3
+    assert args.count('--relationships') == 3
+
+
+def test_export_commit_history_csv(git_repo_path, tmpdir):
+    commit_history = GitClient(git_repo_path).extract_commit_history(
+        backend='git_log', include_trees=False)
+    with Neo4jCsvExport(str(tmpdir)) as export:
+        export_commit_history(commit_history, export, labels=['git'])
+    commits = read_csv(tmpdir.join('git_commits.csv'))
+    assert len(commits) == len(commit_history['commit_frame'])
+    commit_header = read_csv(tmpdir.join('git_commits_header.csv'))[0]
+    assert commit_header[:2] == ['hexsha:ID(GitCommit)', ':LABEL']
+    assert 'stats_total_lines:int' in commit_header
+    authors = read_csv(tmpdir.join('git_authors.csv'))
+    author_ids = {author[0] for author in authors}
+    assert {row[0] for row in read_csv(
+        tmpdir.join('git_authors_commits.csv'))} <= author_ids
+    parents = read_csv(tmpdir.join('git_commit_parents.csv'))
+    parent_frame = commit_history['parent_frame']
+    # the root commit has no parent relationship
+    assert len(parents) == parent_frame.parent_hexsha.count() == len(
+        parent_frame) - 1
+    assert all(parent[1] for parent in parents)
+    assert '--ignore-missing-nodes' in export.import_args()
+    files = read_csv(tmpdir.join('git_files.csv'))
+    changes = read_csv(tmpdir.join('git_commit_files.csv'))
+    assert {change[1] for change in changes} <= {f[0] for f in files}
+    assert read_csv(tmpdir.join('git_commit_files_header.csv'))[0][3:] == [
+        'file_path1:string', 'move:boolean', 'lines:int',
+        'insertions:int', 'deletions:int']
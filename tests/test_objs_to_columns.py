@@ -0,0 +1,93 @@
+# coding=utf-8
+from collections import namedtuple
+from timeit import default_timer as timer
+
+import pandas as pd
+import pytest
+
+import saapy.util as su
+from .test_utils import skip_unless_benchmark
+
+Actor = namedtuple('Actor', ['name', 'email'])
+
+Commit = namedtuple('Commit', ['hexsha', 'author', 'stats'])
+
+ATTRS = ['hexsha', 'author.name', 'author.email', 'stats.total',
+         'author.missing']
+
+
+def make_commits(count):
+    return [Commit('c{}'.format(i),
+                   Actor('a{}'.format(i % 7), 'a{}@x'.format(i % 7)),
+                   dict(total=i)) for i in range(count)]
+
+
+def attr_dicts(objs, attrs, default_value=None):
+    return [{attr: su.attr_to_value(obj, attr, default_value=default_value,
+                                    cache={})
+             for attr in attrs} for obj in objs]
+
+
+def test_objs_to_dicts():
+    objs = make_commits(3) + [
+        Commit('none', None, None),
+        dict(hexsha='dict', author=dict(name='d'), stats=dict(total=None))]
+    expected = attr_dicts(objs, ATTRS, default_value='-')
+    assert list(su.objs_to_dicts(objs, ATTRS, default_value='-')) == expected
+    assert expected[3]['author.name'] == '-'
+    assert expected[4]['stats.total'] is None
+    assert su.obj_to_dict(objs[0], ['author.name']) == {'author.name': 'a0'}
+    # dicts are read by key even when a dict method has the key name
+    stats_items = ['stats.items', 'stats.total']
+    assert list(su.objs_to_dicts(objs, stats_items)) == attr_dicts(
+        objs, stats_items)
+    assert su.obj_to_dict(objs[0], stats_items)['stats.items'] is None
+    # equal default values of other types are not mixed up
+    assert su.obj_to_dict(objs[3], ['author.name'], default_value=False) == {
+        'author.name': False}
+    zero_default = su.obj_to_dict(objs[3], ['author.name'], default_value=0)
+    assert type(zero_default['author.name']) is int
+    assert list(su.objs_to_dicts(objs[:2], [])) == [{}, {}]
+    records = [{'author.name': 'x'}, {}]
+    assert list(su.objs_to_dicts(records, ['author.name'], sep=None)) == [
+        {'author.name': 'x'}, {'author.name': None}]
+
+
+def test_objs_to_columns():
+    objs = make_commits(10)
+    frame = su.objs_to_columns(
+        objs, {'hexsha': 'hexsha', 'author.name': 'author_name',
+               'stats.total': 'total'},
+        dtypes=dict(total='int32'), categories=('author_name',))
+    assert list(frame.columns) == ['hexsha', 'author_name', 'total']
+    assert frame.total.dtype == 'int32'
+    assert pd.api.types.is_categorical_dtype(frame.author_name.dtype)
+    expected = su.dicts_to_dataframe(attr_dicts(objs, ATTRS))
+    assert su.objs_to_columns(objs, ATTRS).equals(expected)
+    # a step failing for some objects is looked up object by object
+    mixed = objs[:2] + [
+        Commit('none', None, None),
+        dict(hexsha='dict', author=dict(name='d', keys='k'),
+             stats=dict(total=None))]
+    attrs = ATTRS + ['author.keys']
+    assert su.objs_to_columns(mixed, attrs, default_value='-').equals(
+        su.dicts_to_dataframe(attr_dicts(mixed, attrs, default_value='-')))
+    empty = su.objs_to_columns([], ['hexsha', 'author.name'])
+    assert list(empty.columns) == ['hexsha', 'author.name']
+    assert len(empty) == 0
+
+
+@pytest.mark.benchmark
+@skip_unless_benchmark
+def test_objs_to_columns_benchmark():
+    objs = make_commits(10 ** 6)
+    start = timer()
+    expected = su.dicts_to_dataframe(attr_dicts(objs, ATTRS))
+    walk_seconds = timer() - start
+    start = timer()
+    frame = su.objs_to_columns(objs, ATTRS)
+    columns_seconds = timer() - start
+    print('1M objects: attr_to_value {:.1f}s, objs_to_columns {:.1f}s'.format(
+        walk_seconds, columns_seconds))
+    assert frame.equals(expected)
+    assert columns_seconds * 3 < walk_seconds
@@ -0,0 +1,211 @@
+# coding=utf-8
+import multiprocessing
+import pickle
+import sys
+import types
+
+import pytest
+
+from saapy.codetools import CodeGraph, ScitoolsProject
+
+
+class FakeKind:
+    def __init__(self, longname):
+        self.kind_longname = longname
+
+    def longname(self):
+        return self.kind_longname
+
+
+class FakeRef:
+    def __init__(self, ent, file, line):
+        self.ref_ent = ent
+        self.ref_file = file
+        self.ref_line = line
+
+    def ent(self):
+        return self.ref_ent
+
+    def file(self):
+        return self.ref_file
+
+    def kind(self):
+        return FakeKind('Java Call')
+
+    def kindname(self):
+        return 'Call'
+
+    def line(self):
+        return self.ref_line
+
+    def column(self):
+        return 0
+
+
+class FakeEnt:
+    def __init__(self, ent_id, name, kindname='Method', parent=None):
+        self.ent_id = ent_id
+        self.ent_name = name
+        self.ent_kindname = kindname
+        self.ent_parent = parent
+        self.ent_refs = []
+        self.contents_calls = 0
+
+    def id(self):
+        return self.ent_id
+
+    def parsetime(self):
+        return 0
+
+    def uniquename(self):
+        return self.ent_name
+
+    def longname(self):
+        return '/src/{}'.format(self.ent_name)
+
+    def name(self):
+        return self.ent_name
+
+    relname = simplename = name
+
+    def kindname(self):
+        return self.ent_kindname
+
+    def kind(self):
+        return FakeKind('Java ' + self.ent_kindname)
+
+    def parameters(self, shownames=True):
+        return ''
+
+    def type(self):
+        return None
+
+    def value(self):
+        return None
+
+    def language(self):
+        return 'Java'
+
+    def library(self):
+        return ''
+
+    def metrics(self):
+        return ['CountLine']
+
+    def metric(self, names):
+        return {name: self.ent_id for name in names}
+
+    def contents(self):
+        self.contents_calls += 1
+        return 'contents of {}'.format(self.ent_name)
+
+    def comments(self):
+        return 'comments of {}'.format(self.ent_name)
+
+    def parent(self):
+        return self.ent_parent
+
+    def refs(self):
+        return self.ent_refs
+
+
+class FakeDb:
+    def __init__(self, ents):
+        self.entities = ents
+
+    def ents(self):
+        return self.entities
+
+    def ent_from_id(self, ent_id):
+        return self.entities[ent_id]
+
+    def metrics(self):
+        return ['CountLine']
+
+    def metric(self, names):
+        return {name: len(self.entities) for name in names}
+
+    def root_archs(self):
+        return []
+
+
+def build_db(size=10):
+    file_ent = FakeEnt(0, 'A.java', kindname='File')
+    ents = [file_ent]
+    for i in range(1, size):
+        ent = FakeEnt(i, 'm{}'.format(i), parent=file_ent)
+        if i > 1:
+            ent.ent_refs.append(FakeRef(ents[-1], file_ent, i))
+        ents.append(ent)
+    return FakeDb(ents)
+
+
+def edge_set(project):
+    return sorted((u, v, tuple(sorted(data.items())))
+                  for u, v, data in project.code_graph.edges(data=True))
+
+
+def test_populate_skips_contents():
+    db = build_db()
+    project = ScitoolsProject('/src', include_contents=False)
+    project.populate(db)
+    assert len(project.code_graph) == 10
+    attrs = project.code_graph.node['m2']
+    assert 'contents' not in attrs
+    assert attrs['comments'] == 'comments of m2'
+    assert sum(ent.contents_calls for ent in db.ents()) == 0
+    assert project.code_graph['m2']['m1'][0]['kind_longname'] == 'java call'
+    assert list(project.entity_kinds) == ['java file', 'java method']
+
+
+def test_import_entity_records(tmpdir):
+    db = build_db()
+    project = ScitoolsProject('/src')
+    project.populate(db)
+    records_path = str(tmpdir.join('records.jsonl'))
+    exported = ScitoolsProject('/src')
+    assert exported.export_entity_records(db, records_path) == 10
+    assert len(exported.code_graph) == 0
+    imported = ScitoolsProject('/src')
+    imported.import_entity_records(records_path)
+    assert edge_set(imported) == edge_set(project)
+    assert imported.code_graph.node['m3'] == project.code_graph.node['m3']
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='the fake understand module is inherited by fork')
+def test_populate_in_workers(monkeypatch):
+    db = build_db(25)
+    understand = types.ModuleType('understand')
+    understand.open = lambda udb_path: db
+    monkeypatch.setitem(sys.modules, 'understand', understand)
+    project = ScitoolsProject('/src')
+    project.populate(db)
+    sharded = ScitoolsProject('/src')
+    sharded.populate(db, udb_path='fake.udb', workers=3, shard_size=4)
+    assert list(sharded.code_graph.nodes()) == list(
+        project.code_graph.nodes())
+    assert edge_set(sharded) == edge_set(project)
+    with pytest.raises(ValueError):
+        ScitoolsProject('/src').populate(db, workers=2)
+
+
+def test_populate_compact(tmpdir):
+    db = build_db()
+    project = ScitoolsProject('/src')
+    project.populate(db)
+    compact = ScitoolsProject('/src', compact=True)
+    compact.populate(db)
+    assert isinstance(compact.code_graph, CodeGraph)
+    assert list(compact.code_graph) == list(project.code_graph)
+    assert edge_set(compact) == edge_set(project)
+    attrs = project.code_graph.node['m3']
+    attrs['metrics'] = {name: float(value)
+                        for name, value in attrs['metrics'].items()}
+    del attrs['type'], attrs['value']
+    assert compact.code_graph.node['m3'] == attrs
+    edges = compact.code_graph.edges(data=True)
+    compact.save_code_graph(str(tmpdir))
+    assert compact.code_graph.path is not None
+    loaded = pickle.loads(pickle.dumps(compact))
+    assert loaded.code_graph.edges(data=True) == edges
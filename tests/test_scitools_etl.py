@@ -0,0 +1,194 @@
+# coding=utf-8
+from saapy.codetools import ScitoolsETL
+from saapy.graphdb import BulkLoadStats
+
+
+class RecordingClient:
+    def __init__(self, progress=None):
+        self.progress = progress or {}
+        self.queries = []
+        self.loads = []
+
+    def run_query(self, query, labels=None, params=None):
+        self.queries.append((' '.join(query.split()), labels, params))
+        if 'RETURN p.step' in query:
+            return [dict(step=step, count=count)
+                    for step, count in self.progress.items()]
+        return []
+
+    def bulk_load(self, query, rows, labels=None, **kwargs):
+        rows = list(rows)
+        self.loads.append((' '.join(query.split()), rows, labels))
+        stats = BulkLoadStats()
+        stats.rows = len(rows)
+        return stats
+
+
+scitools_db = dict(
+    ScitoolsProject=[dict(name='project')],
+    ScitoolsEntity=[dict(ent_id=i, name='e{}'.format(i)) for i in range(3)],
+    ScitoolsRef=[dict(ent_id=i % 3, scope_ent_id=0, file_ent_id=0)
+                 for i in range(25)])
+
+
+def link_ranges(client, rel_type):
+    return [(params['batch_start'], params['batch_end'])
+            for _, _, params in client.queries
+            if params and params.get('step') == rel_type and
+            'batch_start' in params]
+
+
+def test_import_to_neo4j():
+    client = RecordingClient()
+    ScitoolsETL.import_to_neo4j(scitools_db, client, labels=['p'],
+                                link_batch_size=10)
+    assert client.queries[0][0] == 'CREATE INDEX ON :ScitoolsEntity(ent_id)'
+    assert [labels for _, _, labels in client.loads] == [
+        ['ScitoolsProject', 'p'], ['ScitoolsEntity', 'p'],
+        ['ScitoolsRef', 'p']]
+    assert [ref['ref_id'] for ref in client.loads[2][1]] == list(range(25))
+    for rel_type in ('Scopes', 'Refs', 'Includes'):
+        assert link_ranges(client, rel_type) == [(0, 10), (10, 20), (20, 25)]
+    assert any('ref.file_ent_id' in query and '[:Includes]' in query
+               for query, _, _ in client.queries)
+
+
+def test_resume_import_to_neo4j():
+    client = RecordingClient(progress=dict(
+        ScitoolsProject=1, ScitoolsEntity=3, ScitoolsRef=25, Scopes=25,
+        Refs=20))
+    ScitoolsETL.import_to_neo4j(scitools_db, client, link_batch_size=10,
+                                resume=True)
+    assert client.queries[0][0].startswith('CREATE CONSTRAINT')
+    assert not client.loads
+    assert link_ranges(client, 'Scopes') == []
+    assert link_ranges(client, 'Refs') == [(20, 25)]
+    assert link_ranges(client, 'Includes') == [(0, 10), (10, 20), (20, 25)]
+
+
+class FakeEnt:
+    def __init__(self, ent_id, name, kindname, parent=None, refs=None,
+                 metrics=None):
+        self.ent_id = ent_id
+        self.name = name
+        self.kind = kindname
+        self.parent_ent = parent
+        self.ent_refs = refs or {}
+        self.metrics = metrics or {}
+        self.parent_calls = 0
+
+    def id(self):
+        return self.ent_id
+
+    def longname(self):
+        return self.name
+
+    def relname(self):
+        return self.name
+
+    def kindname(self):
+        return self.kind
+
+    def parent(self):
+        self.parent_calls += 1
+        return self.parent_ent
+
+    def refs(self, kinds, ent_kinds=None):
+        return [FakeRef(ent) for ent in self.ent_refs.get(kinds, [])
+                if ent_kinds is None or ent.kind in ent_kinds]
+
+    def metric(self, names):
+        return {name: self.metrics.get(name, 1) for name in names}
+
+
+class FakeRef:
+    def __init__(self, ent):
+        self.referenced_ent = ent
+
+    def ent(self):
+        return self.referenced_ent
+
+
+class FakeUdb:
+    def __init__(self, java_files):
+        self.java_files = java_files
+
+    def ents(self, kinds):
+        return self.java_files
+
+
+def build_java_udb():
+    packages = {name: FakeEnt(name, name, 'Package')
+                for name in ('app', 'lib', 'java.lang')}
+    files = {}
+    classes = {}
+    for file_name, package_name, class_name in [
+            ('A.java', 'app', 'app.A'), ('B.java', 'app', 'app.B'),
+            ('L.java', 'lib', 'lib.L'), ('String.java', 'java.lang',
+                                         'java.lang.String')]:
+        file_ent = FakeEnt(file_name, file_name, 'File',
+                           refs={'Define': [packages[package_name]]})
+        files[file_name] = file_ent
+        class_ent = FakeEnt(class_name, class_name, 'Class',
+                            parent=file_ent)
+        classes[class_name] = class_ent
+        file_ent.ent_refs['Define'].append(class_ent)
+    classes['app.A'].ent_refs['Couple'] = [
+        classes['app.B'], classes['lib.L'], classes['java.lang.String']]
+    classes['app.B'].ent_refs['Couple'] = [classes['lib.L']]
+    return FakeUdb([files['A.java'], files['B.java']]), classes
+
+
+def test_store_couples_batched():
+    udb, classes = build_java_udb()
+    etl = ScitoolsETL(udb)
+    couples = etl.collect_couples()
+    assert sorted(f['file_name'] for f in couples['files']) == [
+        'A.java', 'B.java', 'L.java']
+    assert 'count_line_code' not in [
+        f for f in couples['files'] if f['file_name'] == 'L.java'][0]
+    assert sorted(c['class_name'] for c in couples['classes']) == [
+        'app.A', 'app.B', 'lib.L']
+    assert couples['couples'] == [
+        dict(from_class_name='app.A', to_class_name='app.B'),
+        dict(from_class_name='app.A', to_class_name='lib.L'),
+        dict(from_class_name='app.B', to_class_name='lib.L')]
+    # the file of a coupled class is resolved once
+    assert classes['lib.L'].parent_calls == 1
+    queries = []
+    etl.store_couples(lambda query, params: queries.append((query, params)),
+                      batched=True, chunk_size=2)
+    unwind_queries = [params['rows'] for query, params in queries
+                      if 'UNWIND' in query]
+    assert [len(rows) for rows in unwind_queries] == [2, 1, 2, 1, 2, 1]
+
+
+class StructsETL(ScitoolsETL):
+    def iter_structs(self):
+        yield 'ScitoolsProject', scitools_db['ScitoolsProject'][0]
+        for entity in scitools_db['ScitoolsEntity']:
+            # entities of different kinds have different metrics
+            # None values are dropped by both formats
+            yield 'ScitoolsEntity', dict(
+                entity, contents=None,
+                **{'metric_{}'.format(entity['name']): 1})
+            for ref in scitools_db['ScitoolsRef']:
+                if ref['ent_id'] == entity['ent_id']:
+                    yield 'ScitoolsRef', ref
+
+
+def test_export_structs(tmpdir):
+    for struct_format in ('jsonl', 'parquet'):
+        output_dir = str(tmpdir.join(struct_format))
+        counts = StructsETL(None).export_structs(
+            output_dir, struct_format=struct_format, row_group_size=2)
+        assert counts == dict(ScitoolsProject=1, ScitoolsEntity=3,
+                              ScitoolsRef=25)
+        read_db = ScitoolsETL.read_structs(output_dir, struct_format)
+        client = RecordingClient()
+        ScitoolsETL.import_to_neo4j(read_db, client, link_batch_size=10)
+        entities = client.loads[1][1]
+        assert [e['ent_id'] for e in entities] == [0, 1, 2]
+        assert entities[1] == dict(ent_id=1, name='e1', metric_e1=1)
+        assert len(client.loads[2][1]) == 25
+        assert link_ranges(client, 'Refs') == [(0, 10), (10, 20), (20, 25)]
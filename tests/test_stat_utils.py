@@ -0,0 +1,97 @@
+# coding=utf-8
+import tracemalloc
+from timeit import default_timer as timer
+
+import numpy as np
+import pytest
+
+from saapy.analysis.stat_utils import (
+    batch_bs_pairs, batch_bs_pairs_linreg, batch_bs_reps, batch_linreg,
+    batch_pearson_r, batch_perm_reps, diff_of_means, draw_bs_reps,
+    draw_perm_reps, pearson_r)
+from .test_utils import skip_unless_benchmark
+
+
+def commit_sizes(n, seed=0):
+    return np.random.default_rng(seed).lognormal(3, 1.5, n).round()
+
+
+def test_batch_statistics():
+    rng = np.random.default_rng(1)
+    x = rng.normal(size=(5, 30))
+    y = 2 * x + rng.normal(size=(5, 30))
+    slope, intercept = batch_linreg(x, y)
+    r = batch_pearson_r(x, y)
+    for i in range(5):
+        assert np.allclose(np.polyfit(x[i], y[i], 1), [slope[i], intercept[i]])
+        assert np.isclose(pearson_r(x[i], y[i]), r[i])
+
+
+def test_batch_bs_reps():
+    data = commit_sizes(200)
+    reps = batch_bs_reps(data, size=10000, seed=42)
+    assert reps.shape == (10000,)
+    assert abs(reps.mean() - data.mean()) < 0.05 * data.mean()
+    assert np.isclose(reps.std(), data.std() / np.sqrt(len(data)), rtol=0.1)
+    # batches are seeded independently of their size and of the workers
+    small_batches = batch_bs_reps(data, size=10000, seed=42,
+                                  memory_budget=100 * len(data) * 16)
+    assert not np.array_equal(reps, small_batches)
+    in_workers = batch_bs_reps(data, size=10000, seed=42, workers=2,
+                               memory_budget=100 * len(data) * 16)
+    assert np.array_equal(small_batches, in_workers)
+    np.random.seed(3)
+    seeded = draw_bs_reps(data, np.mean, size=10)
+    np.random.seed(3)
+    assert np.array_equal(draw_bs_reps(data, np.mean, size=10), seeded)
+
+
+def test_batch_bs_pairs_and_perm_reps():
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=100)
+    y = 3 * x + 1 + rng.normal(scale=0.1, size=100)
+    slopes, intercepts = batch_bs_pairs_linreg(x, y, size=1000, seed=1,
+                                               memory_budget=50000)
+    assert slopes.shape == intercepts.shape == (1000,)
+    assert np.allclose(slopes.mean(), 3, atol=0.05)
+    assert np.allclose(intercepts.mean(), 1, atol=0.05)
+    assert (batch_bs_pairs(x, y, size=100, seed=1) > 0.99).all()
+    data_1, data_2 = commit_sizes(50, seed=1), commit_sizes(80, seed=2)
+    perm_reps = batch_perm_reps(data_1, data_2, size=2000, seed=1)
+    assert perm_reps.shape == (2000,)
+    assert abs(perm_reps.mean()) < 0.2 * perm_reps.std()
+    loop_reps = draw_perm_reps(data_1, data_2,
+                               lambda d1, d2: diff_of_means(d1, d2),
+                               size=2000)
+    assert np.isclose(perm_reps.std(), loop_reps.std(), rtol=0.1)
+
+
+def test_batch_memory_budget():
+    rng = np.random.default_rng(3)
+    x = rng.normal(size=1000)
+    y = x + rng.normal(size=1000)
+    memory_budget = 2 * 10 ** 6
+    # the temporaries of the statistic count against the budget
+    for draw_reps in (batch_bs_pairs, batch_bs_pairs_linreg):
+        tracemalloc.start()
+        draw_reps(x, y, size=2000, seed=0, memory_budget=memory_budget)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < 1.2 * memory_budget
+
+
+@pytest.mark.benchmark
+@skip_unless_benchmark
+def test_batch_bs_reps_benchmark():
+    data = commit_sizes(1000)
+    start = timer()
+    reps = batch_bs_reps(data, size=10 ** 6, seed=0, workers=4)
+    seconds = timer() - start
+    print('10^6 bootstrap means of 1000 commit sizes in {:.1f}s'.format(
+        seconds))
+    assert len(reps) == 10 ** 6
+    start = timer()
+    batch_perm_reps(data[:500], data[500:], size=10 ** 6, seed=0,
+                    workers=4)
+    print('10^6 permutation replicates in {:.1f}s'.format(timer() - start))
+    assert seconds < 60
@@ -6,3 +6,8 @@ skip_on_travisciorg = pytest.mark.skipif(
     os.environ.get('TEST_ENV') == 'travisciorg',
     reason="running test suite on travis-ci.org"
 )
+
+skip_unless_benchmark = pytest.mark.skipif(
+    not os.environ.get('SAAPY_BENCHMARK'),
+    reason="benchmarks run only with SAAPY_BENCHMARK set"
+)